@@ -13,9 +13,9 @@ import Weather from "./components/Weather";
 import Card from "./components/Card";
 import ThemeToggle from "./components/ThemeToggle";
 
-// API and WebSocket URLs
+// Backend stream and WebSocket URLs
 const WS_URL = "ws://<Your Ip Address>:1880/mqtt";
-const API_URL = "http://<Your Ip Address>:5000/api/status";
+const STREAM_URL = "http://<Your Ip Address>:5000/api/status/stream";
 
 export default function App() {
   // State variables (human-written)
@@ -47,21 +47,21 @@ export default function App() {
     return () => ws.close();
   }, []);
 
-  // Backend polling (human-written)
+  // Backend push: full snapshot on connect, then only the changed fields.
+  // EventSource reconnects on its own and resumes from the last event id.
 
   useEffect(() => {
-    const fetchData = async () => {
-      try {
-        const response = await fetch(API_URL);
-        if (response.ok) {
-          const data = await response.json();
-          setBackendData(data);
-        }
-      } catch (error) { console.error("Failed to fetch backend data:", error); }
-    };
-    fetchData();
-    const interval = setInterval(fetchData, 2000);
-    return () => clearInterval(interval);
+    const source = new EventSource(STREAM_URL);
+    source.addEventListener("snapshot", (event) => {
+      const { state } = JSON.parse(event.data);
+      setBackendData(state);
+    });
+    source.addEventListener("delta", (event) => {
+      const { changes } = JSON.parse(event.data);
+      setBackendData((previous) => ({ ...previous, ...changes }));
+    });
+    source.onerror = () => console.error("Backend stream interrupted, reconnecting...");
+    return () => source.close();
   }, []);
 
   // Publish control command (AI-assisted snippet adapted)
@@ -1,9 +1,66 @@
-from flask import Flask
+from flask import Flask, Response
 from flask_cors import CORS
 import logging
 import os
+import time
 
-def create_app():
+def register_subsystems(lifecycle, role="standalone", app=None):
+    """
+    Everything that runs in the background, in start order. A follower worker
+    (see services/cluster.py) only keeps what it needs to serve reads and
+    mirrors the owner's state instead of running the loops.
+    """
+    from config import Config
+    from .services.cluster import cluster
+    from .services.ai_model_service import ai_service
+    from .services.mqtt_service import mqtt_service
+    from .services.storage_service import storage_service
+    from .services.telemetry_service import telemetry_ingestor
+    from .services.weather_service import weather_provider
+    from .services.online_learning import online_learner
+    from .services.pump_commands import pump_commands
+    from .services.rollup_service import rollup_service
+    from .routes.enhanced_dashboard import start_simulation
+
+    def start_telemetry():
+        telemetry_ingestor.start()
+        telemetry_ingestor.attach(mqtt_service)
+
+    def start_pump_commands():
+        pump_commands.start()
+        pump_commands.attach(telemetry_ingestor)
+
+    if role != "follower":
+        # The owner maintains the rollups for every worker; followers only read them
+        storage_service.add_extension(rollup_service)
+    lifecycle.add("storage", storage_service.start, stop=storage_service.stop,
+                  ready=lambda: storage_service.ready)
+    if role == "owner":
+        # Before anything writes to the state store, so every write reaches the followers
+        lifecycle.add("state_replica", lambda: cluster.start_publisher(app), stop=cluster.stop)
+    elif role == "follower":
+        lifecycle.add("ai_model", ai_service.warm_up, ready=lambda: ai_service.ready, background=True)
+        lifecycle.add("state_replica", cluster.start_follower, stop=cluster.stop,
+                      ready=lambda: cluster.stats["applied"] > 0)
+        return
+
+    lifecycle.add("telemetry", start_telemetry, stop=telemetry_ingestor.stop)
+    # The broker may be unreachable for a while; the API is usable without it
+    lifecycle.add("mqtt", mqtt_service.connect, stop=mqtt_service.stop,
+                  ready=lambda: mqtt_service.is_connected, required=False)
+    lifecycle.add("pump_commands", start_pump_commands, stop=pump_commands.stop)
+    lifecycle.add("weather", weather_provider.start, stop=weather_provider.stop)
+    lifecycle.add("ai_model", ai_service.warm_up, ready=lambda: ai_service.ready, background=True)
+    lifecycle.add("simulation", start_simulation)
+    lifecycle.add("online_learning", online_learner.start, stop=online_learner.stop,
+                  enabled=Config.ONLINE_LEARNING_ENABLED, required=False)
+
+def create_app(start_services=True):
+    """
+    Build the Flask app. Importing the package does no work; background services
+    are started here through the lifecycle hooks (pass start_services=False to skip them).
+    """
+    created = time.perf_counter()
     app = Flask(__name__)
     
     # Enable CORS for all domains and routes
@@ -11,7 +68,7 @@ def create_app():
         r"/api/*": {
             "origins": ["http://localhost:3000", "http://127.0.0.1:3000"],
             "methods": ["GET", "POST", "PUT", "DELETE"],
-            "allow_headers": ["Content-Type", "Authorization"]
+            "allow_headers": ["Content-Type", "Authorization", "X-Admin-Token"]
         }
     })
     
@@ -24,9 +81,23 @@ def create_app():
     # Import and register blueprints
     from .routes.enhanced_dashboard import enhanced_dashboard_bp
     from .routes.pump_control import pump_bp
+    from .routes.admin import admin_bp
     
     app.register_blueprint(enhanced_dashboard_bp, url_prefix="/api")
     app.register_blueprint(pump_bp, url_prefix="/api")
+    app.register_blueprint(admin_bp, url_prefix="/api")
+
+    from config import Config
+    from .services.lifecycle import lifecycle
+    from .services.ai_model_service import ai_service
+    from .services.metrics import metrics, install_request_metrics, register_service_collectors
+    from .services.profiler import profiler, install_profiling
+    app.extensions["lifecycle"] = lifecycle
+    app.extensions["profiler"] = profiler
+
+    install_request_metrics(app)
+    install_profiling(app)
+    register_service_collectors()
     
     @app.route("/")
     def health_check():
@@ -40,15 +111,65 @@ def create_app():
     def api_health():
         return {
             "api_status": "online",
-            "ai_model": "loaded",
+            "ai_model": "loaded" if ai_service.ready else "warming_up",
             "endpoints": [
+                "/api/ready",
+                "/metrics",
                 "/api/status",
+                "/api/status/stream",
+                "/api/fleet",
+                "/api/weather",
+                "/api/telemetry/stats",
+                "/api/storage/stats",
+                "/api/history",
+                "/api/energy/rollups",
+                "/api/energy/summary",
+                "/api/solar/expected",
+                "/api/solar/forecast",
+                "/api/cluster/stats",
                 "/api/ai-status", 
+                "/api/predict/batch",
+                "/api/simulate",
+                "/api/ai/online-learning",
+                "/api/admin/profiling",
                 "/api/start-pump",
                 "/api/stop-pump",
+                "/api/pump-commands",
                 "/api/manual-override",
                 "/api/reset-system"
             ]
         }
-    
+
+    @app.route("/metrics")
+    def prometheus_metrics():
+        """Prometheus text-format metrics"""
+        # Under a cluster only the owner answers (followers forward): every worker's own series, by pid
+        cluster = app.extensions.get("cluster")
+        if cluster is None or cluster.role == "standalone":
+            body = metrics.render()
+        else:
+            body = metrics.render({"worker": str(os.getpid())}, cluster.worker_metrics())
+        return Response(body, mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+    @app.route("/api/ready")
+    def api_ready():
+        """Readiness per subsystem; 503 until every required one is ready"""
+        report = lifecycle.readiness()
+        return report, 200 if report["ready"] else 503
+
+    role = "standalone"
+    if start_services and Config.CLUSTER_ENABLED:
+        from .services.cluster import cluster, install_cluster
+        role = cluster.elect()
+        install_cluster(app)
+        app.extensions["cluster"] = cluster
+
+    lifecycle.timings["create_app_ms"] = round((time.perf_counter() - created) * 1000, 1)
+    if start_services and lifecycle.started_at is None:
+        register_subsystems(lifecycle, role=role, app=app)
+        lifecycle.start_all()
+    logging.getLogger(__name__).info(
+        f"🚀 App created in {lifecycle.timings['create_app_ms']} ms, services started in "
+        f"{lifecycle.timings.get('start_all_ms', 0)} ms"
+    )
     return app
\ No newline at end of file
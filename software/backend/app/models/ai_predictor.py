@@ -1,9 +1,37 @@
+import time
+import logging
 import joblib
 import numpy as np
+from ..services.prediction_cache import PredictionCache, ArtifactWatcher, parse_resolutions
+from ..services.metrics import PREDICTION_LATENCY, PREDICTION_ROWS
+from ..services.profiler import profiler
+from config import Config
 
-# Load trained model once
-MODEL_PATH = "pump_rf_realworld (2).pkl"
-rf_model = joblib.load(MODEL_PATH)
+logger = logging.getLogger(__name__)
+
+FEATURES = ["water_level", "rain", "solar_historical", "time_of_day", "diesel_cost"]
+
+# Loaded on first use (and again whenever the file changes), not at import
+MODEL_PATH = Config.AI_MODEL_PATH
+rf_model = None
+model_version = 0
+artifact_watcher = ArtifactWatcher(MODEL_PATH, Config.MODEL_WATCH_INTERVAL)
+prediction_cache = PredictionCache(
+    FEATURES,
+    parse_resolutions(Config.PREDICTION_CACHE_RESOLUTIONS),
+    max_entries=Config.PREDICTION_CACHE_SIZE,
+    ttl=Config.PREDICTION_CACHE_TTL,
+)
+
+def _reload_if_changed():
+    """Reload the model when its file is replaced; the version bump invalidates the cache"""
+    global rf_model, model_version
+    if rf_model is None or artifact_watcher.changed():
+        try:
+            rf_model = joblib.load(MODEL_PATH)
+            model_version += 1
+        except Exception as e:
+            logger.error(f"Model reload error: {e}")
 
 def predict_pump(features: dict) -> int:
     """
@@ -12,15 +40,24 @@ def predict_pump(features: dict) -> int:
     Returns: 0 (OFF) or 1 (ON)
     """
     try:
-        X = np.array([[
-            features.get("water_level", 0),
-            features.get("rain", 0),
-            features.get("solar_historical", 0),
-            features.get("time_of_day", 0),
-            features.get("diesel_cost", 0)
-        ]])
-        prediction = rf_model.predict(X)[0]
-        return int(prediction)
+        _reload_if_changed()
+        key = prediction_cache.make_key(features)
+        version = model_version
+        cached = prediction_cache.get(key, version)
+        if cached is not None:
+            return cached[0]
+
+        X = np.array([[features.get(name, 0) for name in FEATURES]])
+        start = time.perf_counter()
+        probabilities = rf_model.predict_proba(X)[0]
+        elapsed = time.perf_counter() - start
+        PREDICTION_LATENCY.labels("predict_pump").observe(elapsed)
+        profiler.record("model", elapsed)
+        PREDICTION_ROWS.labels("predict_pump").inc()
+        best = int(probabilities.argmax())
+        prediction = int(rf_model.classes_[best])
+        prediction_cache.put(key, (prediction, float(probabilities[best])), version)
+        return prediction
     except Exception as e:
-        print(f"Prediction error: {e}")
+        logger.exception(f"Prediction error: {e}")
         return 0
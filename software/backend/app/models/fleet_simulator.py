@@ -0,0 +1,213 @@
+import numpy as np
+
+from .sites import MINING_SITES
+from config import Config
+
+# India grid emission factor (kg CO2 per kWh) used for the "CO2 avoided" figure
+GRID_EMISSION_FACTOR = 0.82
+
+# What-if presets; any explicit parameter overrides the preset value
+SCENARIOS = {
+    "baseline": {"days": 1, "rain_multiplier": 1.0, "cloud_cover": 0.3},
+    "monsoon_week": {"days": 7, "rain_multiplier": 4.0, "wet_fraction": 0.45, "cloud_cover": 0.7},
+    "cloudburst": {"days": 2, "rain_multiplier": 12.0, "wet_fraction": 0.6, "cloud_cover": 0.9},
+    "dry_summer": {"days": 7, "rain_multiplier": 0.1, "wet_fraction": 0.05, "cloud_cover": 0.05},
+    "grid_outage": {"days": 3, "rain_multiplier": 3.0, "wet_fraction": 0.4, "cloud_cover": 0.7,
+                    "grid_backup": False},
+}
+
+DEFAULT_PARAMS = {
+    "tanks": 100,
+    "days": 1,
+    "step_minutes": 15,
+    "sites": None,               # MINING_SITES keys, assigned round-robin (default: all sites)
+    "seed": None,
+    "container_height": 6.0,     # m
+    "initial_fraction": 0.25,    # starting fill, fraction of container height
+    "rain_multiplier": 1.0,      # scales each site's avg_rainfall_mm_per_day
+    "wet_fraction": 0.25,        # share of steps with rain
+    "catchment_ratio": 40.0,     # runoff area / sump area: 1 mm of rain raises the sump 40 mm
+    "cloud_cover": 0.3,          # 0 = clear sky, 1 = overcast
+    "pump_rate": 0.5,            # m of level removed per hour at full power
+    "pump_kw": 4.5,
+    "start_fraction": 0.6,       # pump starts above this fill ...
+    "stop_fraction": 0.2,        # ... and stops below this one
+    "grid_backup": True,         # run on grid power when solar is below the site threshold
+    "series_points": 200,        # fleet time series is downsampled to about this many points
+}
+
+
+def scenario_params(scenario=None, **overrides):
+    """Defaults, then the named preset, then explicit overrides (None values are ignored)"""
+    if scenario is not None and scenario not in SCENARIOS:
+        raise ValueError(f"Unknown scenario '{scenario}', expected one of {sorted(SCENARIOS)}")
+    unknown = set(overrides) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown simulation parameters: {sorted(unknown)}")
+    params = {**DEFAULT_PARAMS, **SCENARIOS.get(scenario, {})}
+    params.update({key: value for key, value in overrides.items() if value is not None})
+    return params
+
+
+class FleetSimulator:
+    """
+    Vectorized dewatering simulation of N tanks over T steps.
+
+    Each step updates every tank at once: rainfall runoff raises the level,
+    soil absorption (the site's `soil_permeability`) lowers it, and a
+    hysteresis controller runs the pump on solar when irradiance clears the
+    site's `solar_threshold`, otherwise on grid backup if allowed. Rain and
+    irradiance are drawn as whole (steps, tanks) blocks, so the only Python
+    loop is over time steps, with a handful of array operations each.
+    """
+
+    BLOCK_STEPS = 512  # weather is generated this many steps at a time to bound memory
+
+    def __init__(self, max_cells=20_000_000):
+        self.max_cells = max_cells
+
+    def run(self, params):
+        tanks = int(params["tanks"])
+        step_minutes, days = float(params["step_minutes"]), float(params["days"])
+        if not (0 < step_minutes < np.inf and np.isfinite(days)):
+            raise ValueError("step_minutes must be a positive number and days a finite one")
+        dt = step_minutes / 60.0
+        steps = int(round(days * 24 / dt))
+        if tanks < 1 or steps < 1:
+            raise ValueError("Need at least one tank and one step")
+        if tanks * steps > self.max_cells:
+            raise ValueError(f"{tanks} tanks x {steps} steps exceeds the limit of {self.max_cells} tank-steps")
+        if not 0 <= params["stop_fraction"] < params["start_fraction"] <= 1:
+            raise ValueError("Expected 0 <= stop_fraction < start_fraction <= 1")
+        if not 0 < float(params["container_height"]) < np.inf:
+            raise ValueError("container_height must be a positive number")
+        if not 0 <= float(params["pump_rate"]) < np.inf:
+            raise ValueError("pump_rate must be a non-negative number")
+        site_names = params["sites"]
+        if site_names is not None and not (isinstance(site_names, list)
+                                           and all(isinstance(name, str) for name in site_names)):
+            raise ValueError("sites must be a list of site names")
+
+        rng = np.random.default_rng(params["seed"])
+        site_names = site_names or list(MINING_SITES)
+        unknown = [name for name in site_names if name not in MINING_SITES]
+        if unknown:
+            raise ValueError(f"Unknown mining site(s): {unknown}")
+        site_index = np.arange(tanks) % len(site_names)
+        sites = [MINING_SITES[name] for name in site_names]
+
+        def per_tank(field):
+            return np.array([site[field] for site in sites])[site_index]
+
+        height = float(params["container_height"])
+        wet = float(params["wet_fraction"])
+        # Mean intensity on wet steps so the daily total matches avg_rainfall_mm_per_day * multiplier
+        rain_mean_mm_per_hour = per_tank("avg_rainfall_mm_per_day") * params["rain_multiplier"] / 24 / max(wet, 1e-6)
+        absorption = per_tank("soil_permeability") / 100 * dt            # cm/h -> m per step
+        solar_threshold = per_tank("solar_threshold")
+        grid_cost = per_tank("grid_backup_cost")
+        start_level = params["start_fraction"] * height
+        stop_level = params["stop_fraction"] * height
+        pump_step = params["pump_rate"] * dt
+        pump_kwh = params["pump_kw"] * dt
+        catchment = params["catchment_ratio"] / 1000                      # mm of rain -> m of level
+
+        level = np.full(tanks, params["initial_fraction"] * height)
+        running = level >= start_level
+        totals = {name: np.zeros(tanks) for name in
+                  ("rain_mm", "overflow_m", "pump_hours", "solar_kwh", "grid_kwh", "cost_inr")}
+        max_level = level.copy()
+        overflow_steps = np.zeros(tanks, dtype=np.int64)
+
+        stride = max(1, steps // max(1, int(params["series_points"])))
+        series = {"hour": [], "avg_fill_pct": [], "max_fill_pct": [], "pumps_running": [],
+                  "on_grid": [], "overflowing": []}
+
+        for block_start in range(0, steps, self.BLOCK_STEPS):
+            block = min(self.BLOCK_STEPS, steps - block_start)
+            rain, irradiance = self._weather(rng, block_start, block, dt, tanks, wet,
+                                             rain_mean_mm_per_hour, params["cloud_cover"])
+            for i in range(block):
+                step = block_start + i
+                level += rain[i] * catchment - absorption
+                np.maximum(level, 0.0, out=level)
+
+                running = (level >= start_level) | (running & (level > stop_level))
+                on_solar = running & (irradiance[i] >= solar_threshold)
+                on_grid = running & ~on_solar & params["grid_backup"]
+                pumping = on_solar | on_grid
+                level -= np.minimum(level, pump_step * pumping)
+
+                overflow = np.maximum(level - height, 0.0)
+                np.minimum(level, height, out=level)
+                np.maximum(max_level, level, out=max_level)
+
+                totals["rain_mm"] += rain[i]
+                totals["overflow_m"] += overflow
+                totals["pump_hours"] += pumping * dt
+                totals["solar_kwh"] += on_solar * pump_kwh
+                totals["grid_kwh"] += on_grid * pump_kwh
+                overflow_steps += overflow > 0
+
+                if step % stride == 0 or step == steps - 1:
+                    series["hour"].append(round((step + 1) * dt, 3))
+                    series["avg_fill_pct"].append(round(float(level.mean()) / height * 100, 2))
+                    series["max_fill_pct"].append(round(float(level.max()) / height * 100, 2))
+                    series["pumps_running"].append(int(pumping.sum()))
+                    series["on_grid"].append(int(on_grid.sum()))
+                    series["overflowing"].append(int((overflow > 0).sum()))
+
+        totals["cost_inr"] = totals["grid_kwh"] * grid_cost
+        return self._report(params, steps, dt, site_names, site_index, level, max_level,
+                            overflow_steps, totals, series)
+
+    def _weather(self, rng, block_start, block, dt, tanks, wet, rain_mean, cloud_cover):
+        """Rain (mm/h) and irradiance (W/m²) for `block` steps x `tanks`"""
+        hours = (block_start + np.arange(block)) * dt
+        is_wet = rng.random((block, tanks)) < wet
+        rain = np.where(is_wet, rng.exponential(1.0, (block, tanks)) * rain_mean, 0.0) * dt
+
+        clear_sky = np.maximum(0.0, 1000 * np.sin(np.pi * ((hours % 24) - 6) / 12))[:, np.newaxis]
+        clouds = np.clip(rng.normal(cloud_cover, 0.15, (block, tanks)), 0.0, 1.0)
+        irradiance = clear_sky * (1 - 0.8 * clouds) * np.where(is_wet, 0.5, 1.0)
+        return rain, irradiance
+
+    def _report(self, params, steps, dt, site_names, site_index, level, max_level,
+                overflow_steps, totals, series):
+        height = float(params["container_height"])
+        solar_kwh = float(totals["solar_kwh"].sum())
+        per_site = {}
+        for index, name in enumerate(site_names):
+            mask = site_index == index
+            per_site[name] = {
+                "tanks": int(mask.sum()),
+                "final_avg_fill_pct": round(float(level[mask].mean()) / height * 100, 2),
+                "tanks_overflowed": int((overflow_steps[mask] > 0).sum()),
+                "rain_mm": round(float(totals["rain_mm"][mask].mean()), 2),
+                "pump_hours": round(float(totals["pump_hours"][mask].sum()), 2),
+                "grid_kwh": round(float(totals["grid_kwh"][mask].sum()), 2),
+                "cost_inr": round(float(totals["cost_inr"][mask].sum()), 2),
+            }
+        return {
+            "params": params,
+            "steps": steps,
+            "hours": round(steps * dt, 3),
+            "summary": {
+                "tanks": len(level),
+                "final_avg_fill_pct": round(float(level.mean()) / height * 100, 2),
+                "peak_fill_pct": round(float(max_level.max()) / height * 100, 2),
+                "tanks_overflowed": int((overflow_steps > 0).sum()),
+                "overflow_tank_hours": round(float(overflow_steps.sum()) * dt, 2),
+                "pump_hours": round(float(totals["pump_hours"].sum()), 2),
+                "solar_kwh": round(solar_kwh, 2),
+                "grid_kwh": round(float(totals["grid_kwh"].sum()), 2),
+                "cost_inr": round(float(totals["cost_inr"].sum()), 2),
+                "co2_avoided_kg": round(solar_kwh * GRID_EMISSION_FACTOR, 2),
+            },
+            "sites": per_site,
+            "series": series,
+        }
+
+
+# Create a singleton instance for the app to use
+fleet_simulator = FleetSimulator(max_cells=Config.SIMULATION_MAX_CELLS)
@@ -0,0 +1,29 @@
+# MINING SITE CONFIGURATIONS FOR REALISTIC SIMULATION
+# Shared by the training script (models/aiModel.py), the fleet simulator and the energy
+# rollups; kept as plain data so the app can read it without importing pandas or sklearn.
+MINING_SITES = {
+    "Singrauli_MP": {
+        "name": "Singrauli Coalfield, Madhya Pradesh",
+        "soil_permeability": 0.002,  # cm/hour
+        "avg_rainfall_mm_per_day": 3.2,  # Annual average
+        "diesel_cost_range": (85, 95),  # INR per liter
+        "solar_threshold": 200,  # W/m² minimum for solar operation
+        "grid_backup_cost": 8.5  # INR per kWh
+    },
+    "Korba_Chhattisgarh": {
+        "name": "Korba Coalfield, Chhattisgarh",
+        "soil_permeability": 0.0015,
+        "avg_rainfall_mm_per_day": 4.1,
+        "diesel_cost_range": (87, 97),
+        "solar_threshold": 180,
+        "grid_backup_cost": 9.2
+    },
+    "Jharia_Jharkhand": {
+        "name": "Jharia Coalfield, Jharkhand",
+        "soil_permeability": 0.003,
+        "avg_rainfall_mm_per_day": 5.8,
+        "diesel_cost_range": (82, 92),
+        "solar_threshold": 190,
+        "grid_backup_cost": 7.8
+    }
+}
@@ -0,0 +1,184 @@
+import threading
+from datetime import date
+
+import numpy as np
+
+from config import Config
+
+# Same cloud model as the fleet simulator: overcast sky keeps 20% of clear-sky irradiance
+CLOUD_ATTENUATION = 0.8
+MINUTES_PER_DAY = 1440
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _day_of_year(local_seconds):
+    days = np.floor_divide(local_seconds, 86400).astype("datetime64[D]")
+    return (days - days.astype("datetime64[Y]")).astype(np.int64) + 1
+
+
+def day_constants(latitude, doy):
+    """
+    For a latitude (degrees) and day of year, broadcast: solar noon in clock
+    minutes before the longitude correction, the profile stretch to that
+    day's length, and the irradiance gain from noon sun elevation and
+    Earth-Sun distance.
+    """
+    latitude = np.radians(latitude)
+    doy = np.asarray(doy, dtype=np.float64)
+    b = 2 * np.pi * (doy - 81) / 364
+    declination = np.radians(23.45) * np.sin(2 * np.pi * (284 + doy) / 365)
+    equation_of_time = 9.87 * np.sin(2 * b) - 7.53 * np.cos(b) - 1.5 * np.sin(b)
+    half_day = np.arccos(np.clip(-np.tan(latitude) * np.tan(declination), -1.0, 1.0))
+    # Equinox half-day is pi/2; a longer day spreads the profile over more clock minutes
+    stretch = (np.pi / 2) / np.maximum(half_day, 1e-6)
+    gain = np.cos(latitude - declination) / np.cos(latitude) * (1 + 0.033 * np.cos(2 * np.pi * doy / 365))
+    return 720 - equation_of_time, stretch, gain
+
+
+def day_table(latitude):
+    """day_constants for every day of year at one latitude, as rows (row 0 unused)"""
+    return np.stack(day_constants(latitude, np.arange(367)), axis=1)
+
+
+class SolarProfile:
+    """
+    Expected irradiance and panel output at any time, from the measured
+    minute-of-day profile (`synthetic_solar_data_minute.csv`).
+
+    The CSV is compiled once into two tables:
+    - per minute of day: irradiance plus the slope to the next minute, so a
+      fractional minute is one index and one multiply-add;
+    - per 1 W/m² of irradiance: the panel's power, voltage and current, taken
+      from the same file, so output follows the irradiance actually expected
+      rather than the profile's time of day.
+
+    The profile is treated as a clear equinox day. For other days it is
+    stretched about solar noon to that day's length, scaled by the change in
+    noon sun elevation at the site's latitude, then dimmed by cloud cover
+    (0 clear .. 1 overcast). Solar noon follows the longitude and the equation
+    of time. `at()` reads those per-day constants from a table cached per
+    latitude, so one lookup is a few list reads and multiplies; `irradiance()`
+    computes them once per distinct day in the range and evaluates a whole
+    (sites x times) grid in one numpy pass.
+    """
+
+    def __init__(self, minutes, irradiance, voltage, current, power, utc_offset_minutes=330):
+        order = np.argsort(minutes)
+        irradiance = np.asarray(irradiance, dtype=np.float64)[order]
+        if len(irradiance) != MINUTES_PER_DAY:
+            raise ValueError(f"Solar profile needs {MINUTES_PER_DAY} minute rows, got {len(irradiance)}")
+        self.offset = utc_offset_minutes * 60
+        # Minute table, wrapping midnight so minute 1439.5 interpolates towards minute 0
+        wrapped = np.append(irradiance, irradiance[0])
+        self._irradiance = wrapped[:-1]
+        self._slope = np.diff(wrapped)
+        self.noon_minute = float((np.arange(MINUTES_PER_DAY) * irradiance).sum() / irradiance.sum())
+
+        # Irradiance -> (power, voltage, current): mean of the rows at each whole W/m², interpolated between
+        level = np.rint(irradiance).astype(np.int64)
+        levels, inverse = np.unique(level, return_inverse=True)
+        counts = np.bincount(inverse)
+        grid = np.arange(levels[-1] + 1)
+        self._curves = np.stack([
+            np.interp(grid, levels, np.bincount(inverse, weights=np.asarray(column, dtype=np.float64)[order]) / counts)
+            for column in (power, voltage, current)
+        ])
+        self.max_irradiance = int(levels[-1])
+        self.power_at_1000 = float(self._curves[0, min(1000, self.max_irradiance)])
+        self._days = {}  # latitude -> day_table rows, for the scalar path
+        # Plain lists for the scalar path (indexing a list beats indexing an array one element at a time)
+        self._irradiance_list = self._irradiance.tolist()
+        self._slope_list = self._slope.tolist()
+        self._curve_lists = self._curves.tolist()
+
+    def _day_table(self, latitude):
+        table = self._days.get(latitude)
+        if table is None:
+            table = self._days[latitude] = day_table(latitude).tolist()
+        return table
+
+    @classmethod
+    def from_csv(cls, path, utc_offset_minutes=330):
+        data = np.loadtxt(path, delimiter=",", skiprows=1)
+        return cls(data[:, 0], data[:, 1], data[:, 2], data[:, 3], data[:, 4], utc_offset_minutes=utc_offset_minutes)
+
+    def irradiance(self, ts, latitude, longitude, cloud_cover=0.0):
+        """Expected irradiance (W/m²); arguments broadcast, e.g. sites as (S, 1) against times as (T,)"""
+        ts = np.asarray(ts, dtype=np.float64)
+        local = ts + self.offset
+        doy = _day_of_year(local)
+        minute = np.mod(local, 86400) / 60
+
+        # A forecast spans a few days: compute their constants once, then spread them over the times
+        days, which = np.unique(doy, return_inverse=True)
+        noon, stretch, gain = (c[..., which.reshape(doy.shape)] for c in day_constants(latitude, days))
+
+        solar_noon = noon - 4 * (np.asarray(longitude) - self.offset / 240)
+        x = self.noon_minute + (minute - solar_noon) * stretch
+        inside = (x >= 0) & (x < MINUTES_PER_DAY - 1)
+        x = np.where(inside, x, 0.0)
+        index = x.astype(np.int64)
+        clear = self._irradiance[index] + self._slope[index] * (x - index)
+        clouds = 1 - CLOUD_ATTENUATION * np.clip(cloud_cover, 0.0, 1.0)
+        return np.where(inside, np.maximum(clear, 0.0) * gain * clouds, 0.0)
+
+    def at(self, ts, latitude, longitude, cloud_cover=0.0, capacity_w=None):
+        """(irradiance, power, voltage, current) at one instant; the scalar twin of irradiance() + panel()"""
+        local = ts + self.offset
+        day = int(local // 86400)
+        doy = date.fromordinal(EPOCH_ORDINAL + day).timetuple().tm_yday
+        noon, stretch, gain = self._day_table(latitude)[doy]
+        x = self.noon_minute + ((local - day * 86400) / 60 - (noon - 4 * (longitude - self.offset / 240))) * stretch
+        if not 0 <= x < MINUTES_PER_DAY - 1:
+            irradiance = 0.0
+        else:
+            index = int(x)
+            clear = self._irradiance_list[index] + self._slope_list[index] * (x - index)
+            irradiance = max(clear, 0.0) * gain * (1 - CLOUD_ATTENUATION * min(max(cloud_cover, 0.0), 1.0))
+        level = min(int(irradiance + 0.5), self.max_irradiance)
+        power, voltage, current = (curve[level] for curve in self._curve_lists)
+        scale = max(irradiance / max(self.max_irradiance, 1), 1.0)
+        if capacity_w is not None:
+            scale *= capacity_w / self.power_at_1000
+        return irradiance, power * scale, voltage, current * scale
+
+    def panel(self, irradiance, capacity_w=None):
+        """
+        (power W, voltage V, current A) of the profiled panel at `irradiance`.
+        With `capacity_w`, power and current are scaled to a panel of that rating at 1000 W/m².
+        Above the profile's brightest minute, power and current grow in proportion.
+        """
+        irradiance = np.maximum(np.asarray(irradiance, dtype=np.float64), 0.0)
+        index = np.minimum(np.rint(irradiance).astype(np.int64), self.max_irradiance)
+        power, voltage, current = self._curves[:, index]
+        beyond = np.maximum(irradiance / max(self.max_irradiance, 1), 1.0)
+        scale = beyond if capacity_w is None else beyond * (np.asarray(capacity_w) / self.power_at_1000)
+        return power * scale, voltage, current * scale
+
+
+class SolarProfileUnavailable(RuntimeError):
+    """The profile CSV is missing or unreadable"""
+
+
+_profile = None
+_profile_error = None
+_profile_lock = threading.Lock()
+
+
+def solar_profile():
+    """
+    The profile from Config.SOLAR_PROFILE_PATH, compiled on first use.
+    Raises SolarProfileUnavailable if it cannot be loaded (remembered, so the file is tried once).
+    """
+    global _profile, _profile_error
+    if _profile is None:
+        with _profile_lock:
+            if _profile is None and _profile_error is None:
+                try:
+                    _profile = SolarProfile.from_csv(Config.SOLAR_PROFILE_PATH,
+                                                     utc_offset_minutes=Config.SOLAR_UTC_OFFSET_MINUTES)
+                except (OSError, ValueError, IndexError) as e:
+                    _profile_error = SolarProfileUnavailable(f"Solar profile {Config.SOLAR_PROFILE_PATH}: {e}")
+        if _profile is None:
+            raise _profile_error
+    return _profile
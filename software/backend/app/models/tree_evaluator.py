@@ -0,0 +1,138 @@
+import sys
+import numpy as np
+
+ARRAY_KEYS = ("feature", "threshold", "children", "values", "roots", "classes")
+
+
+def export_forest(model, path=None):
+    """
+    Flatten a fitted forest classifier (anything exposing `estimators_` with
+    sklearn `tree_` objects and `classes_`) into packed arrays.
+    `children` is interleaved as [left0, right0, left1, right1, ...] so a step is
+    `children[2 * node + (x > threshold)]`; leaves point to themselves, so
+    traversal needs no leaf test.
+    Optionally saves the arrays to an .npz file at `path`.
+    """
+    if getattr(model, "n_outputs_", 1) != 1:
+        raise ValueError("Only single-output forests can be flattened")
+
+    features, thresholds, children, values, roots = [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+        own_index = np.arange(n) + offset
+
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+        # Leaves get a +inf threshold and point back to themselves from both sides
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold).astype(np.float64))
+        left = np.where(is_leaf, own_index, tree.children_left + offset)
+        right = np.where(is_leaf, own_index, tree.children_right + offset)
+        children.append(np.stack([left, right], axis=1).ravel().astype(np.int32))
+
+        counts = tree.value[:, 0, :].astype(np.float64)
+        totals = counts.sum(axis=1, keepdims=True)
+        values.append(np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0))
+
+        roots.append(offset)
+        offset += n
+        max_depth = max(max_depth, int(tree.max_depth))
+
+    arrays = {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "children": np.concatenate(children),
+        "values": np.concatenate(values),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "classes": np.asarray(model.classes_),
+        "max_depth": np.int32(max_depth),
+        "n_features": np.int32(model.n_features_in_),
+    }
+    if path is not None:
+        np.savez(path, **arrays)
+    return arrays
+
+
+class FlatForest:
+    """
+    Scores rows against packed forest arrays produced by `export_forest`.
+
+    Scoring never imports sklearn and skips its per-call input validation and
+    joblib dispatch. All trees are walked in lockstep, so a single row costs
+    `max_depth` vectorized steps instead of one Python call per tree.
+    """
+
+    def __init__(self, arrays):
+        for key in ARRAY_KEYS:
+            setattr(self, key, np.ascontiguousarray(arrays[key]))
+        self.max_depth = int(arrays["max_depth"])
+        self.n_features = int(arrays["n_features"])
+        self.n_estimators = len(self.roots)
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(export_forest(model))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls({key: data[key] for key in data.files})
+
+    def _prepare(self, X):
+        # Match sklearn: inputs are cast to float32 before being compared with float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected an (n, {self.n_features}) feature matrix, got shape {X.shape}")
+        return np.ascontiguousarray(X, dtype=np.float64)
+
+    def _leaves(self, X):
+        """Leaf index reached in every tree, shape (n_rows, n_estimators)"""
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        row_base = (np.arange(n_rows) * n_features)[:, np.newaxis]
+        node = np.broadcast_to(self.roots, (n_rows, self.n_estimators))
+        for _ in range(self.max_depth):
+            go_right = flat[row_base + self.feature[node]] > self.threshold[node]
+            node = self.children[2 * node + go_right]
+        return node
+
+    def predict_proba(self, X):
+        X = self._prepare(X)
+        return self.values[self._leaves(X)].mean(axis=1)
+
+    def predict(self, X):
+        return self.classes[self.predict_proba(X).argmax(axis=1)]
+
+    def predict_one(self, row):
+        """Single-row fast path: returns (class, confidence) without building a 2-D batch"""
+        x = np.asarray(row, dtype=np.float32).astype(np.float64)
+        node = self.roots
+        for _ in range(self.max_depth):
+            node = self.children[2 * node + (x[self.feature[node]] > self.threshold[node])]
+        proba = self.values[node].mean(axis=0)
+        best = int(proba.argmax())
+        return self.classes[best], float(proba[best])
+
+
+def main(argv=None):
+    """Export a pickled forest: python -m app.models.tree_evaluator <model.pkl> <out.npz>"""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print(main.__doc__)
+        return 1
+    import joblib
+
+    model = joblib.load(argv[0])
+    if isinstance(model, dict):  # SolarDewateringModel.save_model bundles the forest with metadata
+        model = model["model"]
+    arrays = export_forest(model, argv[1])
+    print(f"Exported {len(arrays['roots'])} trees / {len(arrays['feature'])} nodes to {argv[1]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+from flask import Blueprint, Response, jsonify, request
+from ..services.profiler import profiler, check_admin_token
+
+admin_bp = Blueprint("admin", __name__)
+
+@admin_bp.before_request
+def require_admin_token():
+    """Every admin route needs ADMIN_TOKEN; with no token configured they are all refused"""
+    if not check_admin_token(request):
+        return jsonify({"error": "Admin token required"}), 403
+
+@admin_bp.route("/admin/profiling", methods=["GET"])
+def get_profiling():
+    """Profiler state and per-route phase timings collected while profiling was enabled"""
+    return jsonify({**profiler.get_stats(), "routes": profiler.route_stats()})
+
+@admin_bp.route("/admin/profiling", methods=["POST"])
+def set_profiling():
+    """Body: {"enabled": true|false, "reset": true} to toggle per-request phase timing"""
+    data = request.get_json(silent=True) or {}
+    if "enabled" in data:
+        profiler.enabled = bool(data["enabled"])
+    if data.get("reset"):
+        profiler.reset()
+    return jsonify(profiler.get_stats())
+
+@admin_bp.route("/admin/profiling/sample", methods=["GET", "POST"])
+def sample_profile():
+    """
+    Sample all thread stacks for ?seconds=<n> (default 5) every ?interval_ms=<n>;
+    ?thread=<substring> keeps only matching threads. Returns folded stacks for
+    flamegraph.pl / speedscope, or ?format=json for the raw counts.
+    """
+    try:
+        seconds = float(request.args.get("seconds", 5))
+        interval_ms = float(request.args.get("interval_ms", profiler.default_interval_ms))
+    except ValueError:
+        return jsonify({"error": "'seconds' and 'interval_ms' must be numbers"}), 400
+    try:
+        folded = profiler.sample(seconds, interval_ms, thread_filter=request.args.get("thread"))
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+
+    if request.args.get("format") == "json":
+        return jsonify({"stacks": dict(folded.most_common()), "total_samples": sum(folded.values())})
+    return Response(profiler.render_folded(folded), mimetype="text/plain",
+                    headers={"Content-Disposition": "attachment; filename=profile.folded"})
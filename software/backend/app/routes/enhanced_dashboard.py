@@ -1,193 +1,446 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 import numpy as np
-import requests
 import time
 from datetime import datetime, timedelta
 from threading import Thread
 import logging
 import json
 from ..services.ai_model_service import ai_service
+from ..models.fleet_simulator import fleet_simulator, scenario_params, SCENARIOS
 from ..services.mqtt_service import mqtt_service
+from ..services.state_store import state_store, sensor_to_percentage
+from ..services.telemetry_service import telemetry_ingestor
+from ..services.storage_service import storage_service
+from ..services.weather_service import weather_provider
+from ..services.online_learning import online_learner
+from ..services.pump_commands import pump_commands
+from ..services.history_service import history_service, parse_time
+from ..services.rollup_service import rollup_service
+from ..services.solar_forecast import solar_forecast
+from ..models.solar_profile import SolarProfileUnavailable
+from ..services.status_stream import status_stream
+from ..services.status_cache import status_cache
+from ..services.metrics import UPDATE_LOOP_DRIFT, UPDATE_LOOP_DURATION
+from ..services.profiler import profiler
+from ..services.cluster import cluster
+from config import Config
 
 enhanced_dashboard_bp = Blueprint("enhanced_dashboard", __name__)
 logger = logging.getLogger(__name__)
 
-# Global system state (structure remains the same)
-system_state = {
-    "pump_status": "OFF",
-    "water_level": 1.5,
-    "water_percentage": 25.0,
-    "solar_power": 0.0,
-    "hybrid_usage": 0.0,
-    "co2_saved": 120.0,
-    "ai_prediction": 0,
-    "ai_confidence": 0.0,
-    "manual_override": False,
-    "manual_override_until": None,
-    "last_updated": datetime.now().isoformat(),
-    "weather": {
-        "temperature": 28.5,
-        "humidity": 65,
-        "solar_irradiance": 450,
-        "rainfall": 0.0
-    },
-    "energy_data": [
-        {"month": "Jan", "value": 100},
-        {"month": "Feb", "value": 150},
-        {"month": "Mar", "value": 200},
-        {"month": "Apr", "value": 180},
-        {"month": "May", "value": 220},
-        {"month": "Jun", "value": 190}
-    ],
-    "demand_data": [
-        {"month": "Jan", "value": 80},
-        {"month": "Feb", "value": 120},
-        {"month": "Mar", "value": 180},
-        {"month": "Apr", "value": 160},
-        {"month": "May", "value": 200},
-        {"month": "Jun", "value": 170}
-    ],
-    "system_health": {
-        "mqtt_connected": True,
-        "ai_model_status": "Active",
-        "sensor_status": "Online",
-        "pump_health": "Good"
-    }
-}
-
-# (fetch_weather_data function remains the same)
+# Per-site system state lives in the copy-on-write state store
+for _site_id in Config.SITE_IDS:
+    state_store.register_site(_site_id)
+
+def resolve_site_id():
+    """Site id from the query string or JSON body, falling back to the default site"""
+    site_id = request.args.get("site")
+    if site_id is None and request.is_json:
+        body = request.get_json(silent=True)
+        site_id = body.get("site") if isinstance(body, dict) else None
+    return site_id or Config.DEFAULT_SITE_ID
+
+def unknown_site(site_id):
+    return jsonify({"error": f"Unknown site: {site_id}"}), 404
+
 def fetch_weather_data():
-    """Fetch real weather data from Open-Meteo API"""
-    try:
-        lat, lon = 24.1197, 82.6739  # Singrauli coordinates
-        url = "https://api.open-meteo.com/v1/current"
-        params = {
-            "latitude": lat,
-            "longitude": lon,
-            "current": "temperature_2m,relative_humidity_2m,precipitation,shortwave_radiation"
-        }
-        response = requests.get(url, params=params, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            current = data.get("current", {})
-            return {
-                "temperature": current.get("temperature_2m", 28.5),
-                "humidity": current.get("relative_humidity_2m", 65),
-                "solar_irradiance": current.get("shortwave_radiation", 450),
-                "rainfall": current.get("precipitation", 0.0)
-            }
-    except Exception as e:
-        logger.error(f"Weather API error: {e}")
-    
-    import random
-    base_time = time.time()
-    return {
-        "temperature": 28 + 5 * np.sin(base_time / 3600) + random.uniform(-2, 2),
-        "humidity": 65 + 15 * np.sin(base_time / 7200) + random.uniform(-5, 5), 
-        "solar_irradiance": max(0, 400 + 300 * np.sin(base_time / 1800) + random.uniform(-50, 50)),
-        "rainfall": max(0, 2 * np.sin(base_time / 5400) + random.uniform(-1, 2))
-    }
+    """Latest weather from the background provider (never blocks on the network)"""
+    return weather_provider.current()
 
-def update_system_state():
-    """Background thread to continuously update system state with correct dewatering simulation"""
-    global system_state
+def step_site_state(state):
+    """Advance one site by one tick of the dewatering simulation and return the changes"""
+    # Sites reporting live telemetry keep their measured level; only idle sites are simulated
+    if time.time() - state.get("last_telemetry", 0) < Config.TELEMETRY_STALE_SECONDS:
+        return {}
 
-    while True:
-        try:
-            # --- LOGIC FOR INVERTED SENSOR ---
-            # This part now assumes water_level is the raw sensor reading (distance from top)
-            raw_sensor_reading = system_state["water_level"]
-            container_height = 6.0
-
-            if raw_sensor_reading >= 0: # Handle valid readings
-                # Invert the reading: actual level = height - distance from top
-                actual_level = container_height - raw_sensor_reading
-                # Calculate percentage based on the actual level
-                percentage = (actual_level / container_height) * 100
-                system_state["water_percentage"] = max(0, min(100, percentage))
-            else: # Handle the -1.0 error case
-                system_state["water_percentage"] = 0 # Show as empty or error
-
-            # --- SIMULATION LOGIC (REMAINS THE SAME) ---
-            if system_state["pump_status"] == "Running":
-                decrease = np.random.uniform(0.15, 0.4)
-                system_state["water_level"] = min(container_height, system_state["water_level"] + decrease) # Sensor distance increases as water is removed
-            else:
-                increase = np.random.uniform(0.08, 0.2)
-                system_state["water_level"] = max(0.0, system_state["water_level"] - increase) # Sensor distance decreases as water rises
-
-            # (The rest of the function for weather, AI prediction, etc. remains the same)
-            # ...
+    changes = {}
+
+    # --- LOGIC FOR INVERTED SENSOR ---
+    # This part now assumes water_level is the raw sensor reading (distance from top)
+    container_height = 6.0
+    changes["water_percentage"] = sensor_to_percentage(state["water_level"], container_height)
+
+    # --- SIMULATION LOGIC (REMAINS THE SAME) ---
+    if state["pump_status"] == "Running":
+        decrease = np.random.uniform(0.15, 0.4)
+        changes["water_level"] = min(container_height, state["water_level"] + decrease) # Sensor distance increases as water is removed
+    else:
+        increase = np.random.uniform(0.08, 0.2)
+        changes["water_level"] = max(0.0, state["water_level"] - increase) # Sensor distance decreases as water rises
+
+    return changes
 
+def update_all_sites():
+    """One tick of the state update loop across every site"""
+    weather = fetch_weather_data()
+    for site_id in state_store.site_ids():
+        try:
+            state = state_store.get(site_id)
+            changes = step_site_state(state)
+            if state["weather"] is not weather:
+                changes["weather"] = weather
+            if changes:
+                state = state_store.update(site_id, changes)
+            if "water_level" in changes:
+                storage_service.record_telemetry(site_id, state, source="simulation")
         except Exception as e:
-            logger.error(f"State update error: {e}")
+            logger.error(f"State update error for {site_id}: {e}")
 
-        time.sleep(2)
+def update_system_state():
+    """Background thread to continuously update every site's state with correct dewatering simulation"""
+    interval = Config.UPDATE_INTERVAL
+    next_tick = time.monotonic()
+    while True:
+        # Ticks are scheduled on a fixed grid, so slow ticks do not push every later one back
+        started = time.monotonic()
+        UPDATE_LOOP_DRIFT.observe(max(0.0, started - next_tick))
+        update_all_sites()
+        UPDATE_LOOP_DURATION.observe(time.monotonic() - started)
+        next_tick += interval
+        if next_tick < time.monotonic():
+            next_tick = time.monotonic()  # fell behind by more than a tick: skip, don't burst
+        time.sleep(max(0.0, next_tick - time.monotonic()))
 
-# (The rest of the file, including thread start and all API endpoints, remains the same)
+monitor_thread = None
 
-monitor_thread = Thread(target=update_system_state, daemon=True)
-monitor_thread.start()
+def start_simulation():
+    """Lifecycle hook: start the background state update loop (once)"""
+    global monitor_thread
+    if monitor_thread is None:
+        monitor_thread = Thread(target=update_system_state, name="state-update", daemon=True)
+        monitor_thread.start()
 
 @enhanced_dashboard_bp.route("/status", methods=["GET"])
 def get_system_status():
-    """Get complete system status"""
-    return jsonify(system_state)
+    """
+    Get complete system status for one site (?site=<id>).
+    Responses carry a strong ETag; If-None-Match with the current one gets 304.
+    ?since=<version> (a version or an earlier ETag) returns only the keys changed since then.
+    """
+    site_id = resolve_site_id()
+    if site_id not in state_store:
+        return unknown_site(site_id)
+
+    since = request.args.get("since")
+    # Serialization inside the cache is timed as its own phase
+    with profiler.phase("state_read"):
+        if since is not None:
+            since_version = status_cache.parse_version(since)
+            if since_version is None:
+                since_version = -1  # Unknown or foreign version: the delta falls back to everything
+            version, body = status_cache.delta(site_id, since_version)
+        else:
+            version, body = status_cache.full(site_id)
+
+    etag = status_cache.etag(version)
+    headers = {"ETag": f'"{etag}"', "X-State-Version": str(version), "Cache-Control": "no-cache"}
+    # A delta asked from the current version is "nothing changed" too
+    if request.if_none_match.contains(etag) or (since is not None and since_version == version):
+        status_cache.stats["not_modified"] += 1
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype="application/json", headers=headers)
+
+@enhanced_dashboard_bp.route("/status/stream", methods=["GET"])
+def stream_system_status():
+    """
+    Server-Sent Events stream of state changes: a `snapshot` per site on connect,
+    then `delta` events with only the changed fields. ?site=<id> (default site),
+    ?sites=a,b or ?sites=* for every site. Reconnects resume via Last-Event-ID.
+    503 with Retry-After once this worker has STREAM_MAX_CLIENTS streams open.
+    """
+    sites = request.args.get("sites")
+    if sites == "*":
+        site_ids = None
+    else:
+        site_ids = [s for s in sites.split(",") if s] if sites else [resolve_site_id()]
+        unknown = [s for s in site_ids if s not in state_store]
+        if unknown:
+            return unknown_site(unknown[0])
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    connection = status_stream.connect(site_ids, last_event_id)
+    if connection is None:
+        response = jsonify({"error": "Too many open streams on this worker, retry later",
+                            "max_clients": status_stream.max_clients})
+        response.headers["Retry-After"] = str(max(1, round(status_stream.retry_ms / 1000)))
+        return response, 503
+    return Response(
+        connection,
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@enhanced_dashboard_bp.route("/status/stream/stats", methods=["GET"])
+def get_stream_stats():
+    """Get connected stream clients and event history counters"""
+    return jsonify(status_stream.get_stats())
+
+@enhanced_dashboard_bp.route("/fleet", methods=["GET"])
+def get_fleet_status():
+    """Get the precomputed fleet summary and the list of tracked sites"""
+    return jsonify({**state_store.fleet_summary(), "sites": state_store.site_ids()})
+
+@enhanced_dashboard_bp.route("/telemetry/stats", methods=["GET"])
+def get_telemetry_stats():
+    """Get MQTT telemetry ingestion counters and queue depth"""
+    return jsonify(telemetry_ingestor.get_stats())
+
+@enhanced_dashboard_bp.route("/weather", methods=["GET"])
+def get_weather():
+    """Get the cached weather reading with its age and the provider/circuit status"""
+    return jsonify({**fetch_weather_data(), "provider": weather_provider.get_status()})
+
+@enhanced_dashboard_bp.route("/storage/stats", methods=["GET"])
+def get_storage_stats():
+    """Get persistence writer counters"""
+    return jsonify(storage_service.get_stats())
+
+@enhanced_dashboard_bp.route("/history", methods=["GET"])
+def get_history():
+    """
+    Downsampled history of one or more metrics for charts:
+    ?metric=water_level,solar_power&start=<epoch|ISO>&end=<epoch|ISO>&points=500&method=lttb|minmax
+    """
+    site_id = resolve_site_id()
+    metrics = [m.strip() for m in request.args.get("metric", "water_level").split(",") if m.strip()]
+    try:
+        end = parse_time(request.args.get("end"), None)
+        start = parse_time(request.args.get("start"), None)
+        with profiler.phase("history_query"):
+            result = history_service.query(site_id, metrics, start=start, end=end,
+                                           points=request.args.get("points", type=int),
+                                           method=request.args.get("method"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with profiler.phase("serialization"):
+        return jsonify(result)
+
+@enhanced_dashboard_bp.route("/energy/rollups", methods=["GET"])
+def get_energy_rollups():
+    """
+    Solar/grid kWh, pump runtime, cost (INR) and CO2 avoided per bucket, plus range totals:
+    ?grain=minute|hour|day|month&start=<epoch|ISO>&end=<epoch|ISO>&site=<id>|all
+    """
+    site_id = None if request.args.get("site") == "all" else resolve_site_id()
+    grain = request.args.get("grain", "day")
+    try:
+        end = parse_time(request.args.get("end"), time.time())
+        start = parse_time(request.args.get("start"), end - 30 * 86400)
+        if start >= end:
+            raise ValueError("start must be before end")
+        with profiler.phase("rollup_query"):
+            buckets = rollup_service.series(site_id, grain, start, end)
+            totals = rollup_service.totals(site_id, start, end)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"site_id": site_id or "all", "grain": grain, "start": start, "end": end,
+                    "buckets": buckets, "totals": totals})
+
+@enhanced_dashboard_bp.route("/energy/summary", methods=["GET"])
+def get_energy_summary():
+    """Energy, cost and CO2 totals for today, this month and all time (site=<id>|all)"""
+    site_id = None if request.args.get("site") == "all" else resolve_site_id()
+    now = time.time()
+    clock = rollup_service.clock
+    periods = {"today": clock.floor("day", now), "month": clock.floor("month", now), "all_time": 0}
+    with profiler.phase("rollup_query"):
+        summary = {name: rollup_service.totals(site_id, start, now + 60) for name, start in periods.items()}
+    return jsonify({"site_id": site_id or "all", **summary, "stats": rollup_service.get_stats()})
+
+@enhanced_dashboard_bp.route("/solar/expected", methods=["GET"])
+def get_solar_expected():
+    """Expected irradiance and panel output for a site: ?t=<epoch|ISO>&cloud=0..1&capacity_w="""
+    site_id = resolve_site_id()
+    try:
+        ts = parse_time(request.args.get("t"), None)
+        return jsonify(solar_forecast.expected(site_id, ts, cloud_cover=request.args.get("cloud", type=float),
+                                               capacity_w=request.args.get("capacity_w", type=float)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except SolarProfileUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+
+@enhanced_dashboard_bp.route("/solar/forecast", methods=["GET"])
+def get_solar_forecast():
+    """
+    Irradiance and panel output for the next hours, for many sites at once:
+    ?site=<id>,<id>|all&start=<epoch|ISO>&hours=24&step=15&cloud=0..1&capacity_w=
+    """
+    sites = request.args.get("site", Config.DEFAULT_SITE_ID)
+    site_ids = state_store.site_ids() if sites == "all" else [s.strip() for s in sites.split(",") if s.strip()]
+    try:
+        start = parse_time(request.args.get("start"), None)
+        with profiler.phase("solar_forecast"):
+            result = solar_forecast.forecast(site_ids, start=start, hours=request.args.get("hours", 24, type=float),
+                                             step_minutes=request.args.get("step", 15, type=int),
+                                             cloud_cover=request.args.get("cloud", type=float),
+                                             capacity_w=request.args.get("capacity_w", type=float))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except SolarProfileUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    with profiler.phase("serialization"):
+        return jsonify(result)
+
+@enhanced_dashboard_bp.route("/cluster/stats", methods=["GET"])
+def get_cluster_stats():
+    """This worker's cluster role, replication counters and shared segment stats"""
+    return jsonify(cluster.get_stats())
 
 @enhanced_dashboard_bp.route("/ai-status", methods=["GET"])
 def get_ai_status():
     """Get AI model status and info"""
+    site_id = resolve_site_id()
+    state = state_store.get(site_id)
+    if state is None:
+        return unknown_site(site_id)
     model_info = ai_service.get_model_info()
     return jsonify({
         **model_info,
-        "last_prediction": system_state["ai_prediction"],
-        "confidence": round(system_state["ai_confidence"], 3)
+        "last_prediction": state["ai_prediction"],
+        "confidence": round(state["ai_confidence"], 3)
+    })
+
+@enhanced_dashboard_bp.route("/ai/online-learning", methods=["GET"])
+def get_online_learning_status():
+    """Get the online learner's window size, update counters and online tree count"""
+    return jsonify(online_learner.get_stats())
+
+@enhanced_dashboard_bp.route("/ai/online-learning/update", methods=["POST"])
+def run_online_learning_update():
+    """Run one online update now (also works while the background worker is disabled)"""
+    updated = online_learner.update()
+    return jsonify({"updated": updated, **online_learner.get_stats()}), 200 if updated else 409
+
+@enhanced_dashboard_bp.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    """
+    Predict pump state for many tanks with one model call.
+    Body: {"features": [[...], ...]} in feature order, or {"rows": [{feature: value}, ...]},
+    plus optional "sites": [...] to store each prediction against its site.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        if "features" in data:
+            matrix = np.asarray(data["features"], dtype=np.float32)
+        elif "rows" in data:
+            matrix = ai_service.features_to_matrix(data["rows"])
+        else:
+            return jsonify({"error": "Provide 'features' or 'rows'", "features": ai_service.features}), 400
+        predictions, confidences = ai_service.predict_batch(matrix)
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({"error": f"Invalid feature batch: {e}"}), 400
+
+    sites = data.get("sites")
+    if sites is not None:
+        if len(sites) != len(predictions):
+            return jsonify({"error": "'sites' must have one entry per feature row"}), 400
+        for site_id, row, prediction, confidence in zip(sites, matrix.tolist(), predictions, confidences):
+            storage_service.record_prediction(site_id, prediction, confidence,
+                                              features=dict(zip(ai_service.features, row)))
+            if site_id in state_store:
+                state_store.update(site_id, {"ai_prediction": int(prediction), "ai_confidence": float(confidence)})
+
+    with profiler.phase("serialization"):
+        return jsonify({
+            "count": len(predictions),
+            "predictions": predictions.tolist(),
+            "confidences": [round(c, 4) for c in confidences.tolist()]
+        })
+
+@enhanced_dashboard_bp.route("/simulate", methods=["POST"])
+def run_simulation():
+    """
+    Run a what-if dewatering scenario across a simulated fleet.
+    Body: {"scenario": "monsoon_week", "tanks": 500, ...} - any parameter overrides the preset.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid simulation request: body must be a JSON object"}), 400
+    data = dict(data)
+    try:
+        params = scenario_params(data.pop("scenario", None), **data)
+        start = time.perf_counter()
+        result = fleet_simulator.run(params)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid simulation request: {e}"}), 400
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"🌧️ Simulated {params['tanks']} tanks x {result['steps']} steps in {result['elapsed_ms']} ms")
+    return jsonify(result)
+
+@enhanced_dashboard_bp.route("/simulate/scenarios", methods=["GET"])
+def list_simulation_scenarios():
+    """Get the what-if presets and the default simulation parameters"""
+    return jsonify({"scenarios": SCENARIOS, "defaults": scenario_params()})
+
+def set_pump_manually(site_id, pump_status):
+    """Record the operator's choice and send it to the pump; returns the dispatched command"""
+    storage_service.record_pump_action(site_id, "start" if pump_status == "Running" else "stop")
+    # The operator's choice for the current conditions is a high-weight training label
+    online_learner.observe_state(state_store.get(site_id), pump_status, override=True)
+    state_store.update(site_id, {
+        "pump_status": pump_status,
+        "manual_override": True,
+        "manual_override_until": (datetime.now() + timedelta(minutes=10)).isoformat()
     })
+    # Confirmed asynchronously by telemetry; poll /api/pump-commands/<id> for the outcome
+    return pump_commands.dispatch(site_id, "ON" if pump_status == "Running" else "OFF")
 
 @enhanced_dashboard_bp.route("/start-pump", methods=["POST"])
 def start_pump():
     """Manually start pump"""
-    global system_state
-    system_state["pump_status"] = "Running"
-    system_state["manual_override"] = True
-    system_state["manual_override_until"] = (datetime.now() + timedelta(minutes=10)).isoformat()
-    logger.info("👤 Pump started manually")
-    return jsonify({"message": "Pump started successfully", "manual_override": True})
+    site_id = resolve_site_id()
+    if site_id not in state_store:
+        return unknown_site(site_id)
+    command = set_pump_manually(site_id, "Running")
+    logger.info(f"👤 Pump started manually ({site_id}, command {command.id})")
+    return jsonify({"message": "Pump started successfully", "manual_override": True,
+                    "command": command.to_dict()})
 
 @enhanced_dashboard_bp.route("/stop-pump", methods=["POST"])
 def stop_pump():
     """Manually stop pump"""
-    global system_state
-    system_state["pump_status"] = "OFF"
-    system_state["manual_override"] = True
-    system_state["manual_override_until"] = (datetime.now() + timedelta(minutes=10)).isoformat()
-    logger.info("👤 Pump stopped manually")
-    return jsonify({"message": "Pump stopped successfully", "manual_override": True})
+    site_id = resolve_site_id()
+    if site_id not in state_store:
+        return unknown_site(site_id)
+    command = set_pump_manually(site_id, "OFF")
+    logger.info(f"👤 Pump stopped manually ({site_id}, command {command.id})")
+    return jsonify({"message": "Pump stopped successfully", "manual_override": True,
+                    "command": command.to_dict()})
 
 @enhanced_dashboard_bp.route("/manual-override", methods=["POST"])
 def toggle_manual_override():
     """Toggle manual override mode"""
-    global system_state
+    site_id = resolve_site_id()
+    if site_id not in state_store:
+        return unknown_site(site_id)
     data = request.get_json()
     enabled = data.get("enabled", False)
-    system_state["manual_override"] = enabled
+    changes = {"manual_override": enabled}
+    response = {}
     if not enabled:
-        system_state["manual_override_until"] = None
-        logger.info("👤 Manual override disabled, AI control resumed")
+        changes["manual_override_until"] = None
+        # Release the firmware's manual lock as well
+        response["command"] = pump_commands.dispatch(site_id, "AUTO").to_dict()
+        logger.info(f"👤 Manual override disabled, AI control resumed ({site_id})")
     else:
-        logger.info("👤 Manual override enabled")
-    return jsonify({"manual_override": system_state["manual_override"]})
+        logger.info(f"👤 Manual override enabled ({site_id})")
+    state = state_store.update(site_id, changes)
+    storage_service.record_pump_action(site_id, "override_on" if enabled else "override_off")
+    return jsonify({"manual_override": state["manual_override"], **response})
 
 @enhanced_dashboard_bp.route("/reset-system", methods=["POST"])
 def reset_system():
     """Reset system to default state"""
-    global system_state
-    system_state.update({
+    site_id = resolve_site_id()
+    if site_id not in state_store:
+        return unknown_site(site_id)
+    state_store.update(site_id, {
         "pump_status": "OFF",
         "water_level": 1.5,
         "water_percentage": 25.0,
         "manual_override": False,
         "manual_override_until": None
     })
-    logger.info("🔄 System reset to default state")
-    return jsonify({"message": "System reset successfully"})
\ No newline at end of file
+    storage_service.record_pump_action(site_id, "reset")
+    logger.info(f"🔄 System reset to default state ({site_id})")
+    return jsonify({"message": "System reset successfully"})
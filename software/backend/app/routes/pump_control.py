@@ -1,11 +1,22 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
+
+from ..services.pump_commands import pump_commands
 
 pump_bp = Blueprint("pump", __name__)
 
-@pump_bp.route("/start-pump", methods=["POST"])
-def start_pump():
-    return jsonify({"message": "Pump started successfully"}), 200
+# /start-pump and /stop-pump live in enhanced_dashboard.py; these report what became of them
+
+@pump_bp.route("/pump-commands", methods=["GET"])
+def list_pump_commands():
+    """Most recent pump commands (newest first) and dispatcher stats"""
+    limit = request.args.get("limit", 50, type=int)
+    return jsonify({"commands": pump_commands.recent(max(1, min(limit, 1000))),
+                    "stats": pump_commands.get_stats()})
 
-@pump_bp.route("/stop-pump", methods=["POST"])
-def stop_pump():
-    return jsonify({"message": "Pump stopped successfully"}), 200
+@pump_bp.route("/pump-commands/<command_id>", methods=["GET"])
+def get_pump_command(command_id):
+    """One pump command by correlation id: pending, acknowledged, failed or superseded"""
+    command = pump_commands.get(command_id)
+    if command is None:
+        return jsonify({"error": f"Unknown pump command: {command_id}"}), 404
+    return jsonify(command)
@@ -1,24 +1,60 @@
-import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
+import numpy as np
 import joblib
 import os
+import time
 import logging
+import threading
+import warnings
+from ..models.tree_evaluator import FlatForest
+from .prediction_cache import PredictionCache, ArtifactWatcher, parse_resolutions
+from .metrics import PREDICTION_LATENCY, PREDICTION_ROWS
+from .profiler import profiler
+from config import Config
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# pandas and sklearn are imported where they are needed so importing the app stays cheap;
+# unpickling the forest pulls sklearn in on the warm-up thread.
+
 class AIModelService:
+    # Up to this many rows the flat-array evaluator beats sklearn's threaded predict_proba
+    COMPILED_MAX_BATCH = 256
+
     def __init__(self, dataset_path="pump_predictions (3).csv", model_path="trained_model.pkl"):
         self.dataset_path = dataset_path
         self.model_path = model_path
         self.model = None
+        self.compiled_model = None
+        # Bumped on every (re)load so cached predictions from an older model are never served
+        self.model_version = 0
         # These are the feature columns the model will use for prediction.
         # Your CSV must contain these columns.
         self.features = ["water_level", "rain", "solar_historical", "time_of_day", "diesel_cost"]
         # This is the column the model will learn to predict from your CSV.
         self.target = "pump_state"
 
+        self.cache = PredictionCache(
+            self.features,
+            parse_resolutions(Config.PREDICTION_CACHE_RESOLUTIONS),
+            max_entries=Config.PREDICTION_CACHE_SIZE,
+            ttl=Config.PREDICTION_CACHE_TTL,
+        )
+        self.artifact_watcher = ArtifactWatcher(self.model_path, Config.MODEL_WATCH_INTERVAL)
+        # One background reload at a time; changes seen meanwhile are picked up when it finishes
+        self._reload_lock = threading.Lock()
+        self._reload_requested = threading.Event()
+
+    def warm_up(self):
+        """Lifecycle hook: load (or train) the model and run one prediction so the first request is fast"""
         self.load_or_train_model()
+        if self.model is None:
+            raise RuntimeError(f"No model available from '{self.model_path}' or '{self.dataset_path}'")
+        self.predict_batch(np.zeros((1, len(self.features)), dtype=np.float32))
+
+    @property
+    def ready(self):
+        return self.model is not None
 
     def load_or_train_model(self):
         """
@@ -36,11 +72,86 @@ class AIModelService:
                 logger.error(f"FATAL: No model '{self.model_path}' or dataset '{self.dataset_path}' found. AI service cannot operate.")
         except Exception as e:
             logger.error(f"❌ Error during model loading or training: {e}")
+        self._compile_model()
+        self.model_version += 1
+        # Snapshot the artifact after loading/training so our own save is not seen as a change
+        self.artifact_watcher = ArtifactWatcher(self.model_path, Config.MODEL_WATCH_INTERVAL)
+
+    def _compile_model(self):
+        """Flatten the forest for fast small-batch inference; sklearn stays the fallback"""
+        self.compiled_model = None
+        if self.model is None:
+            return
+        try:
+            self.compiled_model = FlatForest.from_model(self.model)
+            logger.info(f"⚡ Compiled {self.compiled_model.n_estimators} trees for flat-array inference")
+        except Exception as e:
+            logger.warning(f"Could not compile model, using sklearn inference: {e}")
+
+    def install_model(self, model, persist=False):
+        """
+        Swap in a new fitted model without pausing predictions.
+        The forest is compiled before any reference changes, so readers see either
+        the old or the new model; the version bump invalidates cached predictions.
+        With `persist`, the model is also written to `model_path` (atomically).
+        """
+        compiled_model = None
+        try:
+            compiled_model = FlatForest.from_model(model)
+        except Exception as e:
+            logger.warning(f"Could not compile model, using sklearn inference: {e}")
+        if persist:
+            tmp_path = self.model_path + ".tmp"
+            joblib.dump(model, tmp_path)
+            os.replace(tmp_path, self.model_path)
+        self.compiled_model = compiled_model
+        self.model = model
+        self.model_version += 1
+        if persist:
+            # Our own write is not an external change to reload
+            self.artifact_watcher = ArtifactWatcher(self.model_path, Config.MODEL_WATCH_INTERVAL)
+        logger.info(f"🔀 Installed model version {self.model_version} ({getattr(model, 'n_estimators', '?')} trees)")
+
+    def schedule_reload(self):
+        """Reload the artifact on a background thread; returns at once"""
+        self._reload_requested.set()
+        if self._reload_lock.acquire(blocking=False):
+            threading.Thread(target=self._reload_worker, name="model-reload", daemon=True).start()
+
+    def _reload_worker(self):
+        try:
+            while self._reload_requested.is_set():
+                self._reload_requested.clear()
+                self.reload_model()
+        finally:
+            self._reload_lock.release()
+        if self._reload_requested.is_set():
+            self.schedule_reload()  # requested between the last check and the release
+
+    def reload_model(self):
+        """
+        Load the artifact at `model_path` and install it. Never trains: if the
+        file is gone or unreadable the current model keeps serving.
+        """
+        if not os.path.exists(self.model_path):
+            logger.warning(f"⚠️ Model artifact '{self.model_path}' disappeared, "
+                           f"keeping model version {self.model_version}")
+            return False
+        try:
+            model = joblib.load(self.model_path)
+        except Exception as e:
+            logger.error(f"❌ Could not reload '{self.model_path}', keeping model version {self.model_version}: {e}")
+            return False
+        self.install_model(model)
+        return True
 
     def _train_model_from_csv(self):
         """
         Loads the CSV, trains the RandomForest model, and saves it to a .pkl file.
         """
+        import pandas as pd
+        from sklearn.ensemble import RandomForestClassifier
+
         try:
             # Load the dataset using pandas
             df = pd.read_csv(self.dataset_path)
@@ -69,27 +180,94 @@ class AIModelService:
             logger.error(f"❌ Failed to train model from CSV: {e}")
             self.model = None
 
+    def features_to_matrix(self, rows):
+        """Pack a list of feature dicts into a contiguous float32 matrix in `self.features` order"""
+        matrix = np.empty((len(rows), len(self.features)), dtype=np.float32)
+        for i, row in enumerate(rows):
+            matrix[i] = [row.get(name, 0) for name in self.features]
+        return matrix
+
+    def predict_batch(self, feature_matrix):
+        """
+        Predict pump state for many tanks at once.
+        `feature_matrix` is an (n_tanks, n_features) array with columns in `self.features` order.
+        Returns (predictions, confidences) arrays from a single predict_proba pass.
+        """
+        # float32 + C order is what the tree code uses internally, so no copy is made per call
+        X = np.ascontiguousarray(feature_matrix, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != len(self.features):
+            raise ValueError(f"Expected an (n, {len(self.features)}) feature matrix, got shape {X.shape}")
+
+        if self.model is None:
+            logger.warning("No model available, cannot make a prediction.")
+            return np.zeros(len(X), dtype=np.int64), np.zeros(len(X), dtype=np.float64)
+
+        # Read each reference once: `install_model` may swap them from another thread
+        model, compiled_model = self.model, self.compiled_model
+        start = time.perf_counter()
+        if compiled_model is not None and len(X) <= self.COMPILED_MAX_BATCH:
+            path = "compiled"
+            probabilities = compiled_model.predict_proba(X)
+            classes = compiled_model.classes
+        else:
+            path = "sklearn"
+            # X is a plain array in `self.features` order; a model fitted on a DataFrame
+            # would otherwise warn on every call about the missing column names
+            with warnings.catch_warnings():
+                warnings.filterwarnings("ignore", message="X does not have valid feature names")
+                probabilities = model.predict_proba(X)
+            classes = model.classes_
+        elapsed = time.perf_counter() - start
+        PREDICTION_LATENCY.labels(path).observe(elapsed)
+        profiler.record("model", elapsed)
+        PREDICTION_ROWS.labels(path).inc(len(X))
+        best = probabilities.argmax(axis=1)
+        predictions = classes[best].astype(np.int64)
+        confidences = probabilities[np.arange(len(X)), best]
+        return predictions, confidences
+
     def predict(self, features_dict):
         """
         Makes a pump prediction based on a dictionary of live features.
+        Results are memoized on quantized features until the model changes.
         """
+        if self.artifact_watcher.changed():
+            logger.info(f"🔁 Model artifact '{self.model_path}' changed on disk, reloading in the background...")
+            self.schedule_reload()
+
         if self.model is None:
             logger.warning("No model available, cannot make a prediction.")
             return 0, 0.0  # Default to OFF if no model is loaded
 
         try:
-            # Create a pandas DataFrame from the dictionary, ensuring correct column order
-            live_data = pd.DataFrame([features_dict], columns=self.features)
+            key = self.cache.make_key(features_dict)
+            model_version = self.model_version
+            cached = self.cache.get(key, model_version)
+            if cached is not None:
+                return cached
 
-            prediction = self.model.predict(live_data)[0]
-            probabilities = self.model.predict_proba(live_data)[0]
-            confidence = probabilities[int(prediction)]
+            predictions, confidences = self.predict_batch(self.features_to_matrix([features_dict]))
+            prediction, confidence = int(predictions[0]), float(confidences[0])
+            self.cache.put(key, (prediction, confidence), model_version)
 
             logger.info(f"AI Prediction: {features_dict} → {prediction} (Confidence: {confidence:.2f})")
-            return int(prediction), float(confidence)
+            return prediction, confidence
         except Exception as e:
             logger.error(f"Prediction error: {e}")
             return 0, 0.0
 
+    def get_model_info(self):
+        """Summary of the loaded model for the status endpoints"""
+        return {
+            "model_loaded": self.model is not None,
+            "model_type": type(self.model).__name__ if self.model is not None else None,
+            "n_estimators": getattr(self.model, "n_estimators", None),
+            "compiled": self.compiled_model is not None,
+            "features": self.features,
+            "classes": [int(c) for c in getattr(self.model, "classes_", [])],
+            "model_version": self.model_version,
+            "cache": self.cache.get_stats(),
+        }
+
 # Create a singleton instance for the app to use
 ai_service = AIModelService()
\ No newline at end of file
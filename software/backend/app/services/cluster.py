@@ -0,0 +1,397 @@
+import os
+import json
+import time
+import logging
+import threading
+
+import numpy as np
+
+from .metrics import metrics
+from .profiler import profiler
+from .state_store import state_store
+from .status_cache import status_cache
+from .shared_state import SharedStateSegment, decode_slot
+from config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows: no multi-process serving, every process runs standalone
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Mutating requests a follower may still serve itself (pure computation, no shared state)
+LOCAL_WRITE_ENDPOINTS = {
+    "enhanced_dashboard.run_simulation",
+    "admin.sample_profile",
+}
+# Reads that only the owner can answer (its background services are not running elsewhere)
+OWNER_READ_ENDPOINTS = {
+    "prometheus_metrics",
+    "enhanced_dashboard.get_weather",
+    "enhanced_dashboard.get_telemetry_stats",
+    "enhanced_dashboard.get_online_learning_status",
+    "enhanced_dashboard.get_solar_expected",
+    "enhanced_dashboard.get_solar_forecast",
+    "pump.list_pump_commands",
+    "pump.get_pump_command",
+}
+HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "content-length", "content-encoding",
+                      "host", "te", "trailer", "upgrade", "proxy-authorization", "proxy-authenticate"}
+
+
+class Cluster:
+    """
+    Role of this process when the app runs under several worker processes.
+
+    Exactly one worker holds an exclusive lock on `owner.lock` and becomes the
+    owner: it runs the simulation loop, telemetry/MQTT ingestion, weather and
+    online learning, and serves an internal port on localhost. The owner
+    mirrors state to the followers two ways:
+
+    - hot numeric fields of every write go straight into a memory-mapped
+      segment (see shared_state.py), which followers poll every few ms;
+    - full snapshots go to a replica file (written to a temp file and renamed)
+      at most every `sync_interval`, covering everything else.
+
+    Followers install what they read with `state_store.replicate` at the
+    owner's version, so `/api/status`, ETags and `?since` deltas are the same
+    whichever worker answers. They forward writes and owner-only reads to the
+    owner. If the owner dies its lock is released and the replacement worker
+    started by the server takes it over.
+
+    The replica also carries the profiling switch, so toggling it (a write,
+    forwarded to the owner) reaches every worker. `/metrics` is served by the
+    owner: followers write their own series to `metrics-<pid>.json` every
+    `metrics_interval`, and the owner renders them next to its own, labelled
+    by worker.
+    """
+
+    def __init__(self, directory, owner_port=5099, sync_interval=0.1,
+                 segment_capacity=4096, segment_poll_interval=0.02, metrics_interval=1.0):
+        self.directory = directory
+        self.owner_port = owner_port
+        self.sync_interval = sync_interval
+        self.metrics_interval = metrics_interval
+        self.segment_capacity = segment_capacity
+        self.segment_poll_interval = segment_poll_interval
+        self.segment = None
+        self._segment_inode = None
+        self.role = "standalone"
+        self._lock_file = None
+        self._latest = {}  # site_id -> (version, snapshot), owner side
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._session = None
+        self._profiling = None  # last profiling state published (owner) or applied (follower)
+        self.stats = {"published": 0, "applied": 0, "applied_from_segment": 0, "forwarded": 0,
+                      "forward_errors": 0, "replica_age_ms": None}
+
+    @property
+    def replica_path(self):
+        return os.path.join(self.directory, "state-replica.json")
+
+    @property
+    def segment_path(self):
+        return os.path.join(self.directory, "state.seg")
+
+    def metrics_path(self, pid):
+        return os.path.join(self.directory, f"metrics-{pid}.json")
+
+    @property
+    def owner_url(self):
+        return f"http://127.0.0.1:{self.owner_port}"
+
+    def elect(self):
+        """Take the owner lock if it is free; returns "owner" or "follower" """
+        if fcntl is None:
+            self.role = "standalone"
+            return self.role
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(os.path.join(self.directory, "owner.lock"), "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            self.role = "follower"
+        else:
+            self._lock_file = lock_file  # held for the life of the process
+            lock_file.seek(0)
+            lock_file.truncate()
+            lock_file.write(str(os.getpid()))
+            lock_file.flush()
+            self.role = "owner"
+        logger.info(f"🧭 Worker {os.getpid()} is the cluster {self.role}")
+        return self.role
+
+    # --- Owner: publish state ---
+
+    def start_publisher(self, app):
+        if self.segment_capacity > 0:
+            self.segment = SharedStateSegment.create(self.segment_path, self.segment_capacity,
+                                                     boot=int(status_cache.boot_id, 16))
+            self.segment.attach(state_store)
+        for site_id in state_store.site_ids():
+            self._latest[site_id] = (state_store.version, state_store.get(site_id))
+        state_store.add_listener(self._on_change)
+        self._dirty.set()
+        self._start_thread(self._publish_loop, "cluster-publisher")
+        self._start_owner_server(app)
+
+    def _on_change(self, site_id, previous, snapshot):
+        # Write lock held: the version is the one this snapshot was committed at
+        self._latest[site_id] = (state_store.version, snapshot)
+        self._dirty.set()
+
+    def _publish_loop(self):
+        while not self._stop.is_set():
+            self._dirty.wait(timeout=1.0)
+            if not self._dirty.is_set() and _profiling_state() == self._profiling:
+                continue
+            self._dirty.clear()
+            try:
+                self.publish()
+            except Exception as e:
+                logger.error(f"Cluster replica publish error: {e}")
+            self._stop.wait(self.sync_interval)
+
+    def publish(self):
+        latest = dict(self._latest)
+        self._profiling = _profiling_state()
+        payload = {
+            "owner_pid": os.getpid(),
+            "boot_id": status_cache.boot_id,
+            "published_at": time.time(),
+            "profiling": self._profiling,
+            "sites": {site_id: [version, snapshot] for site_id, (version, snapshot) in latest.items()},
+        }
+        tmp = f"{self.replica_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(payload, f, default=str)
+        os.replace(tmp, self.replica_path)
+        self.stats["published"] += 1
+
+    def _start_owner_server(self, app):
+        from werkzeug.serving import make_server
+        server = make_server("127.0.0.1", self.owner_port, app, threaded=True)
+        self._start_thread(server.serve_forever, "cluster-owner-http")
+        logger.info(f"🧭 Owner accepting forwarded requests on {self.owner_url}")
+
+    # --- Follower: mirror state, forward writes ---
+
+    def start_follower(self):
+        import requests
+        self._session = requests.Session()
+        self._start_thread(self._follow_loop, "cluster-follower")
+
+    def _follow_loop(self):
+        seen = None
+        applied = {}  # site_id -> owner version installed here
+        segment_seq = None
+        next_replica_check = 0.0
+        next_metrics_write = 0.0
+        poll = self.segment_poll_interval if self.segment_capacity > 0 else self.sync_interval
+        while not self._stop.is_set():
+            try:
+                segment_seq = self._follow_segment(applied, segment_seq)
+            except Exception as e:
+                logger.error(f"Shared state segment read error: {e}")
+                self._close_segment()
+            if time.monotonic() >= next_replica_check:
+                next_replica_check = time.monotonic() + self.sync_interval
+                try:
+                    stat = os.stat(self.replica_path)
+                    marker = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+                    if marker != seen:
+                        with open(self.replica_path) as f:
+                            payload = json.load(f)
+                        self._apply(payload, applied)
+                        seen = marker
+                except FileNotFoundError:
+                    pass  # the owner has not published yet
+                except Exception as e:
+                    logger.error(f"Cluster replica read error: {e}")
+            if time.monotonic() >= next_metrics_write:
+                next_metrics_write = time.monotonic() + self.metrics_interval
+                try:
+                    self.write_metrics()
+                except Exception as e:
+                    logger.error(f"Cluster metrics write error: {e}")
+            self._stop.wait(poll)
+
+    def _follow_segment(self, applied, last_seq):
+        """Apply slots written since `last_seq` that extend exactly what this worker holds"""
+        if self.segment_capacity <= 0:
+            return last_seq
+        if self.segment is not None and os.stat(self.segment_path).st_ino != self._segment_inode:
+            self._close_segment()  # a new owner created a fresh segment
+            last_seq = None
+        if self.segment is None:
+            try:
+                self._segment_inode = os.stat(self.segment_path).st_ino
+                self.segment = SharedStateSegment.open(self.segment_path)
+            except FileNotFoundError:
+                return None
+        # Only trust the segment once the replica file has given us the owner's ETag token
+        if format(self.segment.boot, "x") != status_cache.boot_id:
+            return last_seq
+        seq = self.segment.seq
+        if seq == last_seq:
+            return seq
+        records = self.segment.read_all()
+        names = self.segment.site_ids()
+        for index in np.argsort(records["version"], kind="stable"):
+            record = records[index]
+            site_id, version, base = names[index], int(record["version"]), int(record["base_version"])
+            current = state_store.get(site_id)
+            if version <= applied.get(site_id, 0) or current is None or not base or applied.get(site_id) != base:
+                continue  # already have it, or it does not extend our copy: the replica file will
+            state_store.replicate(site_id, {**current, **decode_slot(record)}, version)
+            applied[site_id] = version
+            self.stats["applied_from_segment"] += 1
+        return seq
+
+    def _close_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+
+    def _apply(self, payload, applied):
+        if payload["boot_id"] != status_cache.boot_id:
+            # Adopt the owner's ETag token; a new owner starts its versions afresh
+            status_cache.boot_id = payload["boot_id"]
+            applied.clear()
+        # Ascending versions, so each site's snapshot lands at the version the owner gave it
+        for site_id, (version, snapshot) in sorted(payload["sites"].items(), key=lambda item: item[1][0]):
+            if applied.get(site_id, -1) < version:
+                state_store.replicate(site_id, snapshot, version)
+                applied[site_id] = version
+                self.stats["applied"] += 1
+        self.stats["replica_age_ms"] = round((time.time() - payload["published_at"]) * 1000, 1)
+        self._apply_profiling(payload.get("profiling"))
+
+    def _apply_profiling(self, state):
+        if state is None or state == self._profiling:
+            return
+        enabled, resets = state
+        profiler.enabled = enabled
+        if self._profiling is not None and resets != self._profiling[1]:
+            profiler.reset()
+        self._profiling = state
+
+    def write_metrics(self):
+        """Publish this worker's series for the owner's /metrics"""
+        path = self.metrics_path(os.getpid())
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(metrics.snapshot(), f)
+        os.replace(tmp, path)
+
+    def worker_metrics(self):
+        """[(labels, snapshot), ...] written by the other live workers; files of exited ones are removed"""
+        peers = []
+        for entry in os.scandir(self.directory):
+            pid = entry.name[len("metrics-"):-len(".json")]
+            if not (entry.name.startswith("metrics-") and entry.name.endswith(".json") and pid.isdigit()):
+                continue
+            if int(pid) == os.getpid():
+                continue
+            if not _process_alive(int(pid)):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+                continue
+            try:
+                with open(entry.path) as f:
+                    peers.append(({"worker": pid}, json.load(f)))
+            except (OSError, ValueError) as e:
+                logger.error(f"Cluster metrics read error for worker {pid}: {e}")
+        return peers
+
+    def should_forward(self, request):
+        if self.role != "follower" or request.endpoint is None:
+            return False
+        if request.endpoint in OWNER_READ_ENDPOINTS:
+            return True
+        if request.method in ("GET", "HEAD", "OPTIONS") or request.endpoint in LOCAL_WRITE_ENDPOINTS:
+            return False
+        if request.endpoint == "enhanced_dashboard.predict_batch":
+            # Scoring is local; only storing predictions against sites touches shared state
+            return "sites" in (request.get_json(silent=True) or {})
+        return True
+
+    def forward(self, request):
+        """Replay the request against the owner and relay its response"""
+        from flask import Response, jsonify
+        headers = {k: v for k, v in request.headers if k.lower() not in HOP_BY_HOP_HEADERS}
+        try:
+            upstream = self._session.request(
+                request.method, self.owner_url + request.full_path, headers=headers,
+                data=request.get_data(), timeout=Config.API_TIMEOUT,
+            )
+        except Exception as e:
+            self.stats["forward_errors"] += 1
+            logger.error(f"Forwarding {request.method} {request.path} to the owner failed: {e}")
+            return jsonify({"error": "Owner process unavailable, retry shortly"}), 503
+        self.stats["forwarded"] += 1
+        relayed = [(k, v) for k, v in upstream.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS]
+        return Response(upstream.content, status=upstream.status_code, headers=relayed)
+
+    # --- Shared ---
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._thread = thread
+
+    def stop(self):
+        self._stop.set()
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "role": self.role,
+            "pid": os.getpid(),
+            "directory": self.directory,
+            "segment": self.segment.get_stats() if self.segment is not None else None,
+        }
+
+
+def _profiling_state():
+    # Resets are broadcast as a count, so a follower clears its timings once per reset
+    return [profiler.enabled, profiler.stats["resets"]]
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def install_cluster(app):
+    """Request hooks for a follower worker: forward writes, tag responses with the serving worker"""
+    from flask import request
+
+    @app.before_request
+    def _forward_to_owner():
+        if cluster.should_forward(request):
+            return cluster.forward(request)
+
+    @app.after_request
+    def _served_by(response):
+        response.headers["X-Served-By"] = f"{cluster.role}:{os.getpid()}"
+        return response
+
+
+# Create a singleton instance for the app to use
+cluster = Cluster(Config.CLUSTER_DIR, owner_port=Config.CLUSTER_OWNER_PORT,
+                  sync_interval=Config.CLUSTER_SYNC_INTERVAL,
+                  segment_capacity=Config.SHARED_STATE_CAPACITY,
+                  segment_poll_interval=Config.SHARED_STATE_POLL_INTERVAL,
+                  metrics_interval=Config.CLUSTER_METRICS_INTERVAL)
@@ -0,0 +1,185 @@
+import math
+import time
+import sqlite3
+import logging
+
+import numpy as np
+
+from .storage_service import storage_service
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Chartable metric -> SQL expression over the telemetry table
+METRICS = {
+    "water_level": "water_level",
+    "water_percentage": "water_percentage",
+    "solar_power": "solar_power",
+    "solar_voltage": "solar_voltage",
+    "battery_voltage": "battery_voltage",
+    "hybrid_usage": "hybrid_usage",
+    "pump_status": "CASE pump_status WHEN 'Running' THEN 1.0 WHEN 'OFF' THEN 0.0 END",
+}
+# Step series keep every switch with min/max; LTTB would smooth a short run away
+DEFAULT_METHODS = {"pump_status": "minmax"}
+METHODS = ("lttb", "minmax")
+# Accepted time range for query parameters: the epoch .. 3000-01-01
+MAX_TIME = 32503680000
+
+
+def minmax_indices(values, n):
+    """
+    Indices of at most `n` points: the first and last point plus the min and max of
+    each of (n - 2) // 2 equal-count buckets, in order. One reshape and two
+    argmin/argmax passes, no per-bucket Python.
+    """
+    size_in = len(values)
+    if size_in <= n:
+        return np.arange(size_in)
+    buckets = max(1, (n - 2) // 2)
+    width = -(-size_in // buckets)  # ceil
+    # Pad with the last value so every row is full; padding never wins over a real point in its row
+    padded = np.pad(values, (0, buckets * width - size_in), mode="edge").reshape(buckets, width)
+    base = np.arange(buckets) * width
+    picked = np.concatenate(([0, size_in - 1], base + padded.argmin(axis=1), base + padded.argmax(axis=1)))
+    return np.unique(np.minimum(picked, size_in - 1))
+
+
+def lttb_indices(t, values, n):
+    """
+    Indices of `n` points chosen by Largest-Triangle-Three-Buckets: the first and
+    last point, plus one point per bucket between them, namely the one forming the
+    largest triangle with the point kept from the previous bucket and the
+    average of the next bucket. Bucket edges and averages are computed for all
+    buckets at once. Only the chain through the kept points is sequential,
+    one vector expression per bucket.
+    """
+    size_in = len(values)
+    if size_in <= n or n < 3:
+        return np.arange(size_in) if size_in <= n else np.array([0, size_in - 1])
+    t = t - t[0]  # keep the products well inside float64 precision
+    edges = (np.arange(n - 1) * ((size_in - 2) / (n - 2))).astype(np.int64) + 1
+    edges[-1] = size_in - 1
+    counts = np.diff(edges)
+    avg_t = np.add.reduceat(t[:-1], edges[:-1]) / counts
+    avg_v = np.add.reduceat(values[:-1], edges[:-1]) / counts
+    # The "next bucket" of the last bucket is the final point
+    next_t = np.append(avg_t[1:], t[-1])
+    next_v = np.append(avg_v[1:], values[-1])
+
+    picked = np.empty(n, dtype=np.int64)
+    picked[0], picked[-1] = 0, size_in - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ta, va = t[a], values[a]
+        area = np.abs((ta - next_t[i]) * (values[lo:hi] - va) - (ta - t[lo:hi]) * (next_v[i] - va))
+        a = lo + int(area.argmax())
+        picked[i + 1] = a
+    return picked
+
+
+def parse_time(value, default):
+    """Epoch seconds (int/float) or ISO-8601 text -> epoch seconds; raises ValueError if unparseable or out of range"""
+    if value is None or value == "":
+        return default
+    try:
+        ts = float(value)
+    except (TypeError, ValueError):
+        from datetime import datetime
+        try:
+            ts = datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+        except (ValueError, OverflowError):
+            raise ValueError(f"Bad time: {value!r} (use epoch seconds or ISO-8601)")
+    if not (math.isfinite(ts) and 0 <= ts <= MAX_TIME):
+        raise ValueError(f"Time out of range: {value!r}")
+    return ts
+
+
+class HistoryService:
+    """
+    Chart-ready history of a site's telemetry.
+
+    Rows for the requested metrics and range come out of the telemetry table in
+    one indexed range scan (site_id, ts) on a read connection of this thread,
+    straight into numpy arrays. Each metric is then cut down to at most
+    `points` samples server-side, using LTTB for continuous series or per-bucket
+    min/max for step series. A year of minute data (~525k rows) comes back as a
+    few hundred points. Rows still waiting in the storage writer's buffer
+    (at most `STORAGE_FLUSH_INTERVAL` old) are not visible yet.
+    """
+
+    def __init__(self, storage, default_points=500, max_points=5000, max_range_days=400):
+        self.storage = storage
+        self.default_points = default_points
+        self.max_points = max_points
+        self.max_range_days = max_range_days
+        self.stats = {"queries": 0, "rows_scanned": 0, "points_returned": 0, "last_query_ms": None}
+
+    def query(self, site_id, metrics, start=None, end=None, points=None, method=None):
+        """
+        {"site_id", "start", "end", "rows", "series": {metric: {"method", "t", "v"}}}
+        Raises ValueError for unknown metrics/methods or a bad range.
+        """
+        began = time.perf_counter()
+        unknown = [m for m in metrics if m not in METRICS]
+        if unknown or not metrics:
+            raise ValueError(f"Unknown metric(s) {unknown}; choose from {sorted(METRICS)}")
+        if method is not None and method not in METHODS:
+            raise ValueError(f"Unknown method {method!r}; choose from {list(METHODS)}")
+        end = end if end is not None else time.time()
+        start = start if start is not None else end - 86400
+        if start >= end:
+            raise ValueError("start must be before end")
+        if end - start > self.max_range_days * 86400:
+            raise ValueError(f"Range longer than {self.max_range_days} days")
+        points = min(max(3, int(points or self.default_points)), self.max_points)
+
+        columns = ", ".join(METRICS[m] for m in metrics)
+        try:
+            rows = self.storage.read_connection().execute(
+                f"SELECT ts, {columns} FROM telemetry WHERE site_id = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+                (site_id, start, end),
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            if "no such table" not in str(e):
+                raise
+            rows = []  # the storage writer has not created the schema yet
+        # None (missing column in older rows) becomes NaN
+        data = np.array(rows, dtype=np.float64).reshape(len(rows), len(metrics) + 1)
+        ts = data[:, 0]
+
+        series = {}
+        for i, metric in enumerate(metrics):
+            values = data[:, i + 1]
+            valid = np.isfinite(values)
+            t, v = (ts, values) if valid.all() else (ts[valid], values[valid])
+            chosen = method or DEFAULT_METHODS.get(metric, "lttb")
+            index = lttb_indices(t, v, points) if chosen == "lttb" else minmax_indices(v, points)
+            series[metric] = {
+                "method": chosen,
+                "raw_points": int(len(v)),
+                # Whole seconds and 4 decimals: a few KB of JSON for a chart
+                "t": np.round(t[index]).astype(np.int64).tolist(),
+                "v": np.round(v[index], 4).tolist(),
+            }
+            self.stats["points_returned"] += len(index)
+
+        elapsed_ms = round((time.perf_counter() - began) * 1000, 1)
+        self.stats["queries"] += 1
+        self.stats["rows_scanned"] += len(rows)
+        self.stats["last_query_ms"] = elapsed_ms
+        return {"site_id": site_id, "start": start, "end": end, "rows": len(rows),
+                "points": points, "elapsed_ms": elapsed_ms, "series": series}
+
+    def get_stats(self):
+        return dict(self.stats)
+
+
+# Create a singleton instance for the app to use
+history_service = HistoryService(
+    storage_service,
+    default_points=Config.HISTORY_DEFAULT_POINTS,
+    max_points=Config.HISTORY_MAX_POINTS,
+    max_range_days=Config.HISTORY_MAX_RANGE_DAYS,
+)
@@ -0,0 +1,153 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Subsystem:
+    """One startable part of the backend and what is known about its startup"""
+
+    def __init__(self, name, start, stop=None, ready=None, background=False, required=True, enabled=True):
+        self.name = name
+        self.start = start
+        self.stop = stop
+        self.ready_check = ready
+        self.background = background
+        self.required = required
+        self.state = "pending" if enabled else "disabled"
+        self.error = None
+        self.start_ms = None
+        self.ready_ms = None  # since lifecycle start, when the subsystem first became ready
+
+    def is_ready(self):
+        if self.state != "started":
+            return False
+        return self.ready_check is None or bool(self.ready_check())
+
+
+class Lifecycle:
+    """
+    Explicit start/stop hooks for the background parts of the app.
+
+    Importing the app no longer starts anything; `create_app` registers the
+    subsystems and calls `start_all`. Quick starts run inline, slow ones
+    (model warm-up) on their own thread, so the app can serve requests right
+    away. `readiness()` reports every subsystem's state and how long it took
+    to start and to become ready, which `/api/ready` exposes.
+
+    Ready times are recorded by the thread that starts each subsystem, not by
+    whoever polls `/api/ready` first. A subsystem whose ready check only passes
+    later (an MQTT connection, the first replica read) is watched on a
+    `ready-<name>` thread until it does.
+    """
+
+    READY_POLL_MAX = 0.5  # seconds between ready checks once a subsystem has been slow
+
+    def __init__(self):
+        self._subsystems = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.started_at = None
+        self.timings = {}
+
+    def add(self, name, start, **options):
+        self._subsystems[name] = Subsystem(name, start, **options)
+
+    def start_all(self):
+        """Start every registered subsystem once (later calls are no-ops)"""
+        with self._lock:
+            if self.started_at is not None:
+                return
+            self.started_at = time.perf_counter()
+        for subsystem in self._subsystems.values():
+            if subsystem.state == "disabled":
+                continue
+            if subsystem.background:
+                threading.Thread(target=self._start, args=(subsystem,), name=f"start-{subsystem.name}",
+                                 daemon=True).start()
+            else:
+                self._start(subsystem)
+        self.timings["start_all_ms"] = self._elapsed_ms()
+        self._record_all_ready()
+
+    def _start(self, subsystem):
+        subsystem.state = "starting"
+        begin = time.perf_counter()
+        try:
+            subsystem.start()
+            subsystem.state = "started"
+        except Exception as e:
+            subsystem.state = "failed"
+            subsystem.error = str(e)
+            logger.error(f"❌ Subsystem '{subsystem.name}' failed to start: {e}")
+        subsystem.start_ms = round((time.perf_counter() - begin) * 1000, 1)
+        if subsystem.state != "started":
+            return
+        logger.info(f"✅ {subsystem.name} started in {subsystem.start_ms} ms")
+        if subsystem.is_ready():
+            self._record_ready(subsystem)
+        elif subsystem.background:
+            self._wait_ready(subsystem)
+        else:
+            threading.Thread(target=self._wait_ready, args=(subsystem,), name=f"ready-{subsystem.name}",
+                             daemon=True).start()
+
+    def _wait_ready(self, subsystem):
+        delay = 0.01
+        while not self._stopping.is_set() and subsystem.state == "started":
+            if subsystem.is_ready():
+                self._record_ready(subsystem)
+                return
+            self._stopping.wait(delay)
+            delay = min(delay * 2, self.READY_POLL_MAX)
+
+    def _record_ready(self, subsystem):
+        with self._lock:
+            if subsystem.ready_ms is None:
+                subsystem.ready_ms = self._elapsed_ms()
+        self._record_all_ready()
+
+    def _record_all_ready(self):
+        """Stamp `all_ready_ms` once every required subsystem has become ready"""
+        with self._lock:
+            if "all_ready_ms" in self.timings or "start_all_ms" not in self.timings:
+                return
+            if all(s.ready_ms is not None for s in self._subsystems.values()
+                   if s.required and s.state != "disabled"):
+                self.timings["all_ready_ms"] = self._elapsed_ms()
+
+    def stop_all(self):
+        self._stopping.set()
+        for subsystem in reversed(list(self._subsystems.values())):
+            if subsystem.stop is None or subsystem.state != "started":
+                continue
+            try:
+                subsystem.stop()
+                subsystem.state = "stopped"
+            except Exception as e:
+                logger.error(f"Subsystem '{subsystem.name}' failed to stop: {e}")
+
+    def _elapsed_ms(self):
+        return round((time.perf_counter() - self.started_at) * 1000, 1)
+
+    def readiness(self):
+        subsystems = {}
+        all_ready = self.started_at is not None
+        for name, subsystem in self._subsystems.items():
+            ready = subsystem.is_ready()
+            if subsystem.required and subsystem.state != "disabled" and not ready:
+                all_ready = False
+            subsystems[name] = {
+                "state": subsystem.state,
+                "ready": ready,
+                "required": subsystem.required,
+                "start_ms": subsystem.start_ms,
+                "ready_ms": subsystem.ready_ms,
+                "error": subsystem.error,
+            }
+        return {"ready": all_ready, "subsystems": subsystems, "startup": self.timings}
+
+
+# Create a singleton instance for the app to use
+lifecycle = Lifecycle()
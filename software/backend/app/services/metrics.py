@@ -0,0 +1,323 @@
+import math
+import time
+import logging
+import threading
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans a cached prediction (µs) up to a slow weather fetch (s)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class _Metric:
+    """Base for labelled metrics; `labels(...)` returns (and caches) the child for a label set"""
+
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            yield from child.samples(self.name, dict(zip(self.labelnames, values)))
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name, labels):
+        yield name + "_total", labels, self.value
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), self.counts):
+            cumulative += count
+            yield name + "_bucket", {**labels, "le": _format_value(bound)}, cumulative
+        yield name + "_sum", labels, self.sum
+        yield name + "_count", labels, cumulative
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class MetricsRegistry:
+    """
+    Minimal Prometheus text-format (0.0.4) exporter.
+
+    Hot paths only touch pre-created metric children (a bisect and a short
+    lock per observation). Everything the services already count in their
+    `stats` dicts is read by collectors at scrape time instead, so it costs
+    nothing between scrapes.
+
+    Under several worker processes, metrics and `local` collectors describe
+    the worker that holds them. `snapshot()` exports those so the owner can
+    render every worker's series side by side, each with a `worker` label;
+    the other collectors read the owner's services and are rendered once.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = {}  # key -> (collect, local)
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def _register(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def add_collector(self, key, collect, local=False):
+        """
+        `collect()` returns [(name, type, help, [(labels_dict, value), ...]), ...]
+        and runs on every scrape. `local` marks figures that belong to this
+        worker process alone. Re-adding a key replaces the collector.
+        """
+        self._collectors[key] = (collect, local)
+
+    def _families(self, local):
+        """[(name, type, help, [(sample_name, labels, value), ...]), ...] of this worker's or the shared series"""
+        families = []
+        if local:
+            for metric in list(self._metrics.values()):
+                families.append((metric.name, metric.type, metric.help, list(metric._samples())))
+        for key, (collect, is_local) in list(self._collectors.items()):
+            if is_local != local:
+                continue
+            try:
+                collected = collect()
+            except Exception as e:
+                logger.error(f"Metrics collector '{key}' failed: {e}")
+                continue
+            for name, kind, help, samples in collected:
+                families.append((name, kind, help, [(name, labels, value) for labels, value in samples
+                                                    if value is not None]))
+        return families
+
+    def snapshot(self):
+        """This worker's series as JSON-ready lists, for render(peers=...) in another process"""
+        return [[name, kind, help, [[sample, labels, value] for sample, labels, value in samples]]
+                for name, kind, help, samples in self._families(local=True)]
+
+    def render(self, labels=None, peers=()):
+        """
+        Text exposition. `labels` are added to this worker's series; `peers` is
+        [(labels, snapshot()), ...] from other workers, merged into the same families.
+        """
+        merged = {}  # name -> [type, help, [(sample_name, labels, value), ...]]
+        sources = [(labels or {}, self._families(local=True))] + [(extra, family) for extra, family in peers]
+        for extra, families in sources:
+            for name, kind, help, samples in families:
+                family = merged.setdefault(name, [kind, help, []])
+                family[2].extend((sample, {**extra, **sample_labels}, value)
+                                 for sample, sample_labels, value in samples)
+        for name, kind, help, samples in self._families(local=False):
+            merged.setdefault(name, [kind, help, []])[2].extend(samples)
+
+        lines = []
+        for name, (kind, help, samples) in merged.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample, sample_labels, value in samples:
+                lines.append(f"{sample}{_format_labels(sample_labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Create a singleton instance for the app to use
+metrics = MetricsRegistry()
+
+# Hot-path metrics (observed inline)
+PREDICTION_LATENCY = metrics.histogram(
+    "solar_prediction_seconds", "Model call latency per prediction batch", ("path",))
+PREDICTION_ROWS = metrics.counter(
+    "solar_prediction_rows", "Rows scored by the model (cache misses and batch rows)", ("path",))
+WEATHER_FETCH_LATENCY = metrics.histogram(
+    "solar_weather_fetch_seconds", "Weather API request latency", ("outcome",))
+REQUEST_LATENCY = metrics.histogram(
+    "solar_http_request_seconds", "Flask request latency by route", ("method", "route", "status"))
+UPDATE_LOOP_DRIFT = metrics.histogram(
+    "solar_update_loop_drift_seconds", "How late each state update tick started versus its schedule",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0))
+UPDATE_LOOP_DURATION = metrics.histogram(
+    "solar_update_loop_tick_seconds", "Time spent in one state update tick across all sites")
+
+
+def install_request_metrics(app):
+    """Time every request in before/after hooks, labelled by the matched route rule"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        start = getattr(g, "_metrics_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            REQUEST_LATENCY.labels(request.method, route, str(response.status_code)).observe(
+                time.perf_counter() - start)
+        return response
+
+
+def register_service_collectors():
+    """Scrape-time views of the counters the services already keep"""
+    from .ai_model_service import ai_service
+    from .mqtt_service import mqtt_service
+    from .pump_commands import pump_commands
+    from .telemetry_service import telemetry_ingestor
+    from .storage_service import storage_service
+    from .weather_service import weather_provider
+    from .state_store import state_store
+
+    def collect_worker():
+        cache = ai_service.cache.get_stats()
+        return [
+            ("solar_prediction_cache_lookups_total", "counter", "Prediction cache lookups by result",
+             [({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"])]),
+            ("solar_prediction_cache_entries", "gauge", "Entries in the prediction cache",
+             [({}, cache["entries"])]),
+            ("solar_model_version", "gauge", "Version of the loaded pump model",
+             [({}, ai_service.model_version)]),
+        ]
+
+    def collect():
+        weather = weather_provider.get_status()
+        telemetry = telemetry_ingestor.get_stats()
+        storage = storage_service.get_stats()
+        mqtt = mqtt_service.get_stats()
+        return [
+            ("solar_weather_fetches_total", "counter", "Weather API fetch attempts", [({}, weather["fetches"])]),
+            ("solar_weather_failures_total", "counter", "Failed weather API fetches", [({}, weather["failures"])]),
+            ("solar_weather_data_age_seconds", "gauge", "Age of the weather reading being served",
+             [({"source": weather["source"]}, weather["data_age_seconds"])]),
+            ("solar_weather_circuit_open", "gauge", "1 while the weather circuit breaker is not closed",
+             [({}, int(weather["circuit"] != "closed"))]),
+            ("solar_mqtt_connected", "gauge", "1 while connected to the MQTT broker",
+             [({}, int(mqtt_service.is_connected))]),
+            ("solar_mqtt_messages_total", "counter", "MQTT messages by direction",
+             [({"direction": "published"}, mqtt["published"]),
+              ({"direction": "received"}, mqtt["received"]),
+              ({"direction": "publish_dropped"}, mqtt["publish_dropped"])]),
+            ("solar_mqtt_outbox_messages_total", "counter", "Outbound MQTT queue outcomes",
+             [({"outcome": key}, mqtt["outbox"][key])
+              for key in ("queued", "replayed", "coalesced", "spilled", "expired", "dropped_overflow")]),
+            ("solar_telemetry_messages_total", "counter", "Telemetry ingestion outcomes",
+             [({"outcome": key}, telemetry[key])
+              for key in ("processed", "invalid", "dropped", "unknown_site", "errors")]),
+            ("solar_queue_depth", "gauge", "Items waiting in internal queues",
+             [({"queue": "telemetry"}, telemetry["queue_depth"]),
+              ({"queue": "storage"}, storage["pending"]),
+              ({"queue": "mqtt_outbox"}, mqtt["outbox"]["depth"])]),
+            ("solar_pump_commands_pending", "gauge", "Pump commands sent and not yet confirmed by telemetry",
+             [({}, pump_commands.get_stats()["pending"])]),
+            ("solar_storage_rows_written_total", "counter", "Rows committed to storage",
+             [({}, storage["written"])]),
+            ("solar_state_version", "gauge", "State store version (bumped on every write)",
+             [({}, state_store.version)]),
+        ]
+
+    metrics.add_collector("services", collect)
+    metrics.add_collector("worker", collect_worker, local=True)
@@ -0,0 +1,311 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+REPLAY_LATENCY = metrics.histogram(
+    "solar_mqtt_replay_seconds", "Time queued messages waited before being published",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0, 3600.0))
+
+
+class OutboundMessage:
+    __slots__ = ("seq", "key", "topic", "payload", "qos", "retain", "enqueued_at", "expires_at")
+
+    def __init__(self, seq, key, topic, payload, qos, retain, enqueued_at, expires_at):
+        self.seq = seq
+        self.key = key
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.enqueued_at = enqueued_at
+        self.expires_at = expires_at
+
+
+class PublishOutbox:
+    """
+    Store-and-forward queue for outbound MQTT messages.
+
+    While connected with nothing queued, `publish` hands the message straight
+    to the client. Otherwise the message is queued in publish order and a
+    flusher thread replays the queue after reconnecting, oldest first, in
+    batches of `batch_size`: one lock round-trip, one disk delete and one
+    wake-up per batch rather than per message.
+
+    - Coalescing: a message on a topic replaces the queued one on the same
+      topic (unless published with `coalesce=False`), since only the latest
+      state matters after an outage. It takes the newer message's place in
+      the order.
+    - Bounded, disk-spillable: at most `memory_limit` messages are held in
+      memory; beyond that the oldest half is moved to a SQLite file in one
+      transaction. Disk entries are always older than memory entries, so replay
+      reads disk first. Past `max_messages` in total, the oldest are dropped.
+      A clean `stop()` spills everything, so a restart replays it.
+    - Messages published with a `ttl` are discarded instead of replayed once
+      they are older than that (stale commands must not fire hours later).
+    """
+
+    def __init__(self, send, memory_limit=1000, max_messages=100_000, spill_path=None,
+                 batch_size=200, flush_interval=0.05):
+        self.send = send  # send(topic, payload, qos, retain) -> True once handed to the client
+        self.memory_limit = memory_limit
+        self.max_messages = max_messages
+        self.spill_path = spill_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.connected = False
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._memory = OrderedDict()  # key -> OutboundMessage, oldest first
+        self._spilled = {}            # key -> seq of the message for that key on disk
+        self._db = None
+        self._seq = 0
+        self._thread = None
+        self._running = False
+        self._replay_started = None
+        self._replay_count = 0
+        self.stats = {
+            "queued": 0, "sent_direct": 0, "replayed": 0, "coalesced": 0, "spilled": 0,
+            "dropped_overflow": 0, "expired": 0, "send_failures": 0, "batches": 0,
+            "last_replay_ms": None, "last_replay_messages": 0,
+            "last_replay_latency_ms": None, "max_replay_latency_ms": None,
+        }
+
+    # --- Lifecycle ---
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            if self.spill_path and os.path.exists(self.spill_path):
+                self._open_db()  # replay what an earlier run left behind
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="mqtt-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+            self._wake.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        with self._lock:
+            if self.spill_path and self._memory:
+                self._spill(len(self._memory))
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def on_connected(self):
+        with self._lock:
+            self.connected = True
+            if self._depth():
+                self._replay_started = time.perf_counter()
+                self._replay_count = 0
+            self._wake.notify()
+
+    def on_disconnected(self):
+        # No lock: this runs on paho's network thread, which publish() may be waiting on
+        self.connected = False
+
+    # --- Publishing ---
+
+    def publish(self, topic, payload, qos=0, retain=False, coalesce=True, ttl=None):
+        """Send now if possible, otherwise queue; returns True if it went straight out"""
+        with self._lock:
+            if self.connected and not self._memory and not self._spilled:
+                if self._send(topic, payload, qos, retain):
+                    self.stats["sent_direct"] += 1
+                    return True
+            now = time.time()
+            self._seq += 1
+            key = topic if coalesce else f"{topic}\x00{self._seq}"
+            message = OutboundMessage(self._seq, key, topic, payload, qos, retain, now,
+                                      now + ttl if ttl else None)
+            self._enqueue(message)
+            self._wake.notify()
+            return False
+
+    def _send(self, topic, payload, qos, retain):
+        try:
+            sent = self.send(topic, payload, qos, retain)
+        except Exception as e:
+            logger.error(f"MQTT outbox send error on '{topic}': {e}")
+            sent = False
+        if not sent:
+            self.stats["send_failures"] += 1
+        return sent
+
+    def _enqueue(self, message):
+        key = message.key
+        if self._memory.pop(key, None) is not None:
+            self.stats["coalesced"] += 1
+        elif key in self._spilled:
+            self._db.execute("DELETE FROM outbox WHERE key = ?", (key,))
+            self._db.commit()
+            del self._spilled[key]
+            self.stats["coalesced"] += 1
+        self._memory[key] = message
+        self.stats["queued"] += 1
+
+        overflow = self._depth() - self.max_messages
+        if overflow > 0:
+            self._drop_oldest(overflow)
+        if len(self._memory) > self.memory_limit:
+            if self.spill_path:
+                self._spill(max(1, len(self._memory) - self.memory_limit // 2))
+            else:
+                self._drop_oldest(len(self._memory) - self.memory_limit)
+
+    def _depth(self):
+        return len(self._memory) + len(self._spilled)
+
+    # --- Disk spill (called with the lock held) ---
+
+    def _open_db(self):
+        if self._db is not None:
+            return
+        self._db = sqlite3.connect(self.spill_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                seq INTEGER PRIMARY KEY,
+                key TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                payload BLOB,
+                qos INTEGER NOT NULL,
+                retain INTEGER NOT NULL,
+                enqueued_at REAL NOT NULL,
+                expires_at REAL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS outbox_key ON outbox (key)")
+        self._db.commit()
+        for seq, key in self._db.execute("SELECT seq, key FROM outbox ORDER BY seq"):
+            self._spilled[key] = seq
+            self._seq = max(self._seq, seq)
+        if self._spilled:
+            logger.info(f"📦 MQTT outbox restored {len(self._spilled)} queued message(s) from '{self.spill_path}'")
+
+    def _spill(self, count):
+        self._open_db()
+        rows = []
+        for _ in range(min(count, len(self._memory))):
+            key, m = self._memory.popitem(last=False)
+            rows.append((m.seq, key, m.topic, m.payload, m.qos, int(m.retain), m.enqueued_at, m.expires_at))
+            self._spilled[key] = m.seq
+        self._db.executemany("INSERT OR REPLACE INTO outbox VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self._db.commit()
+        self.stats["spilled"] += len(rows)
+
+    def _drop_oldest(self, count):
+        dropped = 0
+        if self._spilled and count > 0:
+            rows = self._db.execute("SELECT seq, key FROM outbox ORDER BY seq LIMIT ?", (count,)).fetchall()
+            self._db.executemany("DELETE FROM outbox WHERE seq = ?", [(seq,) for seq, _ in rows])
+            self._db.commit()
+            for seq, key in rows:
+                if self._spilled.get(key) == seq:
+                    del self._spilled[key]
+            dropped += len(rows)
+        while dropped < count and self._memory:
+            self._memory.popitem(last=False)
+            dropped += 1
+        self.stats["dropped_overflow"] += dropped
+        if dropped:
+            logger.warning(f"⚠️ MQTT outbox full ({self.max_messages}), dropped {dropped} oldest message(s)")
+
+    # --- Replay ---
+
+    def _peek(self, limit):
+        """The oldest `limit` queued messages, disk first"""
+        batch = []
+        if self._spilled:
+            for row in self._db.execute(
+                    "SELECT seq, key, topic, payload, qos, retain, enqueued_at, expires_at "
+                    "FROM outbox ORDER BY seq LIMIT ?", (limit,)):
+                batch.append(OutboundMessage(*row))
+        for message in self._memory.values():
+            if len(batch) >= limit:
+                break
+            batch.append(message)
+        return batch
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while self._running and not (self.connected and self._depth()):
+                    self._wake.wait()
+                if not self._running:
+                    return
+                batch = self._peek(self.batch_size)
+            done, now = [], time.time()
+            for message in batch:
+                if message.expires_at is not None and message.expires_at < now:
+                    done.append((message, False))
+                    continue
+                if not self._send_queued(message):
+                    break
+                done.append((message, True))
+            with self._lock:
+                self._complete(done)
+                stalled = len(done) < len(batch)
+            if stalled:
+                time.sleep(self.flush_interval)  # connection went away mid-batch; wait for on_connect
+            elif len(batch) < self.batch_size:
+                time.sleep(self.flush_interval)  # let a trickle accumulate into the next batch
+
+    def _send_queued(self, message):
+        if not self.connected:
+            return False
+        return self._send(message.topic, message.payload, message.qos, bool(message.retain))
+
+    def _complete(self, done):
+        """Remove published/expired messages (unless coalescing already replaced them)"""
+        if not done:
+            return
+        now = time.time()
+        disk = []
+        for message, sent in done:
+            if self._spilled.get(message.key) == message.seq:
+                del self._spilled[message.key]
+                disk.append((message.seq,))
+            else:
+                current = self._memory.get(message.key)
+                if current is not None and current.seq == message.seq:
+                    del self._memory[message.key]
+            if sent:
+                latency = now - message.enqueued_at
+                REPLAY_LATENCY.observe(latency)
+                self.stats["replayed"] += 1
+                self.stats["last_replay_latency_ms"] = round(latency * 1000, 1)
+                self.stats["max_replay_latency_ms"] = max(self.stats["max_replay_latency_ms"] or 0.0,
+                                                          self.stats["last_replay_latency_ms"])
+                self._replay_count += 1
+            else:
+                self.stats["expired"] += 1
+        if disk:
+            self._db.executemany("DELETE FROM outbox WHERE seq = ?", disk)
+            self._db.commit()
+        self.stats["batches"] += 1
+        if not self._depth() and self._replay_started is not None:
+            self.stats["last_replay_ms"] = round((time.perf_counter() - self._replay_started) * 1000, 1)
+            self.stats["last_replay_messages"] = self._replay_count
+            logger.info(f"📤 MQTT outbox replayed {self._replay_count} message(s) in {self.stats['last_replay_ms']} ms")
+            self._replay_started = None
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "depth": self._depth(),
+            "in_memory": len(self._memory),
+            "on_disk": len(self._spilled),
+            "memory_limit": self.memory_limit,
+            "max_messages": self.max_messages,
+        }
@@ -1,38 +1,118 @@
 import paho.mqtt.client as mqtt
 import logging
 
+from .mqtt_outbox import PublishOutbox
+from config import Config
+
 logger = logging.getLogger(__name__)
 
 class MQTTService:
-    def __init__(self, broker, port=1883):
+    def __init__(self, broker, port=1883, username=None, password=None, tls=False, client=None):
         self.broker = broker
         self.port = port
-        self.client = mqtt.Client()
+        # A client can be injected (e.g. a local broker stand-in) instead of paho's
+        self.client = client if client is not None else mqtt.Client()
+        if username:
+            self.client.username_pw_set(username, password or None)
+        if tls:
+            self.client.tls_set()  # system CA bundle; credentials never cross the network in clear
         self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
         self.is_connected = False
+        self.subscriptions = {}
+        self.stats = {"published": 0, "received": 0}
+        # Everything published goes through the outbox, so nothing is lost while disconnected
+        self.outbox = PublishOutbox(
+            self._send,
+            memory_limit=Config.MQTT_OUTBOX_MEMORY,
+            max_messages=Config.MQTT_OUTBOX_MAX,
+            spill_path=Config.MQTT_OUTBOX_PATH or None,
+            batch_size=Config.MQTT_OUTBOX_BATCH,
+            flush_interval=Config.MQTT_OUTBOX_FLUSH_INTERVAL,
+        )
 
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             logger.info("✅ MQTT Service: Connected successfully to broker.")
             self.is_connected = True
+            # (Re)subscribe on every connect so subscriptions survive reconnects
+            for topic, qos in self.subscriptions.items():
+                self.client.subscribe(topic, qos)
+            self.outbox.on_connected()
         else:
             logger.error(f"❌ MQTT Service: Failed to connect, return code {rc}")
             self.is_connected = False
 
+    def on_disconnect(self, client, userdata, rc):
+        self.is_connected = False
+        self.outbox.on_disconnected()
+        if rc != 0:
+            logger.warning(f"⚠️ MQTT Service: Connection lost (rc {rc}), queueing publishes until reconnect")
+
     def connect(self):
         try:
+            self.outbox.start()
             self.client.connect_async(self.broker, self.port, 60)
             self.client.loop_start()
         except Exception as e:
             logger.error(f"❌ MQTT Service: Error connecting to {self.broker}: {e}")
 
-    def publish(self, topic, payload, qos=0):
+    def stop(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+        self.is_connected = False
+        self.outbox.on_disconnected()
+        self.outbox.stop()
+
+    def subscribe(self, topic, callback, qos=0):
+        """
+        Route messages matching `topic` (wildcards allowed) to `callback(client, userdata, msg)`.
+        The callback runs on paho's network thread, so it must return quickly.
+        """
+        self.subscriptions[topic] = qos
+
+        def counted(client, userdata, msg):
+            self.stats["received"] += 1
+            callback(client, userdata, msg)
+
+        self.client.message_callback_add(topic, counted)
         if self.is_connected:
-            self.client.publish(topic, payload, qos)
-        else:
-            logger.warning("MQTT Service: Not connected. Cannot publish message.")
+            self.client.subscribe(topic, qos)
+
+    def publish(self, topic, payload, qos=0, retain=False, coalesce=True, ttl=None):
+        """
+        Publish now, or queue until the broker is reachable again. A queued
+        message is replaced by a later one on the same topic unless
+        `coalesce=False`; `ttl` (seconds) discards it if it would be replayed later
+        than that. Returns True if it was handed to the client immediately.
+        """
+        return self.outbox.publish(topic, payload, qos=qos, retain=retain, coalesce=coalesce, ttl=ttl)
+
+    def _send(self, topic, payload, qos, retain):
+        if not self.is_connected:
+            return False
+        info = self.client.publish(topic, payload, qos, retain)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            return False
+        self.stats["published"] += 1
+        return True
+
+    def get_stats(self):
+        outbox = self.outbox.get_stats()
+        return {
+            **self.stats,
+            "publish_dropped": outbox["dropped_overflow"] + outbox["expired"],
+            "connected": self.is_connected,
+            "subscriptions": len(self.subscriptions),
+            "outbox": outbox,
+        }
 
 # Create a singleton instance for the app to use
-# This uses the same public broker as your ESP32
-mqtt_service = MQTTService("test.mosquitto.org")
-mqtt_service.connect()
\ No newline at end of file
+# Pump commands travel over this broker: point MQTT_BROKER at a private one with credentials
+mqtt_service = MQTTService(
+    Config.MQTT_BROKER,
+    Config.MQTT_PORT,
+    username=Config.MQTT_USERNAME,
+    password=Config.MQTT_PASSWORD,
+    tls=Config.MQTT_TLS,
+)
@@ -0,0 +1,215 @@
+import copy
+import time
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+from .ai_model_service import ai_service
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def features_from_state(state, diesel_cost=None, now=None):
+    """
+    Model features for a live site state, on the scale of the training CSV:
+    rain in mm, solar_historical in kW/m², time_of_day as a 6-hour quarter (0-3).
+    """
+    weather = state.get("weather") or {}
+    hour = (now or datetime.now()).hour
+    return {
+        "water_level": float(state.get("water_level", 0.0)),
+        "rain": float(weather.get("rainfall", 0.0)),
+        "solar_historical": float(weather.get("solar_irradiance", 0.0)) / 1000.0,
+        "time_of_day": hour // 6,
+        "diesel_cost": Config.DIESEL_COST if diesel_cost is None else diesel_cost,
+    }
+
+
+class OnlineLearner:
+    """
+    Incremental updates of the pump forest from labelled live data.
+
+    Telemetry readings (label = the pump state the device reported) and operator
+    overrides (label = what the operator chose, weighted higher) go into a
+    rolling window. A background worker periodically fits a few new trees on
+    that window with a single core, appends them to a copy of the current
+    forest (keeping at most `max_trees` online trees on top of the base forest,
+    oldest first out) and hands the result to `AIModelService.install_model`,
+    which swaps it in by reference so predictions never pause. The worker
+    sleeps long enough that fitting stays under `cpu_fraction` of one core.
+
+    The grown forest records how many of its trees are online ones
+    (`n_online_estimators_`), and that attribute is pickled with it, so a
+    persisted forest reloaded after a restart still keeps its online trees
+    within `max_trees` instead of counting them as base trees.
+    """
+
+    def __init__(self, service, window_size=5000, min_new_samples=200, trees_per_update=10,
+                 max_trees=50, interval=60.0, cpu_fraction=0.1, override_weight=5.0,
+                 max_depth=10, persist=False):
+        self.service = service
+        self.min_new_samples = min_new_samples
+        self.trees_per_update = trees_per_update
+        self.max_trees = max_trees
+        self.interval = interval
+        self.cpu_fraction = cpu_fraction
+        self.override_weight = override_weight
+        self.max_depth = max_depth
+        self.persist = persist
+
+        self._window = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._new_samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.stats = {
+            "observed": 0,
+            "overrides": 0,
+            "updates": 0,
+            "skipped": 0,
+            "last_update_ms": None,
+            "last_update_at": None,
+            "last_error": None,
+        }
+
+    # --- Producers (telemetry worker / request threads) ---
+
+    def observe(self, features, label, weight=1.0):
+        row = [float(features.get(name, 0)) for name in self.service.features]
+        with self._lock:
+            self._window.append((row, int(label), float(weight)))
+            self._new_samples += 1
+            self.stats["observed"] += 1
+
+    def observe_state(self, state, pump_status, override=False):
+        """Label a site state with the pump status that was actually chosen for it"""
+        weight = self.override_weight if override else 1.0
+        if override:
+            self.stats["overrides"] += 1
+        self.observe(features_from_state(state), pump_status == "Running", weight)
+
+    # --- Background worker ---
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="online-learning", daemon=True)
+        self._thread.start()
+        logger.info(f"🧠 Online learning every {self.interval:.0f}s "
+                    f"(+{self.trees_per_update} trees, window {self._window.maxlen})")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self._new_samples < self.min_new_samples:
+                continue
+            start = time.perf_counter()
+            self.update()
+            # Keep the average CPU spent fitting under `cpu_fraction` of one core
+            busy = time.perf_counter() - start
+            extra = busy / self.cpu_fraction - busy - self.interval
+            if extra > 0:
+                self._stop.wait(extra)
+
+    def update(self):
+        """Fit new trees on the current window and install the grown forest; returns True on success"""
+        with self._update_lock:
+            return self._update()
+
+    def _update(self):
+        base = self.service.model
+        if base is None or not hasattr(base, "estimators_"):
+            self._skip("no base forest loaded")
+            return False
+
+        with self._lock:
+            samples = list(self._window)
+            self._new_samples = 0
+        if not samples:
+            self._skip("no samples")
+            return False
+
+        X = np.array([row for row, _, _ in samples], dtype=np.float32)
+        y = np.array([label for _, label, _ in samples])
+        w = np.array([weight for _, _, weight in samples])
+        labels = np.unique(y)
+        if not np.array_equal(labels, base.classes_):
+            # New trees must emit probabilities over exactly the base forest's classes
+            self._skip(f"window labels {labels.tolist()} do not match model classes")
+            return False
+
+        from sklearn.ensemble import RandomForestClassifier
+
+        start = time.perf_counter()
+        try:
+            fresh = RandomForestClassifier(
+                n_estimators=self.trees_per_update,
+                max_depth=self.max_depth,
+                n_jobs=1,
+                random_state=self.stats["updates"],
+            ).fit(X, y, sample_weight=w)
+
+            # Online trees sit at the end of `estimators_`
+            n_base = len(base.estimators_) - online_trees(base)
+            grown = list(base.estimators_[n_base:]) + list(fresh.estimators_)
+            grown = grown[-self.max_trees:]
+
+            model = copy.copy(base)
+            model.estimators_ = list(base.estimators_[:n_base]) + grown
+            model.n_estimators = len(model.estimators_)
+            model.n_online_estimators_ = len(grown)
+            self.service.install_model(model, persist=self.persist)
+        except Exception as e:
+            self.stats["last_error"] = str(e)
+            logger.error(f"Online learning update failed: {e}")
+            return False
+
+        self.stats["updates"] += 1
+        self.stats["last_update_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self.stats["last_update_at"] = datetime.now().isoformat()
+        self.stats["last_error"] = None
+        logger.info(f"🧠 Online update: {len(samples)} samples, {len(grown)} online trees "
+                    f"in {self.stats['last_update_ms']} ms")
+        return True
+
+    def _skip(self, reason):
+        self.stats["skipped"] += 1
+        self.stats["last_error"] = reason
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "running": self._thread is not None and not self._stop.is_set(),
+            "window": len(self._window),
+            "window_capacity": self._window.maxlen,
+            "new_samples": self._new_samples,
+            "online_trees": online_trees(self.service.model),
+            "model_version": self.service.model_version,
+        }
+
+
+def online_trees(model):
+    """Trees an OnlineLearner appended to `model` (0 for a forest straight from training)"""
+    return min(getattr(model, "n_online_estimators_", 0), len(getattr(model, "estimators_", ())))
+
+
+# Create a singleton instance for the app to use
+online_learner = OnlineLearner(
+    ai_service,
+    window_size=Config.ONLINE_LEARNING_WINDOW,
+    min_new_samples=Config.ONLINE_LEARNING_MIN_SAMPLES,
+    trees_per_update=Config.ONLINE_LEARNING_TREES_PER_UPDATE,
+    max_trees=Config.ONLINE_LEARNING_MAX_TREES,
+    interval=Config.ONLINE_LEARNING_INTERVAL,
+    cpu_fraction=Config.ONLINE_LEARNING_CPU_FRACTION,
+    override_weight=Config.ONLINE_LEARNING_OVERRIDE_WEIGHT,
+    persist=Config.ONLINE_LEARNING_PERSIST,
+)
@@ -0,0 +1,137 @@
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def parse_resolutions(spec):
+    """'water_level=0.05,rain=0.1' -> {'water_level': 0.05, 'rain': 0.1}"""
+    resolutions = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            resolutions[name.strip()] = float(value)
+    return resolutions
+
+
+class ArtifactWatcher:
+    """
+    Detects when a model file on disk is replaced or rewritten.
+    `os.stat` runs at most once per `check_interval` seconds so the check is
+    cheap enough to sit on the prediction path.
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._signature = self._stat()
+        self._next_check = time.monotonic() + check_interval
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            return None
+
+    def changed(self):
+        """True once per change of the artifact since the last call that returned True"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.check_interval
+        signature = self._stat()
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        return True
+
+
+class PredictionCache:
+    """
+    LRU + TTL cache of (class, confidence) keyed by quantized features.
+
+    Each feature is snapped to a bucket of its configured resolution (features
+    without one are used as-is), so nearly identical consecutive readings share
+    an entry. Entries are tied to a model version; asking with a new version
+    clears the cache.
+    """
+
+    def __init__(self, features, resolutions=None, max_entries=4096, ttl=300.0):
+        self.features = list(features)
+        self.resolutions = [float((resolutions or {}).get(name, 0.0)) for name in self.features]
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._model_version = None
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    def make_key(self, features_dict):
+        key = []
+        for name, resolution in zip(self.features, self.resolutions):
+            value = float(features_dict.get(name, 0))
+            key.append(round(value / resolution) if resolution > 0 else value)
+        return tuple(key)
+
+    def get(self, key, model_version):
+        """Return the cached (prediction, confidence) or None"""
+        with self._lock:
+            if model_version != self._model_version:
+                self._invalidate(model_version)
+                self.stats["misses"] += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            expires_at, result = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return result
+
+    def put(self, key, result, model_version):
+        with self._lock:
+            if model_version != self._model_version:
+                self._invalidate(model_version)
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _invalidate(self, model_version):
+        if self._entries:
+            self.stats["invalidations"] += 1
+            logger.info(f"♻️ Prediction cache invalidated ({len(self._entries)} entries, new model version)")
+        self._entries.clear()
+        self._model_version = model_version
+
+    def get_stats(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "capacity": self.max_entries,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,256 @@
+import os
+import sys
+import time
+import hmac
+import logging
+import threading
+from collections import Counter
+from contextvars import ContextVar
+
+from config import Config
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PHASE_LATENCY = metrics.histogram(
+    "solar_request_phase_seconds", "Request time by phase while profiling is enabled", ("route", "phase"))
+
+# The profile of the request being handled in this context; None when profiling is off
+_current = ContextVar("request_profile", default=None)
+
+
+class _NoopPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_PHASE = _NoopPhase()
+
+
+class RequestProfile:
+    """Exclusive time per phase for one request (nested phases are not double counted)"""
+
+    __slots__ = ("start", "phases", "_stack")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}
+        self._stack = []
+
+    def add(self, name, exclusive, inclusive=None):
+        self.phases[name] = self.phases.get(name, 0.0) + exclusive
+        if self._stack:
+            self._stack[-1] += exclusive if inclusive is None else inclusive
+
+
+class _Phase:
+    __slots__ = ("profile", "name", "begin")
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.profile._stack.append(0.0)
+        self.begin = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.begin
+        nested = self.profile._stack.pop()
+        self.profile.add(self.name, elapsed - nested, elapsed)
+        return False
+
+
+class Profiler:
+    """
+    Request phase timing plus an on-demand sampling profiler.
+
+    Code marks phases with `with profiler.phase("state_read"):` or reports a
+    duration it already measured with `profiler.record("model", seconds)`.
+    Both are no-ops unless the current request is being profiled (a single
+    ContextVar lookup), so the hooks stay in the code permanently. While
+    enabled, every response carries a `Server-Timing` header and per-route
+    phase totals are kept for `/api/admin/profiling`.
+
+    `sample()` snapshots every thread's stack at a fixed interval for a set
+    window and returns folded stacks ("frame;frame;frame count"), the input
+    format of flamegraph.pl, speedscope and inferno.
+    """
+
+    def __init__(self, enabled=False, max_sample_seconds=60.0, default_interval_ms=10.0):
+        self.enabled = enabled
+        self.max_sample_seconds = max_sample_seconds
+        self.default_interval_ms = default_interval_ms
+        self._lock = threading.Lock()
+        self._sampling = threading.Lock()
+        self._routes = {}  # (route, phase) -> [count, total seconds, max seconds]
+        self.stats = {"profiled_requests": 0, "samples_taken": 0, "sample_runs": 0, "resets": 0}
+
+    # --- Request phases ---
+
+    def phase(self, name):
+        profile = _current.get()
+        if profile is None:
+            return _NOOP_PHASE
+        return _Phase(profile, name)
+
+    def record(self, name, seconds):
+        profile = _current.get()
+        if profile is not None:
+            profile.add(name, seconds)
+
+    def begin_request(self):
+        if self.enabled:
+            return _current.set(RequestProfile())
+        return None
+
+    def end_request(self, route, response):
+        profile = _current.get()
+        if profile is None:
+            return response
+        total = time.perf_counter() - profile.start
+        phases = dict(profile.phases)
+        phases["other"] = max(0.0, total - sum(phases.values()))
+        with self._lock:
+            self.stats["profiled_requests"] += 1
+            for phase, seconds in list(phases.items()) + [("total", total)]:
+                entry = self._routes.setdefault((route, phase), [0, 0.0, 0.0])
+                entry[0] += 1
+                entry[1] += seconds
+                entry[2] = max(entry[2], seconds)
+        for phase, seconds in phases.items():
+            PHASE_LATENCY.labels(route, phase).observe(seconds)
+        timings = [f"{phase};dur={seconds * 1000:.3f}" for phase, seconds in phases.items()]
+        timings.append(f"total;dur={total * 1000:.3f}")
+        response.headers.add("Server-Timing", ", ".join(timings))
+        return response
+
+    def finish_request(self, token):
+        if token is not None:
+            try:
+                _current.reset(token)
+            except ValueError:  # torn down from a different context
+                _current.set(None)
+
+    def route_stats(self):
+        with self._lock:
+            items = list(self._routes.items())
+        routes = {}
+        for (route, phase), (count, total, peak) in items:
+            routes.setdefault(route, {})[phase] = {
+                "count": count,
+                "avg_ms": round(total / count * 1000, 3),
+                "max_ms": round(peak * 1000, 3),
+                "total_ms": round(total * 1000, 3),
+            }
+        return routes
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+            self.stats["resets"] += 1
+
+    # --- Sampling profiler ---
+
+    def sample(self, seconds, interval_ms=None, thread_filter=None):
+        """
+        Sample every other thread's stack for `seconds`; returns a Counter of folded stacks.
+        Runs on the calling thread (which is left out of the profile). Raises
+        RuntimeError if another sampling run is in progress.
+        """
+        seconds = min(max(float(seconds), 0.01), self.max_sample_seconds)
+        interval = max(float(interval_ms or self.default_interval_ms), 1.0) / 1000
+        if not self._sampling.acquire(blocking=False):
+            raise RuntimeError("A sampling run is already in progress")
+        try:
+            me = threading.get_ident()
+            folded = Counter()
+            samples = 0
+            deadline = time.perf_counter() + seconds
+            next_sample = time.perf_counter()
+            while next_sample < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    thread_name = names.get(ident, f"thread-{ident}")
+                    if thread_filter and thread_filter not in thread_name:
+                        continue
+                    folded[self._fold(thread_name, frame)] += 1
+                samples += 1
+                next_sample += interval
+                time.sleep(max(0.0, next_sample - time.perf_counter()))
+            self.stats["samples_taken"] += samples
+            self.stats["sample_runs"] += 1
+            logger.info(f"🔬 Profiled {samples} samples over {seconds:.1f}s ({len(folded)} unique stacks)")
+            return folded
+        finally:
+            self._sampling.release()
+
+    @staticmethod
+    def _fold(thread_name, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            module = frame.f_globals.get("__name__") or os.path.basename(code.co_filename)
+            stack.append(f"{module}:{code.co_name}")
+            frame = frame.f_back
+        stack.append(thread_name)
+        return ";".join(reversed(stack))
+
+    @staticmethod
+    def render_folded(folded):
+        return "".join(f"{stack} {count}\n" for stack, count in folded.most_common())
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "sampling": self._sampling.locked(),
+            "max_sample_seconds": self.max_sample_seconds,
+            "default_interval_ms": self.default_interval_ms,
+        }
+
+
+def check_admin_token(request):
+    """True if the request carries Config.ADMIN_TOKEN (as a Bearer token or X-Admin-Token)"""
+    expected = Config.ADMIN_TOKEN
+    if not expected:
+        return False
+    supplied = request.headers.get("X-Admin-Token", "")
+    auth = request.headers.get("Authorization", "")
+    if auth.startswith("Bearer "):
+        supplied = auth[len("Bearer "):]
+    return hmac.compare_digest(supplied.encode(), expected.encode())
+
+
+def install_profiling(app):
+    """Request hooks that open a profile per request while profiling is enabled"""
+    from flask import g, request
+
+    @app.before_request
+    def _begin_profile():
+        g._profile_token = profiler.begin_request()
+
+    @app.after_request
+    def _end_profile(response):
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        return profiler.end_request(route, response)
+
+    @app.teardown_request
+    def _finish_profile(exc):
+        profiler.finish_request(g.pop("_profile_token", None))
+
+
+# Create a singleton instance for the app to use
+profiler = Profiler(
+    enabled=Config.PROFILING_ENABLED,
+    max_sample_seconds=Config.PROFILING_MAX_SECONDS,
+    default_interval_ms=Config.PROFILING_SAMPLE_INTERVAL_MS,
+)
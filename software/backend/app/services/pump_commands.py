@@ -0,0 +1,228 @@
+import time
+import uuid
+import heapq
+import logging
+import threading
+from collections import OrderedDict
+
+from .metrics import metrics
+from .mqtt_service import mqtt_service
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Payloads the ESP32 firmware understands on the manual topic, and the pump state each should
+# produce (AUTO hands control back to the onboard logic, so any pump state confirms it)
+COMMAND_TARGETS = {"ON": "Running", "OFF": "OFF", "AUTO": None}
+
+COMMAND_LATENCY = metrics.histogram(
+    "solar_pump_command_actuation_seconds", "Time from first sending a pump command to telemetry confirming it",
+    ("command",), buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 20.0, 30.0, 60.0))
+COMMAND_OUTCOMES = metrics.counter(
+    "solar_pump_commands_total", "Pump commands by final outcome", ("outcome",))
+
+
+class PumpCommand:
+    """One manual ON/OFF/AUTO command and what has happened to it so far"""
+
+    def __init__(self, site_id, command, topic):
+        self.id = uuid.uuid4().hex
+        self.site_id = site_id
+        self.command = command
+        self.target = COMMAND_TARGETS[command]
+        self.topic = topic
+        self.state = "pending"  # -> acknowledged | failed | superseded
+        self.attempts = 0
+        self.created_at = time.time()
+        self.sent_at = None       # first send
+        self.deadline = None      # monotonic; when the current attempt times out
+        self.completed_at = None
+        self.latency_ms = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "site_id": self.site_id,
+            "command": self.command,
+            "target_status": self.target,
+            "state": self.state,
+            "attempts": self.attempts,
+            "created_at": self.created_at,
+            "completed_at": self.completed_at,
+            "latency_ms": self.latency_ms,
+        }
+
+
+class PumpCommandDispatcher:
+    """
+    Sends manual pump commands on `mine/pump/manual` and tracks them until the
+    tank's telemetry shows the pump in the commanded state.
+
+    `dispatch` only records the command and publishes it, so request threads
+    never wait on the device; callers get the command's correlation id and can
+    look it up later. One timer thread handles every site: an attempt that is
+    not confirmed within `timeout` is published again, up to `retries` times,
+    then the command fails. A newer command for the same site supersedes the
+    pending one, so at most one command per site is in flight.
+
+    The firmware takes a bare "ON"/"OFF"/"AUTO" and does not echo ids back, so the
+    correlation is done here: the first telemetry reading processed after the
+    command was sent that reports the target pump state in that manual mode
+    acknowledges it. Latency is measured from the first send to that reading.
+    """
+
+    def __init__(self, mqtt, topic, default_site_id=None, timeout=5.0, retries=2, history=1000):
+        self.mqtt = mqtt
+        self.topic = topic
+        self.default_site_id = default_site_id
+        self.timeout = timeout
+        self.retries = retries
+        self.history = history
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._pending = {}              # site_id -> PumpCommand
+        self._deadlines = []            # heap of (deadline, seq, command)
+        self._seq = 0
+        self._commands = OrderedDict()  # id -> PumpCommand, newest last
+        self._running = False
+        self._thread = None
+        self.stats = {"dispatched": 0, "sent": 0, "retries": 0, "acknowledged": 0, "failed": 0,
+                      "superseded": 0, "last_latency_ms": None}
+
+    def topic_for(self, site_id):
+        # Plain `mine/pump/manual` for the prototype tank (what the firmware subscribes to),
+        # `mine/pump/manual/<site_id>` for the rest of a fleet, as for telemetry
+        return self.topic if site_id == self.default_site_id else f"{self.topic}/{site_id}"
+
+    # --- Lifecycle ---
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="pump-commands", daemon=True)
+        self._thread.start()
+        logger.info(f"🕹️ Pump command dispatcher started on '{self.topic}'")
+
+    def attach(self, telemetry):
+        telemetry.add_listener(self.on_telemetry)
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+            self._wake.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    # --- Dispatch ---
+
+    def dispatch(self, site_id, command):
+        """Queue `command` ("ON"/"OFF"/"AUTO") for a site and return its record; never blocks on the device"""
+        if command not in COMMAND_TARGETS:
+            raise ValueError(f"Unknown pump command: {command!r}")
+        record = PumpCommand(site_id, command, self.topic_for(site_id))
+        with self._lock:
+            previous = self._pending.get(site_id)
+            if previous is not None:
+                self._finish(previous, "superseded")
+            self._pending[site_id] = record
+            self._commands[record.id] = record
+            while len(self._commands) > self.history:
+                self._commands.popitem(last=False)
+            self.stats["dispatched"] += 1
+            self._send(record)
+        return record
+
+    def _send(self, record):
+        """Publish one attempt and schedule its timeout (lock held)"""
+        record.attempts += 1
+        now = time.time()
+        if record.sent_at is None:
+            record.sent_at = now
+        record.deadline = time.monotonic() + self.timeout
+        # Coalesced with a queued older command while the broker is down, and never replayed
+        # once this attempt has timed out (the retry sends a fresh one)
+        self.mqtt.publish(record.topic, record.command, qos=1, ttl=self.timeout)
+        self.stats["sent"] += 1
+        self._seq += 1
+        heapq.heappush(self._deadlines, (record.deadline, self._seq, record))
+        self._wake.notify()
+
+    def get(self, command_id):
+        record = self._commands.get(command_id)
+        return record.to_dict() if record is not None else None
+
+    def recent(self, limit=50):
+        return [record.to_dict() for record in list(self._commands.values())[-limit:][::-1]]
+
+    # --- Acknowledgement (telemetry worker thread) ---
+
+    def on_telemetry(self, site_id, reading, received_at):
+        record = self._pending.get(site_id)
+        if record is None or received_at < record.sent_at:
+            return
+        if reading["manual_mode"] != record.command:
+            return
+        if record.target is not None and reading["pump_status"] != record.target:
+            return
+        with self._lock:
+            if self._pending.get(site_id) is not record:
+                return  # superseded or timed out meanwhile
+            latency = max(0.0, received_at - record.sent_at)
+            record.latency_ms = round(latency * 1000, 1)
+            self._finish(record, "acknowledged")
+        COMMAND_LATENCY.labels(record.command).observe(latency)
+        self.stats["last_latency_ms"] = record.latency_ms
+        logger.info(f"🕹️ Pump {record.command} confirmed for {site_id} in {record.latency_ms} ms "
+                    f"({record.attempts} attempt(s), id {record.id})")
+
+    def _finish(self, record, outcome):
+        """Settle a pending command (lock held)"""
+        record.state = outcome
+        record.completed_at = time.time()
+        if self._pending.get(record.site_id) is record:
+            del self._pending[record.site_id]
+        self.stats[outcome] += 1
+        COMMAND_OUTCOMES.labels(outcome).inc()
+
+    # --- Timeouts and retries ---
+
+    def _run(self):
+        with self._lock:
+            while self._running:
+                now = time.monotonic()
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    deadline, _, record = heapq.heappop(self._deadlines)
+                    if record.state != "pending" or record.deadline != deadline:
+                        continue  # settled, or an entry for an earlier attempt
+                    if record.attempts <= self.retries:
+                        self.stats["retries"] += 1
+                        logger.warning(f"⚠️ Pump {record.command} for {record.site_id} not confirmed after "
+                                       f"{self.timeout}s, resending (attempt {record.attempts + 1})")
+                        self._send(record)
+                    else:
+                        self._finish(record, "failed")
+                        logger.error(f"❌ Pump {record.command} for {record.site_id} not confirmed after "
+                                     f"{record.attempts} attempt(s), giving up (id {record.id})")
+                wait = self._deadlines[0][0] - now if self._deadlines else None
+                self._wake.wait(wait)
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "pending": len(self._pending),
+            "timeout_s": self.timeout,
+            "retries_per_command": self.retries,
+        }
+
+
+# Create a singleton instance for the app to use
+pump_commands = PumpCommandDispatcher(
+    mqtt_service,
+    Config.PUMP_COMMAND_TOPIC,
+    default_site_id=Config.DEFAULT_SITE_ID,
+    timeout=Config.PUMP_COMMAND_TIMEOUT,
+    retries=Config.PUMP_COMMAND_RETRIES,
+    history=Config.PUMP_COMMAND_HISTORY,
+)
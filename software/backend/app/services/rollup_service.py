@@ -0,0 +1,396 @@
+import time
+import logging
+import calendar
+from datetime import datetime, timezone
+
+from .state_store import state_store
+from .storage_service import storage_service
+from ..models.fleet_simulator import GRID_EMISSION_FACTOR
+from ..models.sites import MINING_SITES
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+GRAINS = ("minute", "hour", "day", "month")
+# Additive measures kept per (site, grain, bucket)
+MEASURES = ("solar_kwh", "grid_kwh", "pump_seconds", "operational_cost_inr", "co2_avoided_kg",
+            "readings", "pump_starts")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    site_id TEXT NOT NULL,
+    grain TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    solar_kwh REAL NOT NULL DEFAULT 0,
+    grid_kwh REAL NOT NULL DEFAULT 0,
+    pump_seconds REAL NOT NULL DEFAULT 0,
+    operational_cost_inr REAL NOT NULL DEFAULT 0,
+    co2_avoided_kg REAL NOT NULL DEFAULT 0,
+    readings INTEGER NOT NULL DEFAULT 0,
+    pump_starts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (site_id, grain, bucket)
+) WITHOUT ROWID;
+-- Fleet-wide queries (every site at once)
+CREATE INDEX IF NOT EXISTS idx_rollups_grain_bucket ON rollups (grain, bucket);
+"""
+
+UPSERT = (
+    f"INSERT INTO rollups (site_id, grain, bucket, {', '.join(MEASURES)}) "
+    f"VALUES (?, ?, ?, {', '.join('?' for _ in MEASURES)}) "
+    f"ON CONFLICT (site_id, grain, bucket) DO UPDATE SET "
+    + ", ".join(f"{m} = {m} + excluded.{m}" for m in MEASURES)
+)
+
+# Pump actions that change whether the pump runs (override on/off only change who decides)
+ACTION_RUNNING = {"start": True, "stop": False, "reset": False}
+MONTH_LABELS = calendar.month_abbr
+
+
+class BucketClock:
+    """Bucket starts (epoch seconds) at each grain, on local days/months of a fixed UTC offset"""
+
+    def __init__(self, utc_offset_minutes=0):
+        self.offset = utc_offset_minutes * 60
+        self._months = {}  # day bucket -> month bucket
+
+    def floor(self, grain, ts):
+        if grain == "month":
+            return self._month(self.floor("day", ts))
+        width = {"minute": 60, "hour": 3600, "day": 86400}[grain]
+        return int((ts + self.offset) // width * width - self.offset)
+
+    def next(self, grain, bucket):
+        """Start of the bucket after the one starting at `bucket`"""
+        if grain == "month":
+            local = datetime.fromtimestamp(bucket + self.offset, timezone.utc)
+            year, month = (local.year + 1, 1) if local.month == 12 else (local.year, local.month + 1)
+            return int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp()) - self.offset
+        return bucket + {"minute": 60, "hour": 3600, "day": 86400}[grain]
+
+    def _month(self, day):
+        month = self._months.get(day)
+        if month is None:
+            local = datetime.fromtimestamp(day + self.offset, timezone.utc)
+            month = int(datetime(local.year, local.month, 1, tzinfo=timezone.utc).timestamp()) - self.offset
+            if len(self._months) > 4096:
+                self._months.clear()
+            self._months[day] = month
+        return month
+
+    def label(self, month_bucket):
+        return MONTH_LABELS[datetime.fromtimestamp(month_bucket + self.offset, timezone.utc).month]
+
+    def cover(self, start, end):
+        """
+        (grain, first bucket, end) runs that tile [start, end) with the fewest buckets:
+        minutes up to the first hour boundary, then hours, days, months, and back down.
+        A year comes out as at most ~12 months plus ~120 smaller buckets at the edges.
+        """
+        runs, cursor = [], self.floor("minute", start)
+        end = self.floor("minute", end)
+        while cursor < end:
+            grain = "minute"
+            for coarser in GRAINS[1:]:
+                if self.floor(coarser, cursor) != cursor or self.next(coarser, cursor) > end:
+                    break
+                grain = coarser
+            stop = self.next(grain, cursor)
+            if runs and runs[-1][0] == grain:
+                runs[-1] = (grain, runs[-1][1], stop)
+            else:
+                runs.append((grain, cursor, stop))
+            cursor = stop
+        return runs
+
+
+class RollupService:
+    """
+    Minute/hour/day/month rollups of energy, cost and CO2 per site.
+
+    Raw rows stay where they are; the rollups ride along as a storage
+    extension. Each time the storage writer commits a batch of telemetry rows
+    and pump actions, the same transaction adds that batch's contribution to
+    every bucket it touches, with one UPSERT per (site, grain, bucket). An
+    aggregate over any range then costs O(buckets), never O(rows).
+
+    Between two consecutive events for a site, the pump is taken to stay as
+    the earlier one left it (capped at `max_gap` seconds, so an outage does not
+    count as runtime). Running time draws `pump_kw`:
+    - from solar, up to the reported solar power, or entirely while the panel
+      voltage is above `solar_active_voltage` (the prototype reports no power);
+    - the rest from the grid, at the site's `grid_backup_cost`.
+    CO2 avoided is solar kWh x the grid emission factor. Runtime crossing a
+    minute boundary is split between the minutes.
+
+    After each commit the touched sites' `co2_saved`, `hybrid_usage` (grid
+    share of pump energy, %) and the six-month `energy_data`/`demand_data`
+    series in the state store are refreshed from totals held in memory.
+    """
+
+    def __init__(self, storage, store, pump_kw=4.5, max_gap=300, solar_active_voltage=4.5,
+                 utc_offset_minutes=330, default_site_id=None):
+        self.storage = storage
+        self.store = store
+        self.pump_kw = pump_kw
+        self.max_gap = max_gap
+        self.solar_active_voltage = solar_active_voltage
+        self.default_site_id = default_site_id
+        self.clock = BucketClock(utc_offset_minutes)
+        self._last = {}      # site_id -> (ts, running, solar share)
+        self._months = {}    # site_id -> {month bucket: [measures]}, for the state store summaries
+        self._costs = {}
+        self._staged = None  # (accumulated buckets, new _last entries) awaiting commit
+        self._dirty = set()  # sites whose state store summaries are out of date
+        self.stats = {"events": 0, "upserts": 0, "flushes": 0, "backfilled_events": 0, "last_apply_ms": None}
+
+    # --- Storage extension hooks (storage writer thread) ---
+
+    def init_schema(self, conn):
+        conn.executescript(SCHEMA)
+        has_rollups = conn.execute("SELECT 1 FROM rollups LIMIT 1").fetchone() is not None
+        has_raw = conn.execute("SELECT 1 FROM telemetry LIMIT 1").fetchone() is not None
+        if not has_rollups and has_raw:
+            self.backfill(conn)
+        self._load(conn)
+
+    def on_flush(self, conn, grouped):
+        """Inside the storage transaction: add this batch to the rollups"""
+        started = time.perf_counter()
+        events = self._events(grouped.get("telemetry", ()), grouped.get("pump_actions", ()))
+        acc, last = self._accumulate(events, dict(self._last))
+        self._write(conn, acc)
+        self._staged = (acc, last)
+        self.stats["events"] += len(events)
+        self.stats["last_apply_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    def on_commit(self):
+        """After the transaction committed: adopt the staged state, refresh the state store"""
+        if self._staged is None:
+            return
+        acc, last = self._staged
+        self._staged = None
+        self._last = last
+        touched, self._dirty = self._dirty, set()
+        for (site_id, grain, bucket), values in acc.items():
+            if grain == "month":
+                month = self._months.setdefault(site_id, {}).setdefault(bucket, [0.0] * len(MEASURES))
+                for i, value in enumerate(values):
+                    month[i] += value
+                touched.add(site_id)
+        self.stats["flushes"] += 1
+        for site_id in touched:
+            self._publish(site_id)
+
+    def on_rollback(self):
+        self._staged = None
+
+    def on_compact(self, conn, cutoff):
+        """Minute rows follow the raw data's retention; hour, day and month rows are kept"""
+        return conn.execute("DELETE FROM rollups WHERE grain = 'minute' AND bucket < ?", (cutoff,)).rowcount
+
+    # --- Incremental accumulation ---
+
+    def _events(self, telemetry_rows, action_rows):
+        """(ts, site_id, running, solar share or None, is_reading) in time order"""
+        events = []
+        for row in telemetry_rows:
+            site_id, ts, pump_status, solar_power, solar_voltage = row[0], row[1], row[4], row[5], row[6]
+            events.append((ts, site_id, pump_status == "Running", self._solar_share(solar_power, solar_voltage), True))
+        for site_id, ts, action, _source in action_rows:
+            if action in ACTION_RUNNING:
+                events.append((ts, site_id, ACTION_RUNNING[action], None, False))
+        events.sort(key=lambda event: event[0])
+        return events
+
+    def _solar_share(self, solar_power, solar_voltage):
+        if solar_power:
+            return min(1.0, max(0.0, solar_power / self.pump_kw))  # state solar_power is in kW
+        if solar_voltage is not None and solar_voltage >= self.solar_active_voltage:
+            return 1.0
+        return 0.0
+
+    def _accumulate(self, events, last):
+        acc = {}
+        clock = self.clock
+        kwh_per_second = self.pump_kw / 3600
+        for ts, site_id, running, share, is_reading in events:
+            previous = last.get(site_id)
+            if previous is not None and ts < previous[0]:
+                continue  # older than what this site already reported
+            was_running = False
+            if previous is not None:
+                prev_ts, was_running, prev_share = previous
+                if share is None:
+                    share = prev_share
+                if was_running:
+                    # Runtime since the previous event, split over the minutes it spans
+                    cost = self._grid_cost(site_id)
+                    until = prev_ts + min(ts - prev_ts, self.max_gap)
+                    minute = clock.floor("minute", prev_ts)
+                    while minute < until:
+                        seconds = min(until, minute + 60) - max(prev_ts, minute)
+                        if seconds > 0:
+                            kwh = seconds * kwh_per_second
+                            solar = kwh * prev_share
+                            grid = kwh - solar
+                            self._add(acc, site_id, minute,
+                                      (solar, grid, seconds, grid * cost, solar * GRID_EMISSION_FACTOR, 0, 0))
+                        minute += 60
+            counts = (0.0, 0.0, 0.0, 0.0, 0.0, int(is_reading), int(running and not was_running))
+            if counts[5] or counts[6]:
+                self._add(acc, site_id, clock.floor("minute", ts), counts)
+            last[site_id] = (ts, running, share if share is not None else 0.0)
+        return acc, last
+
+    def _add(self, acc, site_id, minute, values):
+        clock = self.clock
+        hour = clock.floor("hour", minute)
+        day = clock.floor("day", minute)
+        for key in ((site_id, "minute", minute), (site_id, "hour", hour), (site_id, "day", day),
+                    (site_id, "month", clock.floor("month", day))):
+            bucket = acc.get(key)
+            if bucket is None:
+                acc[key] = list(values)
+            else:
+                for i, value in enumerate(values):
+                    bucket[i] += value
+
+    def _write(self, conn, acc):
+        if acc:
+            conn.executemany(UPSERT, [(site_id, grain, bucket, *values)
+                                      for (site_id, grain, bucket), values in acc.items()])
+            self.stats["upserts"] += len(acc)
+
+    def _grid_cost(self, site_id):
+        cost = self._costs.get(site_id)
+        if cost is None:
+            site = MINING_SITES.get(site_id) or MINING_SITES.get(self.default_site_id) or {}
+            cost = self._costs[site_id] = float(site.get("grid_backup_cost", 0.0))
+        return cost
+
+    # --- Startup ---
+
+    def backfill(self, conn, chunk=50_000):
+        """Build the rollups from the raw rows once (an existing database without them)"""
+        started = time.perf_counter()
+        cursor = conn.execute(
+            "SELECT site_id, ts, NULL, NULL, pump_status, solar_power, solar_voltage, 't' FROM telemetry "
+            "UNION ALL SELECT site_id, ts, action, NULL, NULL, NULL, NULL, 'a' FROM pump_actions ORDER BY ts")
+        last, total = {}, 0
+        with conn:
+            while True:
+                rows = cursor.fetchmany(chunk)
+                if not rows:
+                    break
+                telemetry = [row for row in rows if row[7] == "t"]
+                actions = [(row[0], row[1], row[2], None) for row in rows if row[7] == "a"]
+                acc, last = self._accumulate(self._events(telemetry, actions), last)
+                self._write(conn, acc)
+                total += len(rows)
+        self.stats["backfilled_events"] = total
+        logger.info(f"📊 Rollups backfilled from {total} raw rows in {time.perf_counter() - started:.1f}s")
+
+    def _load(self, conn):
+        """Month totals and each site's last reading, so increments continue where they left off"""
+        self._months = {}
+        for site_id, bucket, *values in conn.execute(
+                f"SELECT site_id, bucket, {', '.join(MEASURES)} FROM rollups WHERE grain = 'month'"):
+            self._months.setdefault(site_id, {})[bucket] = list(values)
+        self._last = {}
+        # Bare columns of a MAX() aggregate come from the row holding the maximum
+        for site_id, ts, pump_status, solar_power, solar_voltage in conn.execute(
+                "SELECT site_id, MAX(ts), pump_status, solar_power, solar_voltage FROM telemetry GROUP BY site_id"):
+            self._last[site_id] = (ts, pump_status == "Running", self._solar_share(solar_power, solar_voltage))
+        # Published with the first commit, once the state replica (if any) is running
+        self._dirty = set(self._months)
+
+    # --- State store summaries ---
+
+    def _publish(self, site_id):
+        if site_id not in self.store:
+            return
+        months = self._months.get(site_id, {})
+        solar = sum(m[0] for m in months.values())
+        grid = sum(m[1] for m in months.values())
+        co2 = sum(m[4] for m in months.values())
+        recent = [self.clock.floor("month", time.time())]
+        for _ in range(5):
+            recent.insert(0, self.clock.floor("month", recent[0] - 1))
+        zero = [0.0] * len(MEASURES)
+        changes = {
+            "co2_saved": round(co2, 1),
+            "hybrid_usage": round(grid / (solar + grid) * 100, 1) if solar + grid > 0 else 0.0,
+            "energy_data": [{"month": self.clock.label(b), "value": round(months.get(b, zero)[0], 2)}
+                            for b in recent],
+            "demand_data": [{"month": self.clock.label(b), "value": round(sum(months.get(b, zero)[:2]), 2)}
+                            for b in recent],
+        }
+        current = self.store.get(site_id)
+        if any(current.get(key) != value for key, value in changes.items()):
+            self.store.update(site_id, changes)
+
+    # --- Queries (any thread) ---
+
+    def series(self, site_id, grain, start, end):
+        """Per-bucket measures for one site (or every site, summed, if site_id is None)"""
+        if grain not in GRAINS:
+            raise ValueError(f"Unknown grain {grain!r}; choose from {list(GRAINS)}")
+        start_bucket = self.clock.floor(grain, start)
+        columns = ", ".join(f"SUM({m})" for m in MEASURES)
+        where, params = "grain = ? AND bucket >= ? AND bucket < ?", [grain, start_bucket, end]
+        if site_id is not None:
+            where += " AND site_id = ?"
+            params.append(site_id)
+        rows = self._query(f"SELECT bucket, {columns} FROM rollups WHERE {where} GROUP BY bucket ORDER BY bucket",
+                           params)
+        return [{"bucket": bucket, **{m: _round(m, v) for m, v in zip(MEASURES, values)}}
+                for bucket, *values in rows]
+
+    def totals(self, site_id, start, end):
+        """Sum of every measure over [start, end), read from the fewest buckets that tile it"""
+        totals = dict.fromkeys(MEASURES, 0.0)
+        first = self._query("SELECT MIN(bucket) FROM rollups WHERE grain = 'month'", ())
+        if not first or first[0][0] is None:
+            return {**totals, "buckets_read": 0}
+        runs = self.clock.cover(max(start, first[0][0]), end)
+        if not runs:
+            return {**totals, "buckets_read": 0}
+        # One primary-key (or grain/bucket index) range scan per run
+        where = "grain = ? AND bucket >= ? AND bucket < ?" + (" AND site_id = ?" if site_id is not None else "")
+        parts, params = [], []
+        for grain, first_bucket, stop in runs:
+            parts.append(f"SELECT {', '.join(MEASURES)} FROM rollups WHERE {where}")
+            params += [grain, first_bucket, stop] + ([site_id] if site_id is not None else [])
+        row = self._query(f"SELECT COUNT(*), {', '.join(f'SUM({m})' for m in MEASURES)} "
+                          f"FROM ({' UNION ALL '.join(parts)})", params)[0]
+        for measure, value in zip(MEASURES, row[1:]):
+            totals[measure] = _round(measure, value or 0.0)
+        return {**totals, "buckets_read": row[0]}
+
+    def _query(self, sql, params):
+        import sqlite3
+        try:
+            return self.storage.read_connection().execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            if "no such table" not in str(e):
+                raise
+            return []  # the storage writer has not created the schema yet
+
+    def get_stats(self):
+        return {**self.stats, "sites": len(self._last)}
+
+
+def _round(measure, value):
+    return int(value) if measure in ("readings", "pump_starts") else round(value, 4)
+
+
+# Create a singleton instance for the app to use
+rollup_service = RollupService(
+    storage_service,
+    state_store,
+    pump_kw=Config.PUMP_KW,
+    max_gap=Config.ROLLUP_MAX_GAP_SECONDS,
+    solar_active_voltage=Config.SOLAR_ACTIVE_VOLTAGE,
+    utc_offset_minutes=Config.ROLLUP_UTC_OFFSET_MINUTES,
+    default_site_id=Config.DEFAULT_SITE_ID,
+)
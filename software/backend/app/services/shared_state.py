@@ -0,0 +1,310 @@
+import os
+import mmap
+import time
+import logging
+
+import numpy as np
+
+from .status_stream import changed_fields
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0x534F4C52  # "SOLR"
+LAYOUT_VERSION = 1
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "<u4"),
+    ("layout", "<u4"),
+    ("capacity", "<u4"),
+    ("count", "<u4"),          # slots in use; a slot is fully written before count covers it
+    ("seq", "<u8"),            # bumped after every slot write, so readers can skip idle polls
+    ("boot", "<u8"),           # writer's status_cache boot id
+    ("created", "<f8"),
+    ("_pad", "V24"),
+])
+
+# Per-tank slot; `seq` is the seqlock (odd while the writer is inside the slot)
+SLOT_DTYPE = np.dtype([
+    ("seq", "<u8"),
+    ("version", "<u8"),        # state version this slot was written at
+    ("base_version", "<u8"),   # version it was derived from, if only slot fields changed (else 0)
+    ("present", "<u2"),        # bit per field: the snapshot has it
+    ("ints", "<u2"),           # bit per field: the value was an int, not a float
+    ("pump_status", "u1"),
+    ("ai_prediction", "i1"),
+    ("_pad", "V2"),
+    ("water_level", "<f8"),
+    ("water_percentage", "<f8"),
+    ("solar_power", "<f8"),
+    ("ai_confidence", "<f8"),
+    ("solar_voltage", "<f8"),
+    ("battery_voltage", "<f8"),
+    ("last_telemetry", "<f8"),
+    ("last_updated", "S32"),
+    ("site_id", "S64"),
+])
+
+FLOAT_FIELDS = ("water_level", "water_percentage", "solar_power", "ai_confidence",
+                "solar_voltage", "battery_voltage", "last_telemetry")
+FIELDS = FLOAT_FIELDS + ("pump_status", "ai_prediction", "last_updated")
+FIELD_BITS = {name: 1 << i for i, name in enumerate(FIELDS)}
+SEGMENT_FIELDS = frozenset(FIELDS) | {"site_id"}
+
+PUMP_STATUS_CODES = {"OFF": 0, "Running": 1}
+PUMP_STATUS_NAMES = {code: name for name, code in PUMP_STATUS_CODES.items()}
+
+_MISSING = object()
+
+
+def encode_fields(snapshot):
+    """(values, present bits, int bits, exact) for the segment fields of a snapshot"""
+    values, present, ints, exact = {}, 0, 0, True
+    for name in FIELDS:
+        value = snapshot.get(name, _MISSING)
+        if value is _MISSING:
+            continue
+        bit = FIELD_BITS[name]
+        if name == "pump_status":
+            code = PUMP_STATUS_CODES.get(value)
+            if code is None:
+                exact = False
+                continue
+            values[name] = code
+        elif name == "ai_prediction":
+            if type(value) is not int or not -128 <= value <= 127:
+                exact = False
+                continue
+            values[name] = value
+        elif name == "last_updated":
+            encoded = value.encode() if isinstance(value, str) else None
+            if encoded is None or len(encoded) > 32:
+                exact = False
+                continue
+            values[name] = encoded
+        else:
+            if type(value) is int:
+                ints |= bit
+            elif type(value) is not float:
+                exact = False
+                continue
+            values[name] = value
+        present |= bit
+    return values, present, ints, exact
+
+
+def decode_slot(slot):
+    """Snapshot fields from one (copied) slot record"""
+    present, ints = int(slot["present"]), int(slot["ints"])
+    fields = {}
+    for name in FLOAT_FIELDS:
+        bit = FIELD_BITS[name]
+        if present & bit:
+            value = float(slot[name])
+            fields[name] = int(value) if ints & bit else value
+    if present & FIELD_BITS["pump_status"]:
+        fields["pump_status"] = PUMP_STATUS_NAMES[int(slot["pump_status"])]
+    if present & FIELD_BITS["ai_prediction"]:
+        fields["ai_prediction"] = int(slot["ai_prediction"])
+    if present & FIELD_BITS["last_updated"]:
+        fields["last_updated"] = slot["last_updated"].decode()
+    return fields
+
+
+class SharedStateSegment:
+    """
+    Fixed-layout, memory-mapped table of the hot per-tank state.
+
+    One writer process (the cluster owner) updates a tank's slot in place from a
+    state store listener, so every committed write lands in the segment before
+    the store lock is released. Any number of reader processes map the same
+    file read-only and see the slots as a numpy structured array, with no
+    parsing or copying of the whole table. Each slot is a seqlock: the writer
+    makes `seq` odd, writes the fields and makes it even again; a reader copies
+    the slot and keeps it only if `seq` was even and unchanged around the copy,
+    otherwise it retries. (The check assumes stores become visible in program
+    order, as they do on x86.)
+
+    `base_version` lets a reader that holds a site at exactly that version
+    apply the slot and end up with the writer's snapshot byte for byte, since
+    only slot fields changed in between.
+    """
+
+    def __init__(self, path, buffer, mapped, writable):
+        self.path = path
+        self._mmap = mapped
+        self.writable = writable
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=buffer, offset=0)
+        if int(self.header["magic"]) != MAGIC or int(self.header["layout"]) != LAYOUT_VERSION:
+            raise ValueError(f"{path} is not a layout {LAYOUT_VERSION} shared state segment")
+        capacity = int(self.header["capacity"])
+        self.slots = np.ndarray((capacity,), dtype=SLOT_DTYPE, buffer=buffer, offset=HEADER_DTYPE.itemsize)
+        self._index = {}        # site_id -> slot
+        self._indexed = 0       # slots covered by _index
+        self._versions = {}     # writer: site_id -> last written version
+        self._full_warned = False
+        self.stats = {"writes": 0, "reads": 0, "retries": 0, "inexact": 0}
+
+    @classmethod
+    def size_for(cls, capacity):
+        return HEADER_DTYPE.itemsize + SLOT_DTYPE.itemsize * capacity
+
+    @classmethod
+    def create(cls, path, capacity, boot=0):
+        """New segment file (replacing any previous one atomically) opened for writing"""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.truncate(cls.size_for(capacity))
+        with open(tmp, "r+b") as f:
+            mapped = mmap.mmap(f.fileno(), 0)
+        header = np.ndarray((), dtype=HEADER_DTYPE, buffer=mapped, offset=0)
+        header["magic"], header["layout"], header["capacity"] = MAGIC, LAYOUT_VERSION, capacity
+        header["boot"], header["created"] = boot, time.time()
+        os.replace(tmp, path)
+        logger.info(f"🧮 Shared state segment '{path}' created for {capacity} tanks "
+                    f"({cls.size_for(capacity) // 1024} KiB)")
+        return cls(path, mapped, mapped, writable=True)
+
+    @classmethod
+    def open(cls, path):
+        """Map an existing segment read-only"""
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(path, mapped, mapped, writable=False)
+
+    @property
+    def seq(self):
+        return int(self.header["seq"])
+
+    @property
+    def boot(self):
+        return int(self.header["boot"])
+
+    def close(self):
+        self.header = self.slots = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # a caller still holds a view; the mapping goes when it does
+
+    # --- Writer ---
+
+    def attach(self, store):
+        """
+        Mirror every write of `store` into the segment. Call once, in the owner,
+        before anything else writes to the store: the listener is the only writer.
+        """
+        for site_id in store.site_ids():
+            self.write(site_id, store.get(site_id), store.version)
+        store.add_listener(lambda site_id, previous, snapshot: self.on_change(site_id, previous, snapshot, store))
+
+    def on_change(self, site_id, previous, snapshot, store):
+        exact = previous is not None and changed_fields(previous, snapshot).keys() <= SEGMENT_FIELDS
+        self.write(site_id, snapshot, store.version, exact=exact)
+
+    def write(self, site_id, snapshot, version, exact=False):
+        index = self._slot_for_write(site_id)
+        if index is None:
+            return
+        values, present, ints, encodable = encode_fields(snapshot)
+        base = self._versions.get(site_id, 0) if exact and encodable else 0
+        if not base:
+            self.stats["inexact"] += 1
+        slot = self.slots[index:index + 1]
+        slot["seq"] += 1  # odd: write in progress
+        slot["version"], slot["base_version"] = version, base
+        slot["present"], slot["ints"] = present, ints
+        for name, value in values.items():
+            slot[name] = value
+        slot["seq"] += 1  # even: consistent
+        self.header["seq"] += 1
+        self._versions[site_id] = version
+        self.stats["writes"] += 1
+
+    def _slot_for_write(self, site_id):
+        index = self._index.get(site_id)
+        if index is not None:
+            return index
+        count = int(self.header["count"])
+        encoded = site_id.encode()
+        if count >= len(self.slots) or len(encoded) > SLOT_DTYPE["site_id"].itemsize:
+            if not self._full_warned:
+                logger.warning(f"⚠️ Shared state segment cannot hold site '{site_id}' "
+                               f"({count}/{len(self.slots)} slots); it is replicated by file only")
+                self._full_warned = True
+            return None
+        self.slots["site_id"][count] = encoded
+        self.header["count"] = count + 1
+        self._index[site_id] = count
+        return count
+
+    # --- Readers ---
+
+    def _refresh_index(self):
+        count = int(self.header["count"])
+        if count != self._indexed:
+            for index in range(self._indexed, count):
+                self._index[self.slots["site_id"][index].decode()] = index
+            self._indexed = count
+
+    def site_ids(self):
+        self._refresh_index()
+        return list(self._index)
+
+    def read_slot(self, index, retries=1000):
+        """Consistent copy of one slot (None if the writer kept it busy for every retry)"""
+        seqs = self.slots["seq"]
+        for attempt in range(retries):
+            before = int(seqs[index])
+            if before & 1 == 0:
+                record = self.slots[index].copy()
+                if int(seqs[index]) == before:
+                    self.stats["reads"] += 1
+                    return record
+            self.stats["retries"] += 1
+            if attempt >= 8:
+                time.sleep(0)  # the writer may be descheduled mid-slot; let it finish
+        return None
+
+    def read_site(self, site_id):
+        """{"version", "base_version", **fields} for one site, or None if it has no slot"""
+        self._refresh_index()
+        index = self._index.get(site_id)
+        if index is None:
+            return None
+        record = self.read_slot(index)
+        if record is None:
+            return None
+        return {"version": int(record["version"]), "base_version": int(record["base_version"]),
+                **decode_slot(record)}
+
+    def read_all(self):
+        """
+        Consistent copies of every slot in use: one vectorized copy, then slots
+        whose seqlock moved (or was odd) during it are re-read one by one.
+        """
+        self._refresh_index()
+        count = self._indexed
+        before = self.slots["seq"][:count].copy()
+        records = self.slots[:count].copy()
+        after = self.slots["seq"][:count]
+        torn = np.flatnonzero((before != after) | (before & 1 == 1))
+        for index in torn:
+            self.stats["retries"] += 1
+            record = self.read_slot(index)
+            if record is not None:
+                records[index] = record
+            else:
+                records["version"][index] = 0  # unreadable this time: never newer than what a reader holds
+        self.stats["reads"] += count
+        return records
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "path": self.path,
+            "writable": self.writable,
+            "capacity": len(self.slots),
+            "sites": int(self.header["count"]),
+            "seq": self.seq,
+            "slot_bytes": SLOT_DTYPE.itemsize,
+        }
@@ -0,0 +1,123 @@
+import math
+import time
+import logging
+
+import numpy as np
+
+from .weather_service import weather_provider
+from ..models.solar_profile import solar_profile
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class SolarForecastService:
+    """
+    Expected solar irradiance and panel output per site, now or over the
+    next hours, from the compiled minute-of-day profile (see SolarProfile).
+
+    Sites share the configured location unless `locations` gives their own
+    (latitude, longitude). Cloud cover comes from the caller, or else from
+    the current weather reading, held constant over the horizon (persistence):
+    one weather location serves the whole fleet. A forecast evaluates each
+    distinct (latitude, longitude, cloud cover) once, as one (U, T) numpy
+    pass, and sites sharing those conditions share the resulting series.
+    """
+
+    def __init__(self, weather, latitude, longitude, locations=None, max_hours=168):
+        self.weather = weather
+        self.latitude = latitude
+        self.longitude = longitude
+        self.locations = dict(locations or {})
+        self.max_hours = max_hours
+        self.stats = {"lookups": 0, "forecasts": 0, "points": 0, "last_forecast_ms": None}
+
+    def _cloud_cover(self, cloud_cover):
+        if cloud_cover is not None:
+            _check_finite(cloud_cover, "cloud_cover")
+            return cloud_cover
+        return self.weather.current().get("cloud_cover") or 0.0
+
+    def _conditions(self, site_ids, cloud_cover):
+        """Distinct (latitude, longitude, cloud cover) rows, and which row each site uses"""
+        cloud = self._cloud_cover(cloud_cover)
+        if isinstance(cloud, dict):
+            default = self._cloud_cover(None)
+            cloud = [cloud.get(s, default) for s in site_ids]
+        rows = np.column_stack([
+            np.array([self.locations.get(s, (self.latitude, self.longitude)) for s in site_ids],
+                     dtype=np.float64).reshape(-1, 2),
+            np.broadcast_to(np.asarray(cloud, dtype=np.float64), (len(site_ids),)),
+        ])
+        return np.unique(rows, axis=0, return_inverse=True)
+
+    def expected(self, site_id, ts=None, cloud_cover=None, capacity_w=None):
+        """Irradiance and panel output expected at `ts` (default now) for one site"""
+        ts = time.time() if ts is None else ts
+        _check_finite(capacity_w, "capacity_w")
+        latitude, longitude = self.locations.get(site_id, (self.latitude, self.longitude))
+        cloud = self._cloud_cover(cloud_cover)
+        if isinstance(cloud, dict):
+            cloud = cloud.get(site_id, self._cloud_cover(None))
+        irradiance, power, voltage, current = solar_profile().at(ts, latitude, longitude, cloud, capacity_w)
+        self.stats["lookups"] += 1
+        return {
+            "site_id": site_id,
+            "ts": ts,
+            "cloud_cover": round(cloud, 3),
+            "irradiance": round(irradiance, 2),
+            "power_w": round(power, 3),
+            "voltage": round(voltage, 3),
+            "current": round(current, 4),
+        }
+
+    def forecast(self, site_ids, start=None, hours=24, step_minutes=15, cloud_cover=None, capacity_w=None):
+        """
+        {"t": [...], "step_minutes", "sites": {site: {"irradiance", "power_w", "energy_wh"}}}
+        for `hours` from `start` (default now). Raises ValueError for a bad horizon or no sites.
+        """
+        began = time.perf_counter()
+        if not site_ids:
+            raise ValueError("No sites to forecast")
+        if not 0 < hours <= self.max_hours:
+            raise ValueError(f"hours must be between 0 and {self.max_hours}")
+        if not 1 <= step_minutes <= 60 * hours:
+            raise ValueError("step_minutes must be at least 1 and within the horizon")
+        start = time.time() if start is None else start
+        _check_finite(capacity_w, "capacity_w")
+        t = start + np.arange(0, hours * 3600, step_minutes * 60, dtype=np.float64)
+
+        conditions, which = self._conditions(site_ids, cloud_cover)
+        irradiance = solar_profile().irradiance(t, conditions[:, :1], conditions[:, 1:2], conditions[:, 2:])
+        power, _voltage, _current = solar_profile().panel(irradiance, capacity_w)
+        energy = power.sum(axis=1) * step_minutes / 60
+
+        series = [{"cloud_cover": round(cloud, 3), "irradiance": i, "power_w": p, "energy_wh": round(e, 2)}
+                  for cloud, i, p, e in zip(conditions[:, 2].tolist(), np.round(irradiance, 1).tolist(),
+                                            np.round(power, 3).tolist(), energy.tolist())]
+        sites = {site_id: series[u] for site_id, u in zip(site_ids, which.reshape(-1).tolist())}
+        elapsed_ms = round((time.perf_counter() - began) * 1000, 2)
+        self.stats["forecasts"] += 1
+        self.stats["points"] += len(site_ids) * len(t)
+        self.stats["last_forecast_ms"] = elapsed_ms
+        return {"start": start, "hours": hours, "step_minutes": step_minutes,
+                "t": np.round(t).astype(np.int64).tolist(), "elapsed_ms": elapsed_ms, "sites": sites}
+
+    def get_stats(self):
+        return dict(self.stats)
+
+
+def _check_finite(value, name):
+    """Scalar (or per-site dict of) query values must be finite numbers"""
+    values = value.values() if isinstance(value, dict) else [] if value is None else [value]
+    if not all(math.isfinite(v) for v in values):
+        raise ValueError(f"{name} must be a finite number")
+
+
+# Create a singleton instance for the app to use
+solar_forecast = SolarForecastService(
+    weather_provider,
+    Config.SITE_LATITUDE,
+    Config.SITE_LONGITUDE,
+    max_hours=Config.SOLAR_FORECAST_MAX_HOURS,
+)
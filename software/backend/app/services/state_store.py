@@ -0,0 +1,218 @@
+import threading
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def default_site_state():
+    """Initial state for a newly registered tank (same shape the dashboard expects)"""
+    return {
+        "pump_status": "OFF",
+        "water_level": 1.5,
+        "water_percentage": 25.0,
+        "solar_power": 0.0,
+        "hybrid_usage": 0.0,
+        "co2_saved": 120.0,
+        "ai_prediction": 0,
+        "ai_confidence": 0.0,
+        "manual_override": False,
+        "manual_override_until": None,
+        "last_updated": datetime.now().isoformat(),
+        "weather": {
+            "temperature": 28.5,
+            "humidity": 65,
+            "solar_irradiance": 450,
+            "rainfall": 0.0
+        },
+        "energy_data": [
+            {"month": "Jan", "value": 100},
+            {"month": "Feb", "value": 150},
+            {"month": "Mar", "value": 200},
+            {"month": "Apr", "value": 180},
+            {"month": "May", "value": 220},
+            {"month": "Jun", "value": 190}
+        ],
+        "demand_data": [
+            {"month": "Jan", "value": 80},
+            {"month": "Feb", "value": 120},
+            {"month": "Mar", "value": 180},
+            {"month": "Apr", "value": 160},
+            {"month": "May", "value": 200},
+            {"month": "Jun", "value": 170}
+        ],
+        "system_health": {
+            "mqtt_connected": True,
+            "ai_model_status": "Active",
+            "sensor_status": "Online",
+            "pump_health": "Good"
+        }
+    }
+
+
+def sensor_to_percentage(raw_sensor_reading, container_height):
+    """
+    Convert an inverted (distance-from-top) sensor reading to a fill percentage.
+    Negative readings are the sensor's error value and are shown as empty.
+    """
+    if raw_sensor_reading < 0:
+        return 0
+    actual_level = container_height - raw_sensor_reading
+    return max(0, min(100, (actual_level / container_height) * 100))
+
+
+class StateStore:
+    """
+    Copy-on-write state store keyed by site/pump id.
+
+    Every published snapshot is a fresh dict that is never mutated again, so
+    readers just grab the current reference without taking the lock and can
+    never observe a half-applied update. Writers serialize on a single lock,
+    build the next snapshot from the previous one and swap it in. Fleet-wide
+    aggregates are maintained incrementally on each write, which keeps the
+    fleet summary O(1) regardless of the number of tanks.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sites = {}
+        self._version = 0
+        self._totals = {
+            "pumps_running": 0,
+            "manual_overrides": 0,
+            "water_percentage": 0.0,
+            "solar_power": 0.0,
+        }
+        self._summary = self._build_summary()
+        self._listeners = []
+
+    # --- Reads (lock-free) ---
+
+    def get(self, site_id):
+        """Return the current snapshot for a site, or None. Treat it as read-only."""
+        return self._sites.get(site_id)
+
+    def site_ids(self):
+        return list(self._sites)
+
+    def fleet_summary(self):
+        """Return the precomputed fleet summary snapshot"""
+        return self._summary
+
+    @property
+    def version(self):
+        return self._version
+
+    def __contains__(self, site_id):
+        return site_id in self._sites
+
+    def __len__(self):
+        return len(self._sites)
+
+    # --- Change listeners ---
+
+    def add_listener(self, callback):
+        """
+        Call `callback(site_id, previous, snapshot)` after every write, with the
+        write lock held so listeners see changes in commit order (`previous` is
+        None for a newly registered site). Listeners must be quick and must not
+        write back into the store.
+        """
+        self._listeners.append(callback)
+
+    # --- Writes (serialized) ---
+
+    def register_site(self, site_id, **overrides):
+        """Add a tank to the store if it is not already present"""
+        with self._lock:
+            if site_id in self._sites:
+                return self._sites[site_id]
+            snapshot = default_site_state()
+            snapshot.update(overrides)
+            snapshot["site_id"] = site_id
+            # Copy-on-write of the mapping itself so iteration in readers is never disturbed
+            sites = dict(self._sites)
+            sites[site_id] = snapshot
+            self._apply_totals(None, snapshot)
+            self._sites = sites
+            self._publish()
+            self._notify(site_id, None, snapshot)
+            logger.info(f"📍 Registered site '{site_id}' in state store")
+            return snapshot
+
+    def update(self, site_id, changes):
+        """
+        Apply a dict of changes to a site and publish a new snapshot.
+        Nested dicts in `changes` replace (not merge into) the previous value.
+        """
+        with self._lock:
+            previous = self._sites.get(site_id)
+            if previous is None:
+                raise KeyError(f"Unknown site: {site_id}")
+            snapshot = dict(previous)
+            snapshot.update(changes)
+            snapshot["last_updated"] = datetime.now().isoformat()
+            self._apply_totals(previous, snapshot)
+            self._sites[site_id] = snapshot
+            self._publish()
+            self._notify(site_id, previous, snapshot)
+            return snapshot
+
+    def replicate(self, site_id, snapshot, version):
+        """
+        Install a snapshot exactly as another process published it, at that process's
+        version (used by follower workers mirroring the owner), so ETags and
+        `?since` deltas agree across workers. Apply snapshots in version order.
+        """
+        with self._lock:
+            previous = self._sites.get(site_id)
+            snapshot = dict(snapshot)
+            snapshot["site_id"] = site_id
+            sites = dict(self._sites) if previous is None else self._sites
+            sites[site_id] = snapshot
+            self._apply_totals(previous, snapshot)
+            self._sites = sites
+            self._version = version
+            self._summary = self._build_summary()
+            self._notify(site_id, previous, snapshot)
+            return snapshot
+
+    # --- Internals (called with the lock held) ---
+
+    def _apply_totals(self, previous, current):
+        for snapshot, sign in ((previous, -1), (current, 1)):
+            if snapshot is None:
+                continue
+            self._totals["pumps_running"] += sign * (snapshot["pump_status"] == "Running")
+            self._totals["manual_overrides"] += sign * bool(snapshot["manual_override"])
+            self._totals["water_percentage"] += sign * snapshot["water_percentage"]
+            self._totals["solar_power"] += sign * snapshot["solar_power"]
+
+    def _publish(self):
+        self._version += 1
+        self._summary = self._build_summary()
+
+    def _notify(self, site_id, previous, snapshot):
+        for callback in self._listeners:
+            try:
+                callback(site_id, previous, snapshot)
+            except Exception as e:
+                logger.error(f"State listener error for {site_id}: {e}")
+
+    def _build_summary(self):
+        site_count = len(self._sites)
+        return {
+            "site_count": site_count,
+            "pumps_running": self._totals["pumps_running"],
+            "manual_overrides": self._totals["manual_overrides"],
+            "avg_water_percentage": (
+                round(self._totals["water_percentage"] / site_count, 2) if site_count else 0.0
+            ),
+            "total_solar_power": round(self._totals["solar_power"], 3),
+            "version": self._version,
+            "last_updated": datetime.now().isoformat()
+        }
+
+
+# Create a singleton instance for the app to use
+state_store = StateStore()
@@ -0,0 +1,118 @@
+import json
+import time
+import threading
+from collections import deque
+
+from .state_store import state_store
+from .status_stream import changed_fields
+from .profiler import profiler
+from config import Config
+
+
+class SiteStatus:
+    """Serialized views of one site's latest snapshot, built lazily and at most once per version"""
+
+    __slots__ = ("current", "encoded", "history")
+
+    def __init__(self, history):
+        self.current = (0, None)  # (version, snapshot), swapped as one reference
+        self.encoded = (None, None, {})  # (snapshot, full body, {since: delta body})
+        self.history = deque(maxlen=history)  # (version, changed keys)
+
+
+class StatusCache:
+    """
+    Versioned, serialize-once responses for `/api/status`.
+
+    Every store write gives the site a new version (the store's global
+    version at that write) and records which top-level keys changed. The full
+    JSON body is encoded on the first request after a change and reused for
+    every later request until the next write, and so is each `?since=` delta,
+    so request cost does not grow with the number of polling clients. ETags are
+    strong and include a per-process token, so they never collide across
+    restarts.
+    """
+
+    # Distinct `since` values whose delta body is kept per version (pollers mostly share one)
+    MAX_DELTAS_PER_VERSION = 32
+
+    def __init__(self, store, history=256):
+        self.store = store
+        self.history = history
+        self.boot_id = format(int(time.time()), "x")
+        self._sites = {}
+        self._lock = threading.Lock()
+        self.stats = {"full": 0, "deltas": 0, "not_modified": 0, "serializations": 0}
+        store.add_listener(self.on_change)
+
+    def on_change(self, site_id, previous, snapshot):
+        """State store listener (write lock held): bump the version and log the changed keys"""
+        entry = self._sites.get(site_id)
+        if entry is None:
+            entry = self._sites[site_id] = SiteStatus(self.history)
+        keys = snapshot.keys() if previous is None else changed_fields(previous, snapshot).keys()
+        entry.history.append((self.store.version, frozenset(keys)))
+        entry.current = (self.store.version, snapshot)
+
+    def etag(self, version):
+        return f"{self.boot_id}-{version}"
+
+    def parse_version(self, value):
+        """Accepts a bare version or one of our ETags; None if it is from another process"""
+        token, _, version = value.strip('"').rpartition("-")
+        if token and token != self.boot_id:
+            return None
+        return int(version) if version.isdigit() else None
+
+    def _encoded(self, entry):
+        version, snapshot = entry.current
+        encoded = entry.encoded
+        if encoded[0] is not snapshot:
+            with self._lock:
+                encoded = entry.encoded
+                if encoded[0] is not snapshot:
+                    with profiler.phase("serialization"):
+                        encoded = (snapshot, json.dumps(snapshot, default=str), {})
+                    entry.encoded = encoded
+                    self.stats["serializations"] += 1
+        return version, encoded
+
+    def full(self, site_id):
+        """(version, json body) of the site's current snapshot"""
+        version, (_, body, _) = self._encoded(self._sites[site_id])
+        self.stats["full"] += 1
+        return version, body
+
+    def delta(self, site_id, since):
+        """(version, json body) with only the keys changed after version `since`"""
+        entry = self._sites[site_id]
+        version, (snapshot, _, deltas) = self._encoded(entry)
+        body = deltas.get(since)
+        if body is None:
+            body = self._encode_delta(site_id, entry, snapshot, since, version)
+            if len(deltas) < self.MAX_DELTAS_PER_VERSION:
+                deltas[since] = body
+        self.stats["deltas"] += 1
+        return version, body
+
+    def _encode_delta(self, site_id, entry, snapshot, since, version):
+        history = list(entry.history)
+        # Every change after `since` must still be in the history, otherwise resend everything
+        evicted = len(history) == entry.history.maxlen and history[0][0] > since
+        complete = not evicted and since <= version
+        if complete:
+            keys = set()
+            for changed_at, changed in history:
+                if since < changed_at <= version:
+                    keys |= changed
+            changes = {key: snapshot[key] for key in keys if key in snapshot}
+        else:
+            changes = snapshot
+        self.stats["serializations"] += 1
+        with profiler.phase("serialization"):
+            return json.dumps({"site": site_id, "version": version, "since": since,
+                               "full": not complete, "changes": changes}, default=str)
+
+
+# Create a singleton instance for the app to use
+status_cache = StatusCache(state_store, history=Config.STATUS_DELTA_HISTORY)
@@ -0,0 +1,203 @@
+import json
+import time
+import logging
+import threading
+from collections import deque
+from itertools import islice
+
+from .state_store import state_store
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def changed_fields(previous, snapshot):
+    """Top-level fields of `snapshot` that differ from `previous` (identity is checked first)"""
+    changes = {}
+    for key, value in snapshot.items():
+        old = previous.get(key, _MISSING)
+        if old is not value and old != value:
+            changes[key] = value
+    return changes
+
+
+def sse_frame(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class StatusStream:
+    """
+    Server-Sent Events push of state store changes.
+
+    Every write to the store becomes one `delta` event holding only the fields
+    that changed, serialized once no matter how many clients are connected and
+    kept in a bounded history. Clients block on a condition and cost nothing
+    until something changes; idle connections get a comment heartbeat every
+    `heartbeat_interval` seconds. Event ids are `<stream>-<seq>`, so a browser
+    reconnecting with `Last-Event-ID` replays what it missed, and a client that
+    is too far behind (or saw a previous process) is resynced with full
+    `snapshot` events instead.
+
+    An open stream holds one server thread for as long as it lasts, so at most
+    `max_clients` run at once per process; `connect()` refuses the rest
+    (None) and leaves threads free for ordinary requests.
+    """
+
+    def __init__(self, store, history=1000, heartbeat_interval=15.0, retry_ms=3000, max_clients=None):
+        self.store = store
+        self.heartbeat_interval = heartbeat_interval
+        self.retry_ms = retry_ms
+        self.max_clients = max_clients
+        self.stream_id = str(int(time.time()))
+
+        self._events = deque(maxlen=history)  # (seq, site_id, frame)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._clients_lock = threading.Lock()
+        self.stats = {"events": 0, "clients": 0, "connections": 0, "rejected": 0, "resumed": 0, "resynced": 0}
+
+        store.add_listener(self.on_change)
+
+    # --- Producer (called by the state store with its write lock held) ---
+
+    def on_change(self, site_id, previous, snapshot):
+        if previous is None:
+            changes = snapshot
+        else:
+            changes = changed_fields(previous, snapshot)
+            if not changes:
+                return
+        with self._cond:
+            self._seq += 1
+            frame = sse_frame("delta", {"site": site_id, "changes": changes},
+                              f"{self.stream_id}-{self._seq}")
+            self._events.append((self._seq, site_id, frame))
+            self.stats["events"] += 1
+            self._cond.notify_all()
+
+    # --- Consumers (one generator per connected client) ---
+
+    def connect(self, site_ids=None, last_event_id=None):
+        """
+        A StreamConnection for one client, or None if `max_clients` streams are
+        already open. The slot is held until the connection is closed.
+        """
+        with self._clients_lock:
+            if self.max_clients is not None and self.stats["clients"] >= self.max_clients:
+                self.stats["rejected"] += 1
+                return None
+            self.stats["clients"] += 1
+            self.stats["connections"] += 1
+        return StreamConnection(self, self.stream(site_ids, last_event_id))
+
+    def _release(self):
+        with self._clients_lock:
+            self.stats["clients"] -= 1
+
+    def stream(self, site_ids=None, last_event_id=None):
+        """Yield SSE frames for `site_ids` (None = every site) until the client disconnects"""
+        sites = None if site_ids is None else set(site_ids)
+        yield f"retry: {self.retry_ms}\n\n"
+        cursor = self._resume_cursor(last_event_id)
+        if cursor is None:
+            cursor, frames = self._snapshot(sites)
+            yield from frames
+        else:
+            self.stats["resumed"] += 1
+
+        while True:
+            with self._cond:
+                if self._seq == cursor:
+                    self._cond.wait(self.heartbeat_interval)
+                pending = self._events_after(cursor)
+                latest = self._seq
+            if pending is None:
+                # Fell out of the history window: start over from a fresh snapshot
+                cursor, frames = self._snapshot(sites)
+                yield from frames
+                continue
+            if latest == cursor:
+                yield ": heartbeat\n\n"
+                continue
+            cursor = latest
+            for _, site_id, frame in pending:
+                if sites is None or site_id in sites:
+                    yield frame
+
+    def _events_after(self, cursor):
+        """Buffered events newer than `cursor`, or None if some were already evicted"""
+        if not self._events:
+            return [] if cursor == self._seq else None
+        oldest = self._events[0][0]
+        if cursor + 1 < oldest:
+            return None
+        return list(islice(self._events, cursor + 1 - oldest, None))
+
+    def _resume_cursor(self, last_event_id):
+        stream_id, _, seq = (last_event_id or "").partition("-")
+        if stream_id != self.stream_id or not seq.isdigit():
+            return None
+        cursor = int(seq)
+        with self._cond:
+            if cursor > self._seq or self._events_after(cursor) is None:
+                return None
+        return cursor
+
+    def _snapshot(self, sites):
+        """Full state per site, tagged with a cursor no newer than the snapshots themselves"""
+        self.stats["resynced"] += 1
+        with self._cond:
+            cursor = self._seq
+        event_id = f"{self.stream_id}-{cursor}"
+        frames = []
+        for site_id in self.store.site_ids():
+            if sites is None or site_id in sites:
+                frames.append(sse_frame("snapshot", {"site": site_id, "state": self.store.get(site_id)},
+                                        event_id))
+        return cursor, frames
+
+    def get_stats(self):
+        return {**self.stats, "max_clients": self.max_clients, "sequence": self._seq,
+                "history": len(self._events), "history_capacity": self._events.maxlen}
+
+
+class StreamConnection:
+    """
+    The response body for one stream: iterates its frames and gives the
+    client's slot back on close(), which the WSGI server calls once the
+    response ends, even if it was never iterated.
+    """
+
+    def __init__(self, stream, frames):
+        self._stream = stream
+        self._frames = frames
+        self._closed = False
+
+    def __iter__(self):
+        return self._frames
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._frames.close()
+        finally:
+            self._stream._release()
+
+
+# Create a singleton instance for the app to use
+status_stream = StatusStream(
+    state_store,
+    history=Config.STREAM_HISTORY,
+    heartbeat_interval=Config.STREAM_HEARTBEAT_INTERVAL,
+    retry_ms=Config.STREAM_RETRY_MS,
+    max_clients=Config.STREAM_MAX_CLIENTS or None,
+)
@@ -0,0 +1,297 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import deque
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS telemetry (
+    site_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    water_level REAL,
+    water_percentage REAL,
+    pump_status TEXT,
+    solar_power REAL,
+    solar_voltage REAL,
+    battery_voltage REAL,
+    source TEXT,
+    hybrid_usage REAL
+);
+CREATE INDEX IF NOT EXISTS idx_telemetry_site_ts ON telemetry (site_id, ts);
+
+CREATE TABLE IF NOT EXISTS predictions (
+    site_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    prediction INTEGER,
+    confidence REAL,
+    features TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_site_ts ON predictions (site_id, ts);
+
+CREATE TABLE IF NOT EXISTS pump_actions (
+    site_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    action TEXT NOT NULL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_pump_actions_site_ts ON pump_actions (site_id, ts);
+"""
+
+# Columns added after the first release: (table, column, type), applied to older database files
+MIGRATIONS = [
+    ("telemetry", "hybrid_usage", "REAL"),
+]
+
+INSERTS = {
+    "telemetry": "INSERT INTO telemetry (site_id, ts, water_level, water_percentage, pump_status, solar_power, "
+                 "solar_voltage, battery_voltage, source, hybrid_usage) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    "predictions": "INSERT INTO predictions VALUES (?, ?, ?, ?, ?)",
+    "pump_actions": "INSERT INTO pump_actions VALUES (?, ?, ?, ?)",
+}
+
+
+def sqlite_path_from_url(database_url):
+    """'sqlite:///relative.db' -> 'relative.db', 'sqlite:////abs/path.db' -> '/abs/path.db'"""
+    prefix = "sqlite:///"
+    if not database_url.startswith(prefix):
+        raise ValueError(f"Only sqlite DATABASE_URLs are supported, got: {database_url}")
+    return database_url[len(prefix):] or ":memory:"
+
+
+class StorageService:
+    """
+    Batched time-series writer for telemetry, AI predictions and pump actions.
+
+    Request and ingestion threads only append rows to an in-memory buffer. A
+    single writer thread owns the SQLite connection and group-commits whatever
+    has accumulated, either when `batch_size` rows are pending or every
+    `flush_interval` seconds, in one transaction per flush. The database runs in
+    WAL mode so readers never block the writer. The same thread periodically
+    deletes rows older than `retention_days` and returns freed pages to the OS.
+
+    Extensions (see `add_extension`) keep derived tables in step with the raw
+    rows: they write inside the same flush transaction, on the writer thread.
+    """
+
+    def __init__(self, database_url, batch_size=500, flush_interval=1.0, max_pending=100000,
+                 retention_days=90, compaction_interval=3600):
+        self.path = sqlite_path_from_url(database_url)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.retention_days = retention_days
+        self.compaction_interval = compaction_interval
+
+        self.ready = False
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._last_compaction = time.time()
+        self._readers = threading.local()
+        self._extensions = []
+
+        self.stats = {
+            "written": 0,
+            "dropped": 0,
+            "flushes": 0,
+            "errors": 0,
+            "compactions": 0,
+            "rows_expired": 0,
+        }
+
+    def connect(self):
+        """Open a connection with the pragmas every connection to the store should use"""
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        # auto_vacuum only takes effect on a fresh file, before WAL or any table is created
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_schema(self, conn):
+        conn.executescript(SCHEMA)
+        for table, column, kind in MIGRATIONS:
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+                logger.info(f"💾 Added column {table}.{column}")
+        conn.commit()
+        for extension in self._extensions:
+            extension.init_schema(conn)
+
+    def add_extension(self, extension):
+        """
+        Register an object maintaining derived tables (call before start()):
+        - init_schema(conn): once, on the writer thread, after the base schema
+        - on_flush(conn, grouped): inside each flush transaction, {table: [rows]}
+        - on_commit() / on_rollback(): after that transaction
+        - on_compact(conn, cutoff): inside the retention delete transaction
+        """
+        if extension not in self._extensions:
+            self._extensions.append(extension)
+
+    def read_connection(self):
+        """This thread's read-only connection (WAL: reads never block the writer, nor it them)"""
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA query_only=ON")
+            self._readers.conn = conn
+        return conn
+
+    # --- Producers (any thread, never touch SQLite) ---
+
+    def record_telemetry(self, site_id, state, source="telemetry", ts=None):
+        self._enqueue("telemetry", (
+            site_id,
+            ts if ts is not None else time.time(),
+            state.get("water_level"),
+            state.get("water_percentage"),
+            state.get("pump_status"),
+            state.get("solar_power"),
+            state.get("solar_voltage"),
+            state.get("battery_voltage"),
+            source,
+            state.get("hybrid_usage"),
+        ))
+
+    def record_prediction(self, site_id, prediction, confidence, features=None, ts=None):
+        self._enqueue("predictions", (
+            site_id,
+            ts if ts is not None else time.time(),
+            int(prediction),
+            float(confidence),
+            json.dumps(features) if features is not None else None,
+        ))
+
+    def record_pump_action(self, site_id, action, source="manual", ts=None):
+        self._enqueue("pump_actions", (
+            site_id,
+            ts if ts is not None else time.time(),
+            action,
+            source,
+        ))
+
+    def _enqueue(self, table, row):
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                self._pending.popleft()
+                self.stats["dropped"] += 1
+            self._pending.append((table, row))
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    # --- Writer thread ---
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"💾 Storage writer started on '{self.path}'")
+
+    def stop(self, timeout=5.0):
+        """Stop the writer thread after a final flush"""
+        self._running = False
+        with self._cond:
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        conn = self.connect()
+        self._init_schema(conn)
+        self.ready = True
+        try:
+            while self._running:
+                with self._cond:
+                    if len(self._pending) < self.batch_size:
+                        self._cond.wait(self.flush_interval)
+                    batch = self._take_all()
+                if batch:
+                    self._flush(conn, batch)
+                if self.retention_days and time.time() - self._last_compaction >= self.compaction_interval:
+                    self.compact(conn)
+            # Final flush on shutdown
+            with self._cond:
+                batch = self._take_all()
+            if batch:
+                self._flush(conn, batch)
+        finally:
+            self.ready = False
+            conn.close()
+
+    def _take_all(self):
+        batch = list(self._pending)
+        self._pending.clear()
+        return batch
+
+    def _flush(self, conn, batch):
+        grouped = {}
+        for table, row in batch:
+            grouped.setdefault(table, []).append(row)
+        try:
+            with conn:  # one transaction per flush (group commit)
+                for table, rows in grouped.items():
+                    conn.executemany(INSERTS[table], rows)
+                for extension in self._extensions:
+                    extension.on_flush(conn, grouped)
+            self.stats["written"] += len(batch)
+            self.stats["flushes"] += 1
+        except Exception as e:
+            # Rolled back: the batch is lost, but the writer keeps serving later ones
+            self._notify_extensions("on_rollback")
+            self.stats["errors"] += 1
+            self.stats["dropped"] += len(batch)
+            logger.error(f"❌ Storage flush of {len(batch)} rows failed: {e}")
+            return
+        self._notify_extensions("on_commit")
+
+    def _notify_extensions(self, hook):
+        for extension in self._extensions:
+            try:
+                getattr(extension, hook)()
+            except Exception as e:
+                logger.error(f"❌ Storage extension {type(extension).__name__}.{hook} failed: {e}")
+
+    def compact(self, conn):
+        """Delete rows past the retention window and release the freed pages"""
+        self._last_compaction = time.time()
+        cutoff = self._last_compaction - self.retention_days * 86400
+        try:
+            expired = 0
+            with conn:
+                for table in INSERTS:
+                    expired += conn.execute(f"DELETE FROM {table} WHERE ts < ?", (cutoff,)).rowcount
+                for extension in self._extensions:
+                    expired += extension.on_compact(conn, cutoff)
+            # executescript steps the pragma to completion; execute() would free a single page
+            conn.executescript("PRAGMA incremental_vacuum;")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.stats["compactions"] += 1
+            self.stats["rows_expired"] += expired
+            if expired:
+                logger.info(f"🧹 Storage compaction removed {expired} rows older than {self.retention_days} days")
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"❌ Storage compaction failed: {e}")
+
+    def get_stats(self):
+        return {**self.stats, "pending": len(self._pending), "path": self.path}
+
+
+# Create a singleton instance for the app to use
+storage_service = StorageService(
+    Config.DATABASE_URL,
+    batch_size=Config.STORAGE_BATCH_SIZE,
+    flush_interval=Config.STORAGE_FLUSH_INTERVAL,
+    retention_days=Config.STORAGE_RETENTION_DAYS,
+    compaction_interval=Config.STORAGE_COMPACTION_INTERVAL,
+)
@@ -0,0 +1,246 @@
+import json
+import math
+import time
+import logging
+import threading
+from collections import deque
+
+from .state_store import state_store, sensor_to_percentage
+from .storage_service import storage_service
+from .online_learning import online_learner
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+PUMP_STATUS_MAP = {"ON": "Running", "OFF": "OFF"}
+
+
+def decode_telemetry(payload):
+    """
+    Decode and validate one `mine/telemetry` payload as sent by the ESP32 firmware:
+    {"ts", "water_level_cm", "solar_voltage", "battery_voltage", "pump_status", "manual_mode"}
+    Returns a dict of normalized fields, or raises ValueError.
+    """
+    data = json.loads(payload)
+    if not isinstance(data, dict):
+        raise ValueError("payload is not a JSON object")
+
+    try:
+        water_level = float(data["water_level_cm"])
+        solar_voltage = float(data.get("solar_voltage", 0.0))
+        battery_voltage = float(data.get("battery_voltage", 0.0))
+    except (KeyError, TypeError, OverflowError) as e:
+        raise ValueError(f"bad numeric field: {e}")
+    if not all(math.isfinite(v) for v in (water_level, solar_voltage, battery_voltage)):
+        raise ValueError("non-finite numeric field")
+
+    # Only strings may be used as keys below; a list or object here would raise TypeError
+    raw_status = data.get("pump_status")
+    pump_status = PUMP_STATUS_MAP.get(raw_status) if isinstance(raw_status, str) else None
+    if pump_status is None:
+        raise ValueError(f"bad pump_status: {raw_status!r}")
+    site = data.get("site")
+    if site is not None and not isinstance(site, str):
+        raise ValueError(f"bad site: {site!r}")
+
+    return {
+        "site": site,
+        "water_level": water_level,
+        "solar_voltage": solar_voltage,
+        "battery_voltage": battery_voltage,
+        "pump_status": pump_status,
+        "manual_mode": str(data.get("manual_mode", "AUTO")),
+    }
+
+
+class TelemetryIngestor:
+    """
+    Subscriber side of the `mine/telemetry` pipeline.
+
+    The paho network thread only appends raw (topic, payload) pairs to a bounded
+    buffer; a worker thread drains it in batches, decodes and validates each
+    payload, keeps the latest reading per site and applies one state update per
+    site per batch. When the buffer is full the oldest message is dropped (the
+    newest reading is the one worth keeping) and counted.
+    """
+
+    def __init__(self, store, topic, queue_size=20000, batch_size=500, flush_interval=0.05,
+                 default_site_id=None, container_height=6.0, storage=None, learner=None):
+        self.store = store
+        self.storage = storage
+        self.learner = learner
+        self.topic = topic
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.default_site_id = default_site_id
+        self.container_height = container_height
+
+        self._listeners = []
+        self._buffer = deque()
+        self._queue_size = queue_size
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        self.stats = {
+            "received": 0,
+            "processed": 0,
+            "invalid": 0,
+            "dropped": 0,
+            "unknown_site": 0,
+            "batches": 0,
+            "errors": 0,
+        }
+
+    # --- paho network thread ---
+
+    def on_message(self, client, userdata, msg):
+        """paho callback: enqueue only, never decode here"""
+        with self._cond:
+            if len(self._buffer) >= self._queue_size:
+                self._buffer.popleft()
+                self.stats["dropped"] += 1
+            self._buffer.append((msg.topic, msg.payload))
+            self.stats["received"] += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+
+    # --- worker thread ---
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="telemetry-ingest", daemon=True)
+        self._thread.start()
+        logger.info(f"📥 Telemetry ingestion started on '{self.topic}'")
+
+    def attach(self, mqtt):
+        """Route `<topic>` and `<topic>/<site_id>` messages from the MQTT service to this ingestor"""
+        mqtt.subscribe(self.topic, self.on_message)
+        mqtt.subscribe(self.topic + "/+", self.on_message)
+
+    def add_listener(self, callback):
+        """
+        Call `callback(site_id, reading, received_at)` on the worker thread with the
+        newest decoded reading per site in each batch, after it is applied to the state.
+        """
+        self._listeners.append(callback)
+
+    def stop(self, timeout=2.0):
+        self._running = False
+        with self._cond:
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while self._running:
+            with self._cond:
+                if len(self._buffer) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                batch = self._take_batch()
+            if batch:
+                try:
+                    self.process_batch(batch)
+                except Exception as e:
+                    # One bad batch must not end ingestion
+                    self.stats["errors"] += 1
+                    logger.error(f"❌ Telemetry batch of {len(batch)} messages failed: {e}")
+
+    def _take_batch(self):
+        count = min(len(self._buffer), self.batch_size)
+        return [self._buffer.popleft() for _ in range(count)]
+
+    def process_batch(self, batch):
+        """Decode a list of (topic, payload) pairs and apply the newest reading per site"""
+        latest = {}
+        invalid = 0
+        for topic, payload in batch:
+            try:
+                reading = decode_telemetry(payload)
+            except ValueError as e:  # json.JSONDecodeError is a ValueError too
+                invalid += 1
+                logger.debug(f"Dropping invalid telemetry on {topic}: {e}")
+                continue
+            except Exception as e:
+                # Anything decode did not anticipate costs this message only, not the batch
+                invalid += 1
+                self.stats["errors"] += 1
+                logger.warning(f"⚠️ Dropping undecodable telemetry on {topic}: {e!r}")
+                continue
+            site_id = self._site_for(topic, reading)
+            latest[site_id] = reading
+            if self.storage is not None:
+                # Every valid reading is persisted, only the newest one per site hits the live state
+                self.storage.record_telemetry(site_id, {
+                    **reading,
+                    "water_percentage": sensor_to_percentage(reading["water_level"], self.container_height),
+                })
+
+        now = time.time()
+        unknown = 0
+        for site_id, reading in latest.items():
+            if site_id not in self.store:
+                unknown += 1
+                continue
+            try:
+                state = self.store.update(site_id, self._state_changes(self.store.get(site_id), reading, now))
+                if self.learner is not None:
+                    # The reported pump state labels the reading; MANUAL mode means an operator chose it
+                    self.learner.observe_state(state, reading["pump_status"],
+                                               override=reading["manual_mode"] != "AUTO")
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"❌ Applying telemetry for {site_id} failed: {e}")
+                continue
+            for callback in self._listeners:
+                try:
+                    callback(site_id, reading, now)
+                except Exception as e:
+                    logger.error(f"Telemetry listener error for {site_id}: {e}")
+
+        self.stats["invalid"] += invalid
+        self.stats["unknown_site"] += unknown
+        self.stats["processed"] += len(batch) - invalid
+        self.stats["batches"] += 1
+
+    def _site_for(self, topic, reading):
+        # `mine/telemetry/<site_id>` for fleets, plain `mine/telemetry` for the single prototype tank
+        if reading["site"]:
+            return reading["site"]
+        suffix = topic[len(self.topic) + 1:] if topic.startswith(self.topic + "/") else ""
+        return suffix or self.default_site_id
+
+    def _state_changes(self, state, reading, now):
+        sensor_ok = reading["water_level"] >= 0
+        return {
+            "water_level": reading["water_level"],
+            "water_percentage": sensor_to_percentage(reading["water_level"], self.container_height),
+            "pump_status": reading["pump_status"],
+            "solar_voltage": reading["solar_voltage"],
+            "battery_voltage": reading["battery_voltage"],
+            "manual_mode": reading["manual_mode"],
+            "system_health": {
+                **state["system_health"],
+                "sensor_status": "Online" if sensor_ok else "Error",
+            },
+            "last_telemetry": now,
+        }
+
+    def get_stats(self):
+        return {**self.stats, "queue_depth": len(self._buffer), "queue_capacity": self._queue_size}
+
+
+# Create a singleton instance for the app to use
+telemetry_ingestor = TelemetryIngestor(
+    state_store,
+    Config.MQTT_TELEMETRY_TOPIC,
+    queue_size=Config.TELEMETRY_QUEUE_SIZE,
+    batch_size=Config.TELEMETRY_BATCH_SIZE,
+    flush_interval=Config.TELEMETRY_FLUSH_INTERVAL,
+    default_site_id=Config.DEFAULT_SITE_ID,
+    container_height=Config.CONTAINER_HEIGHT,
+    storage=storage_service,
+    learner=online_learner,
+)
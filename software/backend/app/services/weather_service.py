@@ -0,0 +1,240 @@
+import time
+import random
+import logging
+import threading
+from datetime import datetime
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import WEATHER_FETCH_LATENCY
+from ..models.solar_profile import solar_profile, SolarProfileUnavailable
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures. While open no
+    calls are allowed until the reset timeout passes, then a single trial call
+    is let through (half-open). Each failed trial doubles the timeout up to
+    `max_reset_timeout`; a success closes the breaker and resets it.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0, max_reset_timeout=600.0):
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.retry_in() == 0 else "open"
+
+    def retry_in(self):
+        """Seconds until the next call is allowed (0 if allowed now)"""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self):
+        return self.retry_in() == 0
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.reset_timeout = self.base_reset_timeout
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None:
+            # Failed half-open trial: back off further
+            self.reset_timeout = min(self.reset_timeout * 2, self.max_reset_timeout)
+            self.opened_at = time.monotonic()
+        elif self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            logger.warning(f"⚡ Weather circuit opened after {self.failures} failures")
+
+
+_profile_warned = False
+
+
+def synthetic_weather():
+    """Synthetic stand-in used before the first live reading or once the last one is too old"""
+    base_time = time.time()
+    cloud_cover = float(np.clip(0.3 + 0.2 * np.sin(base_time / 5400) + random.uniform(-0.1, 0.1), 0, 1))
+    try:
+        # Irradiance follows the measured daily profile for this date and cloud cover
+        irradiance = solar_profile().irradiance(base_time, Config.SITE_LATITUDE, Config.SITE_LONGITUDE, cloud_cover)
+    except SolarProfileUnavailable as e:
+        global _profile_warned
+        if not _profile_warned:
+            _profile_warned = True
+            logger.warning(f"⚠️ {e}; synthetic weather falls back to the analytic irradiance curve")
+        irradiance = max(0, 400 + 300 * np.sin(base_time / 1800) + random.uniform(-50, 50))
+    return {
+        "temperature": 28 + 5 * np.sin(base_time / 3600) + random.uniform(-2, 2),
+        "humidity": 65 + 15 * np.sin(base_time / 7200) + random.uniform(-5, 5),
+        "solar_irradiance": round(float(irradiance), 1),
+        "cloud_cover": round(cloud_cover, 2),
+        "rainfall": max(0, 2 * np.sin(base_time / 5400) + random.uniform(-1, 2))
+    }
+
+
+class WeatherProvider:
+    """
+    Open-Meteo current-weather provider that never blocks its callers.
+
+    A background thread refreshes the reading every `refresh_interval` seconds
+    over a pooled HTTP session; `current()` just returns the last published
+    dict (same object until the next refresh). The last good reading is served
+    for up to `ttl` seconds; past that, or before any live reading, a synthetic
+    value is published instead. Failures feed a circuit breaker so a dead
+    uplink is probed with exponential backoff rather than every cycle.
+    """
+
+    def __init__(self, latitude, longitude, base_url, refresh_interval=300.0, ttl=3600.0,
+                 timeout=10.0, session=None, breaker=None):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.base_url = base_url
+        self.refresh_interval = refresh_interval
+        self.ttl = ttl
+        self.timeout = timeout
+
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+            session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session = session
+        self.breaker = breaker or CircuitBreaker()
+
+        self._last_good_at = None
+        self._current = None  # seeded with synthetic weather on first read or start(), not at import
+        self._current_at = None  # no age until something is published
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.stats = {"fetches": 0, "failures": 0, "skipped_open_circuit": 0, "last_error": None,
+                      "last_fetch_ms": None}
+
+    def _publish(self, values, source):
+        self._current_at = time.monotonic()
+        self._current = {**values, "source": source, "updated_at": datetime.now().isoformat()}
+        return self._current
+
+    # --- Readers ---
+
+    def current(self):
+        """Latest published weather dict; never blocks. Treat it as read-only."""
+        current = self._current
+        if current is None:
+            current = self._publish(synthetic_weather(), "synthetic")
+        return current
+
+    def data_age(self):
+        """Seconds since the reading being served was published, or None before the first one"""
+        if self._current_at is None:
+            return None
+        return time.monotonic() - self._current_at
+
+    def get_status(self):
+        last_good_age = time.monotonic() - self._last_good_at if self._last_good_at else None
+        current, data_age = self._current, self.data_age()
+        return {
+            **self.stats,
+            "circuit": self.breaker.state,
+            "retry_in_seconds": round(self.breaker.retry_in(), 1),
+            "source": current["source"] if current is not None else None,
+            "data_age_seconds": round(data_age, 1) if data_age is not None else None,
+            "last_good_age_seconds": round(last_good_age, 1) if last_good_age is not None else None,
+        }
+
+    # --- Refresh loop ---
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.current()  # seed before the first fetch completes
+        self._thread = threading.Thread(target=self._run, name="weather-refresh", daemon=True)
+        self._thread.start()
+        logger.info(f"🌦️ Weather provider refreshing every {self.refresh_interval:.0f}s from {self.base_url}")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            wait = self.refresh_interval
+            if self.breaker.state != "closed":
+                wait = min(wait, max(self.breaker.retry_in(), 1.0))
+            self._stop.wait(wait)
+
+    def refresh(self):
+        """One refresh attempt; returns True if a live reading was published"""
+        if not self.breaker.allow():
+            self.stats["skipped_open_circuit"] += 1
+            self._expire_stale()
+            return False
+
+        self.stats["fetches"] += 1
+        start = time.perf_counter()
+        try:
+            values = self._fetch()
+        except Exception as e:
+            self.stats["failures"] += 1
+            self.stats["last_error"] = str(e)
+            self.breaker.record_failure()
+            WEATHER_FETCH_LATENCY.labels("failure").observe(time.perf_counter() - start)
+            logger.error(f"Weather API error: {e}")
+            self._expire_stale()
+            return False
+        finally:
+            self.stats["last_fetch_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        WEATHER_FETCH_LATENCY.labels("success").observe(time.perf_counter() - start)
+
+        self.breaker.record_success()
+        self._last_good_at = time.monotonic()
+        self._publish(values, "live")
+        return True
+
+    def _fetch(self):
+        params = {
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "current": "temperature_2m,relative_humidity_2m,precipitation,shortwave_radiation,cloud_cover"
+        }
+        response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        current = response.json().get("current", {})
+        return {
+            "temperature": current.get("temperature_2m", 28.5),
+            "humidity": current.get("relative_humidity_2m", 65),
+            "solar_irradiance": current.get("shortwave_radiation", 450),
+            "rainfall": current.get("precipitation", 0.0),
+            "cloud_cover": (current.get("cloud_cover") or 0) / 100,  # % -> fraction, as in the simulator
+        }
+
+    def _expire_stale(self):
+        """Keep serving the last good value within its TTL, otherwise fall back to synthetic"""
+        if self._last_good_at is not None and time.monotonic() - self._last_good_at < self.ttl:
+            return
+        self._publish(synthetic_weather(), "synthetic")
+
+
+# Create a singleton instance for the app to use
+weather_provider = WeatherProvider(
+    Config.SITE_LATITUDE,
+    Config.SITE_LONGITUDE,
+    Config.WEATHER_API_URL,
+    refresh_interval=Config.WEATHER_REFRESH_INTERVAL,
+    ttl=Config.WEATHER_TTL,
+    timeout=Config.API_TIMEOUT,
+)
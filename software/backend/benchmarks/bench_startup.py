@@ -0,0 +1,68 @@
+"""
+Startup time: import + create_app, then time until /api/ready reports every subsystem ready.
+
+    python benchmarks/bench_startup.py [--runs 3] [--timeout 60]
+
+Each run is a fresh interpreter so import costs are measured cold.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+heavy = {name: name in sys.modules for name in ("sklearn", "pandas")}
+client = app.test_client()
+deadline = created + TIMEOUT
+report = client.get("/api/ready").get_json()
+while not report["ready"] and time.perf_counter() < deadline:
+    time.sleep(0.02)
+    report = client.get("/api/ready").get_json()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "ready_ms": (time.perf_counter() - start) * 1000 if report["ready"] else None,
+    "heavy_modules_at_create": heavy,
+    "subsystems": {name: info["ready_ms"] for name, info in report["subsystems"].items()},
+}))
+"""
+
+
+def run_once(timeout):
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD.replace("TIMEOUT", str(float(timeout)))],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=timeout + 30,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "child failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args(argv)
+
+    for run in range(1, args.runs + 1):
+        r = run_once(args.timeout)
+        ready = f"{r['ready_ms']:8.1f} ms" if r["ready_ms"] is not None else "  not ready"
+        print(f"run {run}: import {r['import_ms']:7.1f} ms | create_app {r['create_app_ms']:7.1f} ms "
+              f"| all ready {ready}")
+        print(f"       subsystem ready (ms after start_all): {r['subsystems']}")
+        print(f"       loaded when create_app returned (model warm-up runs in the background): "
+              f"{r['heavy_modules_at_create']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
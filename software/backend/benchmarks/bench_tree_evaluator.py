@@ -0,0 +1,93 @@
+"""
+Parity check and latency comparison: sklearn RandomForestClassifier vs FlatForest.
+
+    python benchmarks/bench_tree_evaluator.py
+
+Exits non-zero if the flat evaluator disagrees with sklearn on any row.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+# Add backend directory to Python path so `app` is importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.tree_evaluator import FlatForest, export_forest  # noqa: E402
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FEATURE_SCALE = np.array([6.0, 20.0, 800.0, 24.0, 100.0])
+
+
+def service_forest():
+    """Same configuration AIModelService trains from the bundled CSV"""
+    df = pd.read_csv(os.path.join(BACKEND_DIR, "pump_predictions (3).csv"))
+    features = ["water_level", "rain", "solar_historical", "time_of_day", "diesel_cost"]
+    model = RandomForestClassifier(n_estimators=100, random_state=42, max_depth=10)
+    return model.fit(df[features].to_numpy(), df["pump_state"].to_numpy())
+
+
+def training_forest(rng):
+    """Same configuration SolarDewateringModel.train_model uses, on synthetic multi-class data"""
+    X = rng.random((4000, 5)) * FEATURE_SCALE
+    y = np.where(X[:, 0] < 0.8, 0, np.where(X[:, 0] < 1.3, 1, 2)) + 3 * (X[:, 2] >= 100)
+    model = RandomForestClassifier(n_estimators=200, max_depth=10, min_samples_split=5,
+                                   min_samples_leaf=2, random_state=42)
+    return model.fit(X, y)
+
+
+def time_per_call(fn, arg, repeats):
+    fn(arg)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(arg)
+    return (time.perf_counter() - start) / repeats
+
+
+def compare(name, model, rng, tmp_path):
+    export_forest(model, tmp_path)
+    flat = FlatForest.load(tmp_path)
+
+    X = rng.random((5000, 5)) * FEATURE_SCALE
+    sk_proba = model.predict_proba(X)
+    flat_proba = flat.predict_proba(X)
+    max_diff = float(np.abs(sk_proba - flat_proba).max())
+    same_class = bool((model.predict(X) == flat.predict(X)).all())
+    single_ok = all(
+        flat.predict_one(row)[0] == model.predict(row[np.newaxis, :])[0] for row in X[:200]
+    )
+
+    row = X[0]
+    sk_single = time_per_call(lambda r: model.predict_proba(r[np.newaxis, :]), row, 50)
+    flat_single = time_per_call(flat.predict_one, row, 2000)
+    batch = X[:256]
+    sk_batch = time_per_call(model.predict_proba, batch, 20)
+    flat_batch = time_per_call(flat.predict_proba, batch, 20)
+
+    print(f"\n{name}: {flat.n_estimators} trees, {len(flat.feature)} nodes, max depth {flat.max_depth}")
+    print(f"  parity: max |Δproba| = {max_diff:.2e}, classes equal = {same_class and single_ok}")
+    print(f"  single row : sklearn {sk_single * 1e6:10.1f} µs | flat {flat_single * 1e6:8.1f} µs "
+          f"| {sk_single / flat_single:6.1f}x")
+    print(f"  batch x256 : sklearn {sk_batch * 1e3:10.2f} ms | flat {flat_batch * 1e3:8.2f} ms "
+          f"| {sk_batch / flat_batch:6.1f}x")
+    return max_diff < 1e-9 and same_class and single_ok
+
+
+def main():
+    rng = np.random.default_rng(0)
+    tmp_path = os.path.join(BACKEND_DIR, "benchmarks", "_forest_parity.npz")
+    try:
+        ok = compare("AIModelService forest", service_forest(), rng, tmp_path)
+        ok = compare("SolarDewateringModel forest", training_forest(rng), rng, tmp_path) and ok
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    print("\nPARITY OK" if ok else "\nPARITY FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
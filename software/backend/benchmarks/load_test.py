@@ -0,0 +1,183 @@
+"""
+Load test: requests per second against serve.py as the worker count grows.
+
+    python benchmarks/load_test.py [--workers 1,2,4] [--duration 10] [--clients 16] [--path /api/status]
+
+For each worker count a fresh server is started on a free port (its own
+temporary database and cluster directory), traffic is driven by --clients
+keep-alive connections spread over several client processes (so the load
+generator is not limited to one core by the GIL), and throughput, latency
+percentiles and the workers that answered are reported. The clients also
+check that every worker serves the same ETag for the same state version.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers, threads, port, workdir, server):
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'load.db')}",
+        "CLUSTER_DIR": os.path.join(workdir, "cluster"),
+        "CLUSTER_OWNER_PORT": str(free_port()),
+        "WEATHER_REFRESH_INTERVAL": "3600",
+    })
+    log = open(os.path.join(workdir, "server.log"), "w")
+    process = subprocess.Popen(
+        [sys.executable, "serve.py", "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+         "--threads", str(threads), "--server", server],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    return process, log
+
+
+def wait_ready(port, workers, timeout):
+    """Until /api/ready says ready on as many distinct workers as we can reach"""
+    deadline = time.time() + timeout
+    ready = set()
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/api/ready")
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            if response.status == 200:
+                ready.add(response.getheader("X-Served-By"))
+                if len(ready) >= workers:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.1)
+    return bool(ready)
+
+
+def client_worker(port, path, connections, duration, queue):
+    """One client process: round-robin over keep-alive connections until the deadline"""
+    conns = [http.client.HTTPConnection("127.0.0.1", port, timeout=10) for _ in range(connections)]
+    latencies, errors, served_by, etags = [], 0, {}, {}
+    deadline = time.perf_counter() + duration
+    i = 0
+    while time.perf_counter() < deadline:
+        conn = conns[i % connections]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            continue
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            errors += 1
+        worker = response.getheader("X-Served-By") or "-"
+        served_by[worker] = served_by.get(worker, 0) + 1
+        version, etag = response.getheader("X-State-Version"), response.getheader("ETag")
+        if version is not None:
+            etags.setdefault(version, set()).add(etag)
+    for conn in conns:
+        conn.close()
+    queue.put((latencies, errors, served_by, {v: sorted(e) for v, e in etags.items()}))
+
+
+def run_load(port, path, clients, processes, duration):
+    queue = multiprocessing.Queue()
+    per_process = [clients // processes + (i < clients % processes) for i in range(processes)]
+    procs = [multiprocessing.Process(target=client_worker, args=(port, path, n, duration, queue))
+             for n in per_process if n]
+    for p in procs:
+        p.start()
+    results = [queue.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    latencies = np.concatenate([np.asarray(r[0]) for r in results]) if results else np.empty(0)
+    served_by, etags = {}, {}
+    for _, _, served, tags in results:
+        for worker, count in served.items():
+            served_by[worker] = served_by.get(worker, 0) + count
+        for version, tag_list in tags.items():
+            etags.setdefault(version, set()).update(tag_list)
+    return {
+        "requests": int(latencies.size),
+        "errors": sum(r[1] for r in results),
+        "req_per_s": round(latencies.size / duration, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3) if latencies.size else None,
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3) if latencies.size else None,
+        "served_by": served_by,
+        "inconsistent_etags": sum(len(tags) > 1 for tags in etags.values()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Requests per second as serve.py workers scale")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--threads", type=int, default=8, help="threads per worker")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per worker count")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent keep-alive connections")
+    parser.add_argument("--client-processes", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument("--path", default="/api/status")
+    parser.add_argument("--server", choices=("auto", "gunicorn", "prefork"), default="auto")
+    parser.add_argument("--ready-timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    rows = []
+    print(f"GET {args.path}: {args.clients} connections from {args.client_processes} client process(es), "
+          f"{args.duration:.0f}s per run, {os.cpu_count()} CPU(s)")
+    for workers in (int(w) for w in args.workers.split(",")):
+        workdir = tempfile.mkdtemp(prefix=f"load-{workers}w-")
+        port = free_port()
+        process, log = start_server(workers, args.threads, port, workdir, args.server)
+        try:
+            if not wait_ready(port, workers, args.ready_timeout):
+                print(f"{workers} worker(s): server not ready, see {log.name}")
+                continue
+            result = run_load(port, args.path, args.clients, args.client_processes, args.duration)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            log.close()
+        result["workers"] = workers
+        rows.append(result)
+        print(f"{workers:>3} worker(s): {result['req_per_s']:>9} req/s | p50 {result['p50_ms']:>8} ms "
+              f"| p99 {result['p99_ms']:>8} ms | errors {result['errors']} "
+              f"| workers answering {len(result['served_by'])} "
+              f"| versions with differing ETags {result['inconsistent_etags']}")
+
+    if rows:
+        base = rows[0]["req_per_s"] or 1
+        print("\nScaling vs first run: " + ", ".join(
+            f"{row['workers']}w x{row['req_per_s'] / base:.2f}" for row in rows))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
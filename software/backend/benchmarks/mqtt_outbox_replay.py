@@ -0,0 +1,283 @@
+"""
+Store-and-forward check for the MQTT outbox against a local broker stand-in.
+
+    python benchmarks/mqtt_outbox_replay.py [--messages 20000] [--topics 50] [--memory 1000]
+
+A minimal MQTT 3.1.1 broker (CONNECT, PUBLISH, PUBACK, SUBSCRIBE, PING,
+DISCONNECT; delivery to subscribers at QoS 0, no retained messages or
+persistence) runs in-process on a free port and records every PUBLISH it
+receives. The real paho client is pointed at
+it while it is down, so everything published is queued (and spilled to disk
+beyond --memory). Then the broker is started and the script reports how long
+the replay took and how long messages waited in the queue, and checks that:
+
+- every topic arrived, carrying its latest payload (superseded ones coalesced);
+- non-coalesced messages arrived, in publish order, with none missing;
+- after a second outage, messages queued during it are again replayed
+  in order with none lost.
+"""
+import argparse
+import json
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def topic_matches(pattern, topic):
+    pattern_parts, topic_parts = pattern.split("/"), topic.split("/")
+    for i, part in enumerate(pattern_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+def encode_length(n):
+    out = bytearray()
+    while True:
+        byte, n = n & 0x7F, n >> 7
+        out.append(byte | (0x80 if n else 0))
+        if not n:
+            return bytes(out)
+
+
+class BrokerStandIn:
+    """Just enough of an MQTT 3.1.1 broker to accept clients, log what they publish and route it"""
+
+    def __init__(self, port):
+        self.port = port
+        self.received = []  # (topic, payload, arrival time)
+        self._server = None
+        self._clients = []
+        self._subscriptions = {}  # conn -> [topic filter]
+        self._send_locks = {}     # conn -> lock, so routed packets and acks never interleave
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._server = socket.socket()
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(("127.0.0.1", self.port))
+        self._server.listen()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def stop(self):
+        """Drop the listener and every connection, like a broker going away"""
+        try:
+            self._server.shutdown(socket.SHUT_RDWR)  # wakes the accept thread so the port is freed
+        except OSError:
+            pass
+        self._server.close()
+        with self._lock:
+            for conn in self._clients:
+                try:
+                    conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                conn.close()
+            self._clients.clear()
+
+    def _accept(self):
+        server = self._server
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            with self._lock:
+                self._clients.append(conn)
+                self._send_locks[conn] = threading.Lock()
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    @staticmethod
+    def _read_exact(conn, n):
+        data = b""
+        while len(data) < n:
+            chunk = conn.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError
+            data += chunk
+        return data
+
+    def _read_packet(self, conn):
+        header = self._read_exact(conn, 1)[0]
+        length, shift = 0, 0
+        while True:
+            byte = self._read_exact(conn, 1)[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return header, self._read_exact(conn, length)
+
+    def _serve(self, conn):
+        try:
+            while True:
+                header, body = self._read_packet(conn)
+                kind = header >> 4
+                if kind == 1:    # CONNECT -> CONNACK
+                    self._send(conn, b"\x20\x02\x00\x00")
+                elif kind == 3:  # PUBLISH
+                    qos = (header >> 1) & 3
+                    topic_len = struct.unpack("!H", body[:2])[0]
+                    topic = body[2:2 + topic_len].decode()
+                    offset = 2 + topic_len
+                    if qos:
+                        packet_id = body[offset:offset + 2]
+                        offset += 2
+                        self._send(conn, b"\x40\x02" + packet_id)  # PUBACK
+                    self.received.append((topic, body[offset:], time.time()))
+                    self._route(topic, body[offset:])
+                elif kind == 8:  # SUBSCRIBE -> SUBACK (granted QoS 0 for each filter)
+                    filters, offset = [], 2
+                    while offset < len(body):
+                        length = struct.unpack("!H", body[offset:offset + 2])[0]
+                        filters.append(body[offset + 2:offset + 2 + length].decode())
+                        offset += 3 + length
+                    with self._lock:
+                        self._subscriptions.setdefault(conn, []).extend(filters)
+                    self._send(conn, b"\x90" + encode_length(2 + len(filters)) + body[:2] + b"\x00" * len(filters))
+                elif kind == 12:  # PINGREQ -> PINGRESP
+                    self._send(conn, b"\xd0\x00")
+                elif kind == 14:  # DISCONNECT
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with self._lock:
+                self._subscriptions.pop(conn, None)
+                self._send_locks.pop(conn, None)
+            conn.close()
+
+    def _route(self, topic, payload):
+        encoded = topic.encode()
+        body = struct.pack("!H", len(encoded)) + encoded + payload
+        packet = b"\x30" + encode_length(len(body)) + body
+        with self._lock:
+            targets = [c for c, filters in self._subscriptions.items()
+                       if any(topic_matches(f, topic) for f in filters)]
+        for conn in targets:
+            try:
+                self._send(conn, packet)
+            except OSError:
+                pass
+
+    def _send(self, conn, data):
+        lock = self._send_locks.get(conn)
+        if lock is None:
+            raise OSError("connection closed")
+        with lock:
+            conn.sendall(data)
+
+
+def wait_for(predicate, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay the MQTT outbox against a local broker stand-in")
+    parser.add_argument("--messages", type=int, default=20000, help="coalescable messages published while down")
+    parser.add_argument("--topics", type=int, default=50, help="distinct topics they are spread over")
+    parser.add_argument("--ordered", type=int, default=5000, help="non-coalesced messages published while down")
+    parser.add_argument("--memory", type=int, default=1000, help="messages held in memory before spilling")
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="mqtt-outbox-")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    from config import Config
+    Config.MQTT_OUTBOX_PATH = os.path.join(workdir, "outbox.db")
+    Config.MQTT_OUTBOX_MEMORY = args.memory
+    Config.MQTT_OUTBOX_BATCH = args.batch
+    from app.services.mqtt_service import MQTTService
+
+    port = free_port()
+    broker = BrokerStandIn(port)
+    service = MQTTService("127.0.0.1", port)
+    service.client.reconnect_delay_set(min_delay=1, max_delay=1)
+    service.connect()  # broker is down: paho keeps retrying, publishes queue up
+
+    latest = {}
+    started = time.perf_counter()
+    for i in range(args.messages):
+        topic = f"mine/pump/{i % args.topics}/status"
+        payload = json.dumps({"seq": i})
+        service.publish(topic, payload)
+        latest[topic] = payload.encode()
+    for i in range(args.ordered):
+        service.publish("mine/events", json.dumps({"seq": i}), qos=1, coalesce=False)
+    enqueue_s = time.perf_counter() - started
+    queued = service.get_stats()["outbox"]
+    print(f"Queued {args.messages + args.ordered} publishes in {enqueue_s * 1000:.0f} ms while the broker was down: "
+          f"depth {queued['depth']} ({queued['in_memory']} in memory, {queued['on_disk']} on disk), "
+          f"{queued['coalesced']} coalesced")
+
+    expected = args.topics + args.ordered
+    broker.start()
+    up_at = time.time()
+    ok = wait_for(lambda: len(broker.received) >= expected and not service.get_stats()["outbox"]["depth"],
+                  args.timeout)
+    replayed = service.get_stats()["outbox"]
+    print(f"Broker up: received {len(broker.received)}/{expected} in "
+          f"{(broker.received[-1][2] - up_at) * 1000 if broker.received else float('nan'):.0f} ms after it started "
+          f"(replay itself {replayed['last_replay_ms']} ms, {replayed['batches']} batches), "
+          f"max queued age {replayed['max_replay_latency_ms']} ms")
+
+    failures = []
+    if not ok:
+        failures.append("replay did not finish in time")
+    status = {t: p for t, p, _ in broker.received if t != "mine/events"}
+    if status != latest:
+        failures.append(f"coalesced topics differ: {len(status)} received vs {len(latest)} expected")
+    events = [json.loads(p)["seq"] for t, p, _ in broker.received if t == "mine/events"]
+    if events != list(range(args.ordered)):
+        failures.append(f"ordered messages out of order or missing ({len(events)} received)")
+    topics_in_order = [t for t, _, _ in broker.received]
+    first_event = topics_in_order.index("mine/events") if "mine/events" in topics_in_order else -1
+    if first_event >= 0 and any(t != "mine/events" for t in topics_in_order[first_event:]):
+        failures.append("status messages replayed after newer event messages")
+
+    # Second outage in the middle of a stream of ordered messages
+    broker.stop()
+    wait_for(lambda: not service.is_connected, 10)
+    before = len(broker.received)
+    for i in range(args.ordered, args.ordered * 2):
+        service.publish("mine/events", json.dumps({"seq": i}), qos=1, coalesce=False)
+    broker = BrokerStandIn(port)
+    broker.start()
+    ok = wait_for(lambda: len(broker.received) >= args.ordered and not service.get_stats()["outbox"]["depth"],
+                  args.timeout)
+    events = [json.loads(p)["seq"] for t, p, _ in broker.received if t == "mine/events"]
+    if not ok or events != list(range(args.ordered, args.ordered * 2)):
+        failures.append(f"second outage: {len(events)} of {args.ordered} ordered messages replayed in order")
+    print(f"Second outage: {len(events)}/{args.ordered} ordered messages replayed in order "
+          f"(after {before} in the first run)")
+
+    service.stop()
+    final = service.get_stats()
+    print(f"Outbox stats: {json.dumps(final['outbox'])}")
+    print("FAIL: " + "; ".join(failures) if failures else "OK")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
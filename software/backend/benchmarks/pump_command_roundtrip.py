@@ -0,0 +1,153 @@
+"""
+Pump command round trips through the full app against a local broker stand-in.
+
+    python benchmarks/pump_command_roundtrip.py [--pumps 200] [--loss 0.1] [--timeout 1.0]
+
+The app is started with its background services, MQTT pointed at the broker
+stand-in from mqtt_outbox_replay.py. A simulated fleet of ESP32 pumps, one
+paho client, obeys `mine/pump/manual[/<site>]`: after a random actuation
+delay it reports the new pump state on `mine/telemetry[/<site>]`. It ignores
+a fraction (--loss) of the commands, so those have to be retried. Every pump
+is then started at once from a thread pool through POST /api/start-pump. The
+script reports how long the requests took, which must not include waiting for
+the devices, the command-to-actuation latency percentiles, and the outcomes
+and retries.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_fleet(port, default_site, delay_ms, loss, seed):
+    """One paho client playing every pump; returns it and the per-site command log"""
+    import paho.mqtt.client as mqtt
+    rng = random.Random(seed)
+    commands = {}  # site -> commands received
+    lock = threading.Lock()
+
+    def report(site, command):
+        payload = json.dumps({"ts": int(time.time() * 1000), "water_level_cm": 3.0, "solar_voltage": 5.1,
+                              "battery_voltage": 3.9, "pump_status": "ON" if command == "ON" else "OFF",
+                              "manual_mode": command})
+        client.publish("mine/telemetry" if site == default_site else f"mine/telemetry/{site}", payload)
+
+    def on_message(client, userdata, msg):
+        site = msg.topic.split("/", 3)[3] if msg.topic.count("/") >= 3 else default_site
+        command = msg.payload.decode()
+        with lock:
+            commands.setdefault(site, []).append(command)
+            dropped = rng.random() < loss
+            delay = rng.uniform(*delay_ms) / 1000
+        if not dropped:
+            threading.Timer(delay, report, args=(site, command)).start()
+
+    def on_connect(client, userdata, flags, rc):
+        client.subscribe([("mine/pump/manual", 0), ("mine/pump/manual/#", 0)])
+
+    client = mqtt.Client()
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect("127.0.0.1", port)
+    client.loop_start()
+    return client, commands
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 1) if len(values) else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pump command dispatch and actuation latency")
+    parser.add_argument("--pumps", type=int, default=200)
+    parser.add_argument("--loss", type=float, default=0.1, help="fraction of commands the devices ignore")
+    parser.add_argument("--delay-ms", default="50,400", help="device actuation delay range")
+    parser.add_argument("--timeout", type=float, default=1.0, help="PUMP_COMMAND_TIMEOUT for this run")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=32, help="request threads")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="pump-commands-")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    from config import Config
+    Config.MQTT_OUTBOX_PATH = os.path.join(workdir, "outbox.db")
+    Config.PUMP_COMMAND_TIMEOUT = args.timeout
+    Config.PUMP_COMMAND_RETRIES = args.retries
+    Config.SITE_IDS = [Config.DEFAULT_SITE_ID] + [f"pump-{i:04d}" for i in range(1, args.pumps)]
+    from mqtt_outbox_replay import BrokerStandIn, free_port, wait_for
+    from app.services.mqtt_service import mqtt_service
+    from app.services.pump_commands import pump_commands
+
+    port = free_port()
+    broker = BrokerStandIn(port)
+    broker.start()
+    mqtt_service.broker, mqtt_service.port = "127.0.0.1", port
+
+    from app import create_app
+    app = create_app()
+    if not wait_for(lambda: mqtt_service.is_connected, 10):
+        print("FAIL: app did not connect to the broker stand-in")
+        return 1
+    low, high = (float(x) for x in args.delay_ms.split(","))
+    fleet, received = start_fleet(port, Config.DEFAULT_SITE_ID, (low, high), args.loss, args.seed)
+    time.sleep(0.5)  # subscriptions in place
+
+    client = app.test_client()
+
+    def start(site):
+        began = time.perf_counter()
+        response = client.post("/api/start-pump", json={"site": site})
+        elapsed = (time.perf_counter() - began) * 1000
+        return elapsed, response.status_code, response.get_json()["command"]["id"]
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(start, Config.SITE_IDS))
+    dispatch_s = time.perf_counter() - began
+    request_ms = [r[0] for r in results]
+    ids = [r[2] for r in results]
+    print(f"{args.pumps} start-pump requests from {args.concurrency} threads in {dispatch_s * 1000:.0f} ms: "
+          f"p50 {percentile(request_ms, 50)} ms, p99 {percentile(request_ms, 99)} ms, "
+          f"max {round(max(request_ms), 1)} ms, statuses {sorted({r[1] for r in results})}")
+
+    settle = args.timeout * (args.retries + 1) + 5
+    wait_for(lambda: all(pump_commands.get(i)["state"] != "pending" for i in ids), settle)
+    commands = [pump_commands.get(i) for i in ids]
+    states = {}
+    for command in commands:
+        states[command["state"]] = states.get(command["state"], 0) + 1
+    latencies = [c["latency_ms"] for c in commands if c["state"] == "acknowledged"]
+    attempts = [c["attempts"] for c in commands]
+    print(f"Outcomes: {states}; attempts per command: mean {np.mean(attempts):.2f}, max {max(attempts)}")
+    print(f"Command-to-actuation: p50 {percentile(latencies, 50)} ms, p90 {percentile(latencies, 90)} ms, "
+          f"p99 {percentile(latencies, 99)} ms (device delay {args.delay_ms} ms, "
+          f"loss {args.loss:.0%}, timeout {args.timeout}s)")
+    print(f"Dispatcher stats: {json.dumps(pump_commands.get_stats())}")
+    print(f"Devices received {sum(len(v) for v in received.values())} command messages for {len(received)} pumps")
+
+    failures = []
+    if any(status != 200 for _, status, _ in results):
+        failures.append("non-200 responses")
+    if max(request_ms) >= args.timeout * 1000:
+        failures.append("a request waited as long as a command timeout")
+    if states.get("acknowledged", 0) < args.pumps * 0.95:
+        failures.append("fewer than 95% of commands were confirmed")
+    fleet.loop_stop()
+    print("FAIL: " + "; ".join(failures) if failures else "OK")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
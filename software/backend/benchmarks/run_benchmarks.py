@@ -0,0 +1,361 @@
+"""
+Offline benchmark suite for the backend hot paths.
+
+    python benchmarks/run_benchmarks.py                  # run everything, compare with the baseline
+    python benchmarks/run_benchmarks.py --quick          # smaller sizes and fewer repeats
+    python benchmarks/run_benchmarks.py --only predict   # cases whose name contains "predict"
+    python benchmarks/run_benchmarks.py --save-baseline  # store this run as benchmarks/baseline.json
+
+Results are written as JSON (benchmarks/results/latest.json by default). Every
+case reports median/p95/min time per operation; a case slower than the
+baseline by more than --tolerance (on --metric, the median by default) is a
+regression and makes the run exit with status 1. Baselines are machine-specific: refresh them with
+--save-baseline when the hardware changes.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(BACKEND_DIR, "benchmarks", "baseline.json")
+RESULTS_PATH = os.path.join(BACKEND_DIR, "benchmarks", "results", "latest.json")
+
+# Add backend directory to Python path so `app` and `models` are importable when run as a script
+sys.path.append(BACKEND_DIR)
+# Keep benchmark writes away from the real database; must be set before `config` is imported
+WORKDIR = tempfile.mkdtemp(prefix="bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}")
+
+
+def measure(fn, repeats, warmup=1, min_sample=0.001):
+    """
+    Per-call wall times (seconds) of `fn()`: `repeats` samples after `warmup` untimed calls.
+    Fast calls are looped within a sample (timeit-style) until it lasts about
+    `min_sample` seconds, so microsecond-scale cases are not dominated by timer noise.
+    """
+    for _ in range(warmup):
+        fn()
+    start = time.perf_counter()
+    fn()
+    single = time.perf_counter() - start
+    number = max(1, int(min_sample / single)) if single > 0 else 1000
+
+    times = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times[i] = (time.perf_counter() - start) / number
+    return times
+
+
+def summarize(times, **params):
+    median = float(np.median(times))
+    return {
+        "median_ms": round(median * 1000, 6),
+        "p95_ms": round(float(np.percentile(times, 95)) * 1000, 6),
+        "min_ms": round(float(times.min()) * 1000, 6),
+        "ops_per_s": round(1.0 / median, 1) if median > 0 else None,
+        "repeats": len(times),
+        "params": params,
+    }
+
+
+class Suite:
+    def __init__(self, quick=False, only=None):
+        self.quick = quick
+        self.only = only
+        self.results = {}
+
+    def case(self, name, fn, repeats, warmup=1, **params):
+        if self.only and self.only not in name:
+            return
+        times = measure(fn, max(3, repeats // 5) if self.quick else repeats, warmup)
+        self.results[name] = summarize(times, **params)
+        r = self.results[name]
+        print(f"  {name:<38} median {r['median_ms']:11.4f} ms | p95 {r['p95_ms']:11.4f} ms "
+              f"| {r['ops_per_s']:>12} ops/s")
+
+
+# --- Cases ---
+
+def bench_ai_service(suite):
+    from app.services.ai_model_service import AIModelService
+
+    print("AIModelService")
+    service = AIModelService(model_path=os.path.join(WORKDIR, "bench_model.pkl"))
+    service.warm_up()
+    rng = np.random.default_rng(0)
+    features = {"water_level": 3.5, "rain": 0.4, "solar_historical": 0.2, "time_of_day": 2, "diesel_cost": 18.5}
+
+    suite.case("ai_predict_single_cached", lambda: service.predict(features), repeats=200)
+    service.cache.max_entries = 0  # every lookup misses
+    service.cache.clear()
+    suite.case("ai_predict_single_uncached", lambda: service.predict(features), repeats=200)
+    for n in (1, 64, 256, 1024, 4096):
+        matrix = (rng.random((n, 5)) * [6.0, 3.0, 0.6, 3.0, 18.5]).astype(np.float32)
+        suite.case(f"ai_predict_batch_{n}", lambda m=matrix: service.predict_batch(m),
+                   repeats=max(20, 200 // n), rows=n)
+    return service
+
+
+def bench_predict_pump(suite, service):
+    from app.models import ai_predictor
+
+    print("predict_pump")
+    # The module normally loads Config.AI_MODEL_PATH; reuse the service's forest instead
+    ai_predictor.rf_model = service.model
+    features = {"water_level": 3.5, "rain": 0.4, "solar_historical": 0.2, "time_of_day": 2, "diesel_cost": 18.5}
+    suite.case("predict_pump_cached", lambda: ai_predictor.predict_pump(features), repeats=200)
+    ai_predictor.prediction_cache.max_entries = 0
+    ai_predictor.prediction_cache.clear()
+    suite.case("predict_pump_uncached", lambda: ai_predictor.predict_pump(features), repeats=100)
+
+
+def bench_api_status(suite):
+    from app import create_app
+    from app.services.state_store import state_store
+    from config import Config
+
+    print("/api/status (Flask test client)")
+    client = create_app(start_services=False).test_client()
+    site = Config.DEFAULT_SITE_ID
+    response = client.get("/api/status")
+    etag = response.headers["ETag"]
+    version = response.headers["X-State-Version"]
+
+    suite.case("api_status_full", lambda: client.get("/api/status"), repeats=200)
+    suite.case("api_status_not_modified",
+               lambda: client.get("/api/status", headers={"If-None-Match": etag}), repeats=200)
+
+    def update_then_get():
+        state_store.update(site, {"water_level": float(np.random.uniform(0, 6))})
+        client.get(f"/api/status?since={version}")
+    suite.case("api_status_delta_after_update", update_then_get, repeats=200)
+
+    def update_then_full():
+        state_store.update(site, {"water_level": float(np.random.uniform(0, 6))})
+        client.get("/api/status")
+    suite.case("api_status_full_after_update", update_then_full, repeats=200)
+
+
+def bench_state_loop(suite):
+    from app.routes.enhanced_dashboard import update_all_sites
+    from app.services.state_store import state_store
+
+    print("State update loop (one tick)")
+    for n in (10, 100, 1000):
+        for i in range(len(state_store), n):
+            state_store.register_site(f"bench-{i}")
+        suite.case(f"state_update_tick_{n}_sites", update_all_sites, repeats=max(10, 200 // n), sites=n)
+
+
+def bench_history(suite):
+    from app.services.storage_service import storage_service, INSERTS
+    from app.services.history_service import history_service, lttb_indices, minmax_indices
+
+    print("History downsampling")
+    days = 30 if suite.quick else 365
+    n = days * 1440
+    rng = np.random.default_rng(0)
+    ts = time.time() - n * 60 + np.arange(n) * 60.0
+    level = 3 + np.sin(np.arange(n) / 300) + rng.normal(0, 0.1, n)
+    solar = np.clip(np.sin((np.arange(n) % 1440) / 1440 * 2 * np.pi - np.pi / 2), 0, None) * 500
+    pump = np.where(rng.random(n) < 0.05, "Running", "OFF")
+    conn = storage_service.connect()
+    storage_service._init_schema(conn)
+    with conn:
+        conn.executemany(INSERTS["telemetry"], (
+            ("bench-history", float(t), float(w), 50.0, str(p), float(s), 5.0, 3.9, "bench", 0.2)
+            for t, w, p, s in zip(ts, level, pump, solar)))
+    conn.close()
+
+    suite.case(f"history_lttb_{n}_to_500", lambda: lttb_indices(ts, level, 500), repeats=20, rows=n)
+    suite.case(f"history_minmax_{n}_to_500", lambda: minmax_indices(level, 500), repeats=20, rows=n)
+    suite.case(f"history_query_{days}d_minute_data", lambda: history_service.query(
+        "bench-history", ["water_level"], start=ts[0], end=ts[-1], points=500), repeats=5, rows=n)
+
+
+def bench_rollups(suite):
+    from app.services.storage_service import storage_service, INSERTS
+    from app.services.state_store import state_store
+    from app.services.rollup_service import RollupService, SCHEMA
+
+    print("Energy rollups")
+    days = 30 if suite.quick else 365
+    n = days * 1440
+    rng = np.random.default_rng(1)
+    ts = time.time() - n * 60 + np.arange(n) * 60.0
+    running = np.cumsum(rng.random(n) < 0.02) % 2 == 1
+    solar = np.clip(np.sin((np.arange(n) % 1440) / 1440 * 2 * np.pi - np.pi / 2), 0, None) * 5
+    rows = [("bench-rollups", float(t), 3.0, 50.0, "Running" if r else "OFF", float(s), 5.0, 3.9, "bench", None)
+            for t, r, s in zip(ts, running, solar)]
+    rollups = RollupService(storage_service, state_store)
+    conn = storage_service.connect()
+    storage_service._init_schema(conn)
+    conn.executescript(SCHEMA)
+    with conn:
+        conn.execute("DELETE FROM rollups WHERE site_id = 'bench-rollups'")
+        conn.execute("DELETE FROM telemetry WHERE site_id = 'bench-rollups'")
+        conn.executemany(INSERTS["telemetry"], rows)
+    # Apply the readings the way the storage writer does, one 500-row flush at a time
+    started = time.perf_counter()
+    for i in range(0, n, 500):
+        with conn:
+            rollups.on_flush(conn, {"telemetry": rows[i:i + 500]})
+        rollups.on_commit()
+    print(f"  applied {n} readings to the rollups in {time.perf_counter() - started:.1f}s")
+    conn.close()
+
+    suite.case("rollup_apply_500_readings", lambda: rollups._accumulate(
+        rollups._events(rows[:500], ()), {}), repeats=50, rows=500)
+    suite.case(f"rollup_totals_{days}d", lambda: rollups.totals("bench-rollups", ts[0], ts[-1]), repeats=50, rows=n)
+    # The O(rows) baseline the rollups replace: aggregate the raw readings for the same range
+    raw = ("SELECT SUM(CASE pump_status WHEN 'Running' THEN 60 ELSE 0 END), SUM(solar_power) FROM telemetry "
+           "WHERE site_id = ? AND ts >= ? AND ts < ?")
+    suite.case(f"raw_scan_totals_{days}d", lambda: storage_service.read_connection().execute(
+        raw, ("bench-rollups", ts[0], ts[-1])).fetchone(), repeats=5, rows=n)
+
+
+def bench_solar(suite):
+    from app.models.solar_profile import solar_profile
+    from app.services.solar_forecast import SolarForecastService
+    from app.services.weather_service import weather_provider
+
+    print("Solar lookup and forecast")
+    profile = solar_profile()
+    now = time.time()
+    suite.case("solar_expected_scalar", lambda: profile.at(now, 24.12, 82.67, 0.3), repeats=2000)
+    sites = [f"bench-{i}" for i in range(100 if suite.quick else 1000)]
+    forecaster = SolarForecastService(weather_provider, 24.12, 82.67)
+    # Sites sharing the weather location and cloud cover share one evaluated series
+    suite.case(f"solar_forecast_{len(sites)}_sites_24h_shared", lambda: forecaster.forecast(
+        sites, start=now, hours=24, step_minutes=15, cloud_cover=0.3), repeats=20, sites=len(sites))
+    # Worst case: every site has its own location and cloud cover
+    forecaster.locations = {s: (20 + i * 0.005, 80 + i * 0.005) for i, s in enumerate(sites)}
+    clouds = {s: (i % 100) / 100 for i, s in enumerate(sites)}
+    suite.case(f"solar_forecast_{len(sites)}_sites_24h_distinct", lambda: forecaster.forecast(
+        sites, start=now, hours=24, step_minutes=15, cloud_cover=clouds), repeats=20, sites=len(sites))
+
+
+def bench_training(suite):
+    from models.aiModel import SolarDewateringModel, MINING_SITES
+
+    print("SolarDewateringModel")
+    model = SolarDewateringModel(MINING_SITES["Singrauli_MP"])
+    sizes = (10_000, 100_000) if suite.quick else (10_000, 100_000, 1_000_000)
+    for n in sizes:
+        suite.case(f"prepare_training_data_{n}", lambda n=n: model.prepare_training_data(n, seed=0),
+                   repeats=max(3, 50_000 // n * 5), warmup=0, rows=n)
+
+    sizes = (2_000, 10_000) if suite.quick else (2_000, 10_000, 50_000)
+    for n in sizes:
+        dataset = model.prepare_training_data(n, seed=0)
+        suite.case(f"train_model_{n}", lambda d=dataset: model.train_model(d.copy(), n_jobs=1, verbose=False),
+                   repeats=3, warmup=0, rows=n)
+
+
+# --- Reporting ---
+
+def environment():
+    versions = {}
+    for module in ("numpy", "pandas", "sklearn", "flask"):
+        try:
+            versions[module] = __import__(module).__version__
+        except Exception:
+            versions[module] = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def compare(results, baseline, tolerance, metric="median_ms"):
+    """Print current vs baseline `metric`; returns the names of regressed cases"""
+    regressions = []
+    print(f"\n{'case':<40}{'baseline ms':>14}{'current ms':>14}{'ratio':>9}  status ({metric})")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:<40}{'-':>14}{current[metric]:>14.4f}{'-':>9}  new")
+            continue
+        ratio = current[metric] / previous[metric] if previous[metric] else float("inf")
+        if ratio > 1 + tolerance:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 / (1 + tolerance):
+            status = "improved"
+        else:
+            status = "ok"
+        print(f"{name:<40}{previous[metric]:>14.4f}{current[metric]:>14.4f}{ratio:>9.2f}  {status}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backend hot-path benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes and fewer repeats")
+    parser.add_argument("--only", help="run only cases whose name contains this string")
+    parser.add_argument("--output", default=RESULTS_PATH, help="where to write the JSON results")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run to --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown before a case counts as a regression")
+    parser.add_argument("--metric", choices=("median_ms", "min_ms"), default="median_ms",
+                        help="statistic to compare; min_ms is steadier on busy or shared machines")
+    args = parser.parse_args(argv)
+
+    os.chdir(BACKEND_DIR)  # the service and training code resolve data files relative to the cwd
+    suite = Suite(quick=args.quick, only=args.only)
+    service = bench_ai_service(suite)
+    bench_predict_pump(suite, service)
+    bench_api_status(suite)
+    bench_state_loop(suite)
+    bench_history(suite)
+    bench_rollups(suite)
+    bench_solar(suite)
+    bench_training(suite)
+
+    report = {"environment": environment(), "quick": args.quick, "results": suite.results}
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(suite.results, baseline, args.tolerance, args.metric)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
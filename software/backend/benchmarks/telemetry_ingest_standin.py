@@ -0,0 +1,202 @@
+"""
+Telemetry ingestion through the real MQTT client against a local broker stand-in.
+
+    python benchmarks/telemetry_ingest_standin.py [--sites 20] [--messages 20000] [--queue 2000]
+
+A TelemetryIngestor is attached to an MQTTService pointed at the broker
+stand-in from mqtt_outbox_replay.py, and a second paho client plays the
+ESP32s, publishing on `mine/telemetry[/<site>]`. Three phases run in order:
+
+- burst: --messages readings arrive while the ingest worker is not running,
+  so the bounded queue (--queue) must keep the newest ones and count every
+  message it dropped, oldest first;
+- valid: readings for --sites sites; each site's state must end on its last
+  reading;
+- malformed: payloads that are not JSON, not an object, missing or
+  non-numeric fields, non-finite or overflowing numbers, wrong-typed
+  pump_status or site, interleaved with valid ones. Each bad message must be
+  counted invalid on its own, the valid ones around it applied, and the
+  worker must stay alive.
+
+Throughout, the script checks that payloads are only ever decoded on the
+ingest worker thread, never on paho's network thread, and reports how long
+the network thread spent per message.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MALFORMED = [
+    b"not json",
+    b"[1, 2, 3]",
+    b'{"pump_status": "ON"}',
+    b'{"water_level_cm": "deep", "pump_status": "ON"}',
+    b'{"water_level_cm": NaN, "pump_status": "ON"}',
+    b'{"water_level_cm": 1' + b"0" * 400 + b', "pump_status": "ON"}',
+    b'{"water_level_cm": 2.0, "pump_status": ["ON"]}',
+    b'{"water_level_cm": 2.0, "pump_status": "SPIN"}',
+    b'{"water_level_cm": 2.0, "pump_status": "ON", "site": 7}',
+    b"\xff\xfe",
+]
+
+
+def reading(level, status="ON", **extra):
+    return json.dumps({"ts": int(time.time() * 1000), "water_level_cm": level, "solar_voltage": 5.0,
+                       "battery_voltage": 3.9, "pump_status": status, "manual_mode": "AUTO", **extra})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive telemetry ingestion through a local broker stand-in")
+    parser.add_argument("--sites", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=20000, help="readings in the burst phase")
+    parser.add_argument("--queue", type=int, default=2000, help="ingest queue capacity")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="telemetry-standin-")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    from config import Config
+    Config.MQTT_OUTBOX_PATH = ""
+    import paho.mqtt.client as mqtt
+    from mqtt_outbox_replay import BrokerStandIn, free_port, wait_for
+    from app.services import telemetry_service
+    from app.services.mqtt_service import MQTTService
+    from app.services.state_store import StateStore
+
+    # Record the thread of every decode and how long the network thread spends per message
+    decode_threads = set()
+    real_decode = telemetry_service.decode_telemetry
+
+    def recording_decode(payload):
+        decode_threads.add(threading.current_thread().name)
+        return real_decode(payload)
+
+    telemetry_service.decode_telemetry = recording_decode
+
+    store = StateStore()
+    sites = [f"site-{i}" for i in range(args.sites)]
+    for site_id in [Config.DEFAULT_SITE_ID] + sites:
+        store.register_site(site_id)
+    ingestor = telemetry_service.TelemetryIngestor(store, Config.MQTT_TELEMETRY_TOPIC, queue_size=args.queue,
+                                                   batch_size=500, default_site_id=Config.DEFAULT_SITE_ID)
+    callback_seconds = []
+    on_message = ingestor.on_message
+
+    def timed_on_message(client, userdata, msg):
+        start = time.perf_counter()
+        on_message(client, userdata, msg)
+        callback_seconds.append(time.perf_counter() - start)
+
+    ingestor.on_message = timed_on_message
+
+    port = free_port()
+    broker = BrokerStandIn(port)
+    broker.start()
+    service = MQTTService("127.0.0.1", port)
+    ingestor.attach(service)
+    service.connect()
+    devices = mqtt.Client()
+    devices.connect("127.0.0.1", port)
+    devices.loop_start()
+    failures = []
+    topic = Config.MQTT_TELEMETRY_TOPIC
+
+    def publish(site, payload):
+        devices.publish(topic if site is None else f"{topic}/{site}", payload)
+
+    # Subscribed once a probe comes back through the broker
+    if not wait_for(lambda: service.is_connected, 10):
+        print("FAIL: ingestor did not connect to the broker stand-in")
+        return 1
+    deadline = time.time() + 10
+    while not ingestor.stats["received"] and time.time() < deadline:
+        publish(None, reading(0.0))
+        time.sleep(0.05)
+    with ingestor._cond:
+        ingestor._buffer.clear()
+    ingestor.stats.update(received=0)
+
+    # --- Burst: worker not running yet, so only the newest --queue readings survive ---
+    started = time.perf_counter()
+    for i in range(args.messages):
+        publish(None, reading(round(i / args.messages * 5, 6), seq=i))
+    wait_for(lambda: ingestor.stats["received"] >= args.messages, args.timeout)
+    burst_s = time.perf_counter() - started
+    expected_dropped = max(0, args.messages - args.queue)
+    queued = [json.loads(payload)["seq"] for _, payload in list(ingestor._buffer)]
+    print(f"Burst: {ingestor.stats['received']} received in {burst_s * 1000:.0f} ms, "
+          f"{ingestor.stats['dropped']} dropped, {len(queued)} queued")
+    if ingestor.stats["dropped"] != expected_dropped:
+        failures.append(f"burst dropped {ingestor.stats['dropped']}, expected {expected_dropped}")
+    if queued != list(range(args.messages - len(queued), args.messages)):
+        failures.append("burst queue does not hold the newest readings in order")
+
+    ingestor.start()
+    wait_for(lambda: ingestor.get_stats()["queue_depth"] == 0 and ingestor.stats["processed"] >= len(queued),
+             args.timeout)
+    last_level = round((args.messages - 1) / args.messages * 5, 6)
+    if store.get(Config.DEFAULT_SITE_ID)["water_level"] != last_level:
+        failures.append("default site did not end on the newest burst reading")
+
+    # --- Valid readings for many sites ---
+    processed_before = ingestor.stats["processed"]
+    last = {}
+    for i in range(args.sites * 20):
+        site = sites[i % args.sites]
+        last[site] = round(i * 0.01, 2)
+        publish(site, reading(last[site], "ON" if i % 2 else "OFF"))
+    wait_for(lambda: ingestor.stats["processed"] - processed_before >= args.sites * 20, args.timeout)
+    wrong = [site for site in sites if store.get(site)["water_level"] != last[site]]
+    print(f"Valid: {ingestor.stats['processed'] - processed_before} readings for {args.sites} sites, "
+          f"{len(wrong)} sites not on their last reading")
+    if wrong:
+        failures.append(f"sites not on their last reading: {wrong[:5]}")
+
+    # --- Malformed payloads between valid ones ---
+    invalid_before, processed_before = ingestor.stats["invalid"], ingestor.stats["processed"]
+    for i, payload in enumerate(MALFORMED * 10):
+        publish(sites[0], payload)
+        publish(sites[1], reading(100 + i))
+    publish(sites[0], reading(42.0))
+    total = len(MALFORMED) * 10
+    wait_for(lambda: ingestor.stats["invalid"] - invalid_before >= total
+             and ingestor.stats["processed"] - processed_before >= total + 1, args.timeout)
+    invalid = ingestor.stats["invalid"] - invalid_before
+    print(f"Malformed: {invalid}/{total} counted invalid, {ingestor.stats['errors']} unexpected errors, "
+          f"worker alive: {ingestor._thread.is_alive()}")
+    if invalid != total:
+        failures.append(f"{invalid} of {total} malformed payloads counted invalid")
+    if not ingestor._thread.is_alive():
+        failures.append("ingest worker died")
+    if store.get(sites[0])["water_level"] != 42.0 or store.get(sites[1])["water_level"] != 100 + total - 1:
+        failures.append("valid readings around malformed ones were not applied")
+
+    # --- Decoding never happens on the network thread ---
+    if decode_threads != {"telemetry-ingest"}:
+        failures.append(f"payloads decoded on {sorted(decode_threads)}")
+    callback_seconds.sort()
+    if callback_seconds:
+        p99 = callback_seconds[int(len(callback_seconds) * 0.99)]
+        print(f"Network thread per message: p50 {callback_seconds[len(callback_seconds) // 2] * 1e6:.1f} µs, "
+              f"p99 {p99 * 1e6:.1f} µs; decoded on {sorted(decode_threads)}")
+
+    ingestor.stop()
+    devices.loop_stop()
+    devices.disconnect()
+    service.stop()
+    broker.stop()
+    print(f"Ingestor stats: {json.dumps(ingestor.get_stats())}")
+    print("FAIL: " + "; ".join(failures) if failures else "OK")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Weather provider refresh, TTL and circuit breaker against a local HTTP stand-in.
+
+    python benchmarks/weather_standin.py [--reset 0.2] [--ttl 0.6]
+
+A threaded HTTP server on a free port answers Open-Meteo style `current`
+readings, or fails with 500s or by answering too slowly, as the script
+switches it. A WeatherProvider is pointed at it through its `base_url`, with
+an injected session that counts requests, and `refresh()` is driven directly
+so every transition is deterministic. The script checks that:
+
+- no source or data age is reported before the first publish;
+- a live reading is fetched (with the site's coordinates) and published;
+- failures open the breaker after the threshold, and while it is open no
+  request reaches the server and the last good reading is still served;
+- past the TTL the provider falls back to synthetic weather;
+- each failed half-open trial doubles the reset timeout up to the cap, and
+  a slow answer counts as a failure;
+- a successful trial closes the breaker, resets the timeout and publishes
+  live data again.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+READING = {"temperature_2m": 31.5, "relative_humidity_2m": 58, "precipitation": 0.4,
+           "shortwave_radiation": 612, "cloud_cover": 25}
+
+
+class WeatherStandIn:
+    """Open-Meteo `current` endpoint whose behaviour ("ok", "error" or "slow") can be switched"""
+
+    def __init__(self, slow_seconds=1.0):
+        self.mode = "ok"
+        self.slow_seconds = slow_seconds
+        self.requests = []  # query dicts, in arrival order
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stand_in.requests.append(parse_qs(urlparse(self.path).query))
+                if stand_in.mode == "error":
+                    self.send_error(500)
+                    return
+                if stand_in.mode == "slow":
+                    time.sleep(stand_in.slow_seconds)
+                body = json.dumps({"current": READING}).encode()
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except OSError:
+                    pass  # the client gave up waiting
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/forecast"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exercise the weather provider against a local HTTP stand-in")
+    parser.add_argument("--threshold", type=int, default=3, help="failures before the breaker opens")
+    parser.add_argument("--reset", type=float, default=0.2, help="base reset timeout (s)")
+    parser.add_argument("--max-reset", type=float, default=0.8, help="reset timeout cap (s)")
+    parser.add_argument("--ttl", type=float, default=0.6, help="how long the last good reading is served (s)")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    import requests
+    from app.services.weather_service import CircuitBreaker, WeatherProvider
+
+    class CountingSession(requests.Session):
+        def __init__(self):
+            super().__init__()
+            self.calls = 0
+
+        def request(self, *a, **kw):
+            self.calls += 1
+            return super().request(*a, **kw)
+
+    stand_in = WeatherStandIn()
+    stand_in.start()
+    session = CountingSession()
+    provider = WeatherProvider(12.97, 77.59, stand_in.url, ttl=args.ttl, timeout=0.3, session=session,
+                               breaker=CircuitBreaker(args.threshold, args.reset, args.max_reset))
+    failures = []
+
+    def check(condition, message):
+        if not condition:
+            failures.append(message)
+
+    def wait_half_open():
+        time.sleep(provider.breaker.retry_in() + 0.01)
+        check(provider.breaker.state == "half-open", f"breaker {provider.breaker.state}, expected half-open")
+
+    status = provider.get_status()
+    check(status["source"] is None and status["data_age_seconds"] is None,
+          f"age reported before any publish: {status['source']}, {status['data_age_seconds']}")
+
+    # Live reading
+    started = time.perf_counter()
+    check(provider.refresh(), "first live refresh failed")
+    live_ms = (time.perf_counter() - started) * 1000
+    current = provider.current()
+    check(current["source"] == "live" and current["solar_irradiance"] == 612 and current["cloud_cover"] == 0.25,
+          f"live reading not published as expected: {current}")
+    query = stand_in.requests[-1]
+    check(query.get("latitude") == ["12.97"] and query.get("longitude") == ["77.59"],
+          f"request did not carry the site coordinates: {query}")
+    print(f"Live: fetched in {live_ms:.1f} ms through the injected session ({session.calls} call)")
+
+    # Failures open the breaker; while open nothing reaches the server and the last good reading stays
+    stand_in.mode = "error"
+    for _ in range(args.threshold):
+        provider.refresh()
+    check(provider.breaker.state == "open", f"breaker {provider.breaker.state} after {args.threshold} failures")
+    hits = len(stand_in.requests)
+    for _ in range(5):
+        check(not provider.refresh(), "refresh succeeded with the breaker open")
+    check(len(stand_in.requests) == hits, "requests reached the server while the breaker was open")
+    check(provider.current()["source"] == "live", "last good reading not served within its TTL")
+    print(f"Open: after {args.threshold} failures, {provider.stats['skipped_open_circuit']} refreshes skipped, "
+          f"still serving the live reading")
+
+    # Failed half-open trials back off: base, 2x, 4x ... up to the cap (a slow answer fails too)
+    timeouts = [provider.breaker.reset_timeout]
+    for mode in ("error", "slow", "error", "error"):
+        stand_in.mode = mode
+        wait_half_open()
+        before = len(stand_in.requests)
+        check(not provider.refresh(), f"half-open trial succeeded against a {mode} server")
+        check(len(stand_in.requests) == before + 1, "half-open let more than one trial through")
+        check(provider.breaker.state == "open", "failed trial did not reopen the breaker")
+        timeouts.append(provider.breaker.reset_timeout)
+    expected = [min(args.reset * 2 ** i, args.max_reset) for i in range(len(timeouts))]
+    check(all(abs(a - b) < 1e-9 for a, b in zip(timeouts, expected)),
+          f"reset timeouts {timeouts}, expected {expected}")
+    print(f"Backoff: reset timeouts {[round(t, 3) for t in timeouts]} s (cap {args.max_reset} s)")
+
+    # Past the TTL the provider falls back to synthetic weather
+    time.sleep(max(0.0, args.ttl - (time.monotonic() - provider._last_good_at)) + 0.01)
+    provider.refresh()
+    check(provider.current()["source"] == "synthetic", "stale reading still served past the TTL")
+    print(f"TTL: synthetic after {args.ttl} s without a good reading")
+
+    # A successful trial closes the breaker and resets the backoff
+    stand_in.mode = "ok"
+    wait_half_open()
+    check(provider.refresh(), "half-open trial failed against a healthy server")
+    check(provider.breaker.state == "closed" and provider.breaker.reset_timeout == args.reset,
+          f"breaker {provider.breaker.state} with reset timeout {provider.breaker.reset_timeout} after recovery")
+    check(provider.current()["source"] == "live", "live reading not published after recovery")
+    status = provider.get_status()
+    check(status["data_age_seconds"] is not None and status["data_age_seconds"] < 1, "bad data age after recovery")
+    print(f"Recovered: {json.dumps(status)}")
+
+    stand_in.stop()
+    print("FAIL: " + "; ".join(failures) if failures else "OK")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 
 class Config:
@@ -12,27 +13,138 @@ class Config:
     AI_MODEL_PATH = os.environ.get('AI_MODEL_PATH', 'pump_rf_realworld (2).pkl')
     CONTAINER_HEIGHT = float(os.environ.get('CONTAINER_HEIGHT', '6.0'))
     PUMP_ON_THRESHOLD = float(os.environ.get('PUMP_ON_THRESHOLD', '3.5'))
-    
+
+    # Prediction cache (features are snapped to these resolutions before lookup)
+    PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', '4096'))
+    PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', '300'))
+    PREDICTION_CACHE_RESOLUTIONS = os.environ.get(
+        'PREDICTION_CACHE_RESOLUTIONS',
+        'water_level=0.05,rain=0.1,solar_historical=10,time_of_day=1,diesel_cost=0.5'
+    )
+    MODEL_WATCH_INTERVAL = float(os.environ.get('MODEL_WATCH_INTERVAL', '1.0'))
+
+    # Online learning (extra trees grown in the background from live telemetry + operator overrides)
+    ONLINE_LEARNING_ENABLED = os.environ.get('ONLINE_LEARNING_ENABLED', 'False').lower() == 'true'
+    ONLINE_LEARNING_WINDOW = int(os.environ.get('ONLINE_LEARNING_WINDOW', '5000'))
+    ONLINE_LEARNING_MIN_SAMPLES = int(os.environ.get('ONLINE_LEARNING_MIN_SAMPLES', '200'))
+    ONLINE_LEARNING_TREES_PER_UPDATE = int(os.environ.get('ONLINE_LEARNING_TREES_PER_UPDATE', '10'))
+    ONLINE_LEARNING_MAX_TREES = int(os.environ.get('ONLINE_LEARNING_MAX_TREES', '50'))
+    ONLINE_LEARNING_INTERVAL = float(os.environ.get('ONLINE_LEARNING_INTERVAL', '60'))
+    ONLINE_LEARNING_CPU_FRACTION = float(os.environ.get('ONLINE_LEARNING_CPU_FRACTION', '0.1'))
+    ONLINE_LEARNING_OVERRIDE_WEIGHT = float(os.environ.get('ONLINE_LEARNING_OVERRIDE_WEIGHT', '5.0'))
+    # Write each grown forest back to the model file (off: online trees last until restart)
+    ONLINE_LEARNING_PERSIST = os.environ.get('ONLINE_LEARNING_PERSIST', 'False').lower() == 'true'
+    # Fuel price fed to the model as `diesel_cost` for live readings
+    DIESEL_COST = float(os.environ.get('DIESEL_COST', '18.5'))
+
     # API settings
     API_TIMEOUT = int(os.environ.get('API_TIMEOUT', '10'))
     UPDATE_INTERVAL = int(os.environ.get('UPDATE_INTERVAL', '2'))
+
+    # What-if fleet simulation (/api/simulate): upper bound on tanks x steps per request
+    SIMULATION_MAX_CELLS = int(os.environ.get('SIMULATION_MAX_CELLS', '20000000'))
+
+    # Server-Sent Events push of state changes (/api/status/stream)
+    STREAM_HISTORY = int(os.environ.get('STREAM_HISTORY', '1000'))
+    STREAM_HEARTBEAT_INTERVAL = float(os.environ.get('STREAM_HEARTBEAT_INTERVAL', '15'))
+    STREAM_RETRY_MS = int(os.environ.get('STREAM_RETRY_MS', '3000'))
+    # Per-site change log kept for `/api/status?since=<version>` deltas
+    STATUS_DELTA_HISTORY = int(os.environ.get('STATUS_DELTA_HISTORY', '256'))
+
+    # Production serving (serve.py): worker processes and threads per worker
+    BIND = os.environ.get('BIND', '0.0.0.0:5000')
+    WORKERS = int(os.environ.get('WORKERS', os.environ.get('WEB_CONCURRENCY', str((os.cpu_count() or 1) * 2 + 1))))
+    WORKER_THREADS = int(os.environ.get('WORKER_THREADS', '8'))
+    # Each open stream holds a worker thread: cap them per worker (0 = no cap), leaving threads for requests
+    STREAM_MAX_CLIENTS = int(os.environ.get('STREAM_MAX_CLIENTS', str(max(1, WORKER_THREADS - 2))))
+    # Seconds a gunicorn worker may go silent before it is restarted (open streams do not count)
+    WORKER_TIMEOUT = int(os.environ.get('WORKER_TIMEOUT', '30'))
+    # Multi-worker coordination: one owner process runs the loops, followers mirror its state
+    CLUSTER_ENABLED = os.environ.get('CLUSTER_ENABLED', 'False').lower() == 'true'
+    CLUSTER_DIR = os.environ.get('CLUSTER_DIR', os.path.join(tempfile.gettempdir(), 'solar-dewatering-cluster'))
+    CLUSTER_OWNER_PORT = int(os.environ.get('CLUSTER_OWNER_PORT', '5099'))
+    CLUSTER_SYNC_INTERVAL = float(os.environ.get('CLUSTER_SYNC_INTERVAL', '0.1'))
+    # How often followers hand their own /metrics series to the owner
+    CLUSTER_METRICS_INTERVAL = float(os.environ.get('CLUSTER_METRICS_INTERVAL', '1.0'))
+    # Memory-mapped segment of hot per-tank fields shared with followers (0 tanks disables it)
+    SHARED_STATE_CAPACITY = int(os.environ.get('SHARED_STATE_CAPACITY', '4096'))
+    SHARED_STATE_POLL_INTERVAL = float(os.environ.get('SHARED_STATE_POLL_INTERVAL', '0.02'))
+
+    # Admin endpoints (/api/admin/*) are refused unless ADMIN_TOKEN is set
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+    # Per-request phase timing (toggled at runtime via /api/admin/profiling) and sampling limits
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False').lower() == 'true'
+    PROFILING_MAX_SECONDS = float(os.environ.get('PROFILING_MAX_SECONDS', '60'))
+    PROFILING_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILING_SAMPLE_INTERVAL_MS', '10'))
+
+    # Weather provider (refreshed in the background, last good value served for WEATHER_TTL)
+    WEATHER_API_URL = os.environ.get('WEATHER_API_URL', 'https://api.open-meteo.com/v1/forecast')
+    WEATHER_REFRESH_INTERVAL = float(os.environ.get('WEATHER_REFRESH_INTERVAL', '300'))
+    WEATHER_TTL = float(os.environ.get('WEATHER_TTL', '3600'))
     
     # Mining site coordinates (Singrauli by default)
     SITE_LATITUDE = float(os.environ.get('SITE_LATITUDE', '24.1197'))
     SITE_LONGITUDE = float(os.environ.get('SITE_LONGITUDE', '82.6739'))
     SITE_NAME = os.environ.get('SITE_NAME', 'Singrauli Coalfield, MP')
+
+    # Fleet settings (comma-separated site/pump ids tracked by the state store)
+    DEFAULT_SITE_ID = os.environ.get('DEFAULT_SITE_ID', 'Singrauli_MP')
+    SITE_IDS = [s.strip() for s in os.environ.get('SITE_IDS', DEFAULT_SITE_ID).split(',') if s.strip()]
     
     # Manual override settings
     MANUAL_OVERRIDE_DURATION = timedelta(minutes=int(os.environ.get('MANUAL_OVERRIDE_MINUTES', '10')))
     
-    # MQTT settings (for future hardware integration)
+    # MQTT broker for telemetry and pump commands; the ESP32s must use the same one
     MQTT_BROKER = os.environ.get('MQTT_BROKER', 'localhost')
     MQTT_PORT = int(os.environ.get('MQTT_PORT', '1883'))
     MQTT_USERNAME = os.environ.get('MQTT_USERNAME', '')
     MQTT_PASSWORD = os.environ.get('MQTT_PASSWORD', '')
+    MQTT_TLS = os.environ.get('MQTT_TLS', 'False').lower() == 'true'
+    MQTT_TELEMETRY_TOPIC = os.environ.get('MQTT_TELEMETRY_TOPIC', 'mine/telemetry')
+
+    # Outbound MQTT queue (held while the broker is unreachable, replayed on reconnect)
+    MQTT_OUTBOX_MEMORY = int(os.environ.get('MQTT_OUTBOX_MEMORY', '1000'))
+    MQTT_OUTBOX_MAX = int(os.environ.get('MQTT_OUTBOX_MAX', '100000'))
+    MQTT_OUTBOX_PATH = os.environ.get('MQTT_OUTBOX_PATH', 'mqtt_outbox.db')
+    MQTT_OUTBOX_BATCH = int(os.environ.get('MQTT_OUTBOX_BATCH', '200'))
+    MQTT_OUTBOX_FLUSH_INTERVAL = float(os.environ.get('MQTT_OUTBOX_FLUSH_INTERVAL', '0.05'))
+
+    # Manual pump commands (published to the ESP32, confirmed by its telemetry)
+    PUMP_COMMAND_TOPIC = os.environ.get('PUMP_COMMAND_TOPIC', 'mine/pump/manual')
+    PUMP_COMMAND_TIMEOUT = float(os.environ.get('PUMP_COMMAND_TIMEOUT', '5.0'))
+    PUMP_COMMAND_RETRIES = int(os.environ.get('PUMP_COMMAND_RETRIES', '2'))
+    PUMP_COMMAND_HISTORY = int(os.environ.get('PUMP_COMMAND_HISTORY', '1000'))
+
+    # Telemetry ingestion settings
+    TELEMETRY_QUEUE_SIZE = int(os.environ.get('TELEMETRY_QUEUE_SIZE', '20000'))
+    TELEMETRY_BATCH_SIZE = int(os.environ.get('TELEMETRY_BATCH_SIZE', '500'))
+    TELEMETRY_FLUSH_INTERVAL = float(os.environ.get('TELEMETRY_FLUSH_INTERVAL', '0.05'))
+    TELEMETRY_STALE_SECONDS = float(os.environ.get('TELEMETRY_STALE_SECONDS', '10'))
     
     # Database settings (for data logging)
     DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///solar_dewatering.db')
+    STORAGE_BATCH_SIZE = int(os.environ.get('STORAGE_BATCH_SIZE', '500'))
+    STORAGE_FLUSH_INTERVAL = float(os.environ.get('STORAGE_FLUSH_INTERVAL', '1.0'))
+    STORAGE_RETENTION_DAYS = int(os.environ.get('STORAGE_RETENTION_DAYS', '90'))
+    STORAGE_COMPACTION_INTERVAL = int(os.environ.get('STORAGE_COMPACTION_INTERVAL', '3600'))
+
+    # History queries for charts (downsampled server-side to at most this many points)
+    HISTORY_DEFAULT_POINTS = int(os.environ.get('HISTORY_DEFAULT_POINTS', '500'))
+    HISTORY_MAX_POINTS = int(os.environ.get('HISTORY_MAX_POINTS', '5000'))
+    HISTORY_MAX_RANGE_DAYS = int(os.environ.get('HISTORY_MAX_RANGE_DAYS', '400'))
+
+    # Energy/cost/CO2 rollups (pump draw, solar detection, and the local day/month boundaries)
+    PUMP_KW = float(os.environ.get('PUMP_KW', '4.5'))
+    SOLAR_ACTIVE_VOLTAGE = float(os.environ.get('SOLAR_ACTIVE_VOLTAGE', '4.5'))
+    ROLLUP_MAX_GAP_SECONDS = float(os.environ.get('ROLLUP_MAX_GAP_SECONDS', '300'))
+    ROLLUP_UTC_OFFSET_MINUTES = int(os.environ.get('ROLLUP_UTC_OFFSET_MINUTES', '330'))
+
+    # Solar lookup and forecast (minute-of-day profile, local clock of the sites)
+    SOLAR_PROFILE_PATH = os.environ.get(
+        'SOLAR_PROFILE_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'synthetic_solar_data_minute.csv'))
+    SOLAR_UTC_OFFSET_MINUTES = int(os.environ.get('SOLAR_UTC_OFFSET_MINUTES', '330'))
+    SOLAR_FORECAST_MAX_HOURS = int(os.environ.get('SOLAR_FORECAST_MAX_HOURS', '168'))
 
 
 class DevelopmentConfig(Config):
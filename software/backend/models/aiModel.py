@@ -5,42 +5,113 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import classification_report, confusion_matrix
 import joblib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
-# MINING SITE CONFIGURATIONS FOR REALISTIC SIMULATION
-MINING_SITES = {
-    "Singrauli_MP": {
-        "name": "Singrauli Coalfield, Madhya Pradesh",
-        "soil_permeability": 0.002,  # cm/hour
-        "avg_rainfall_mm_per_day": 3.2,  # Annual average
-        "diesel_cost_range": (85, 95),  # INR per liter
-        "solar_threshold": 200,  # W/m² minimum for solar operation
-        "grid_backup_cost": 8.5  # INR per kWh
-    },
-    "Korba_Chhattisgarh": {
-        "name": "Korba Coalfield, Chhattisgarh",
-        "soil_permeability": 0.0015,
-        "avg_rainfall_mm_per_day": 4.1,
-        "diesel_cost_range": (87, 97),
-        "solar_threshold": 180,
-        "grid_backup_cost": 9.2
-    },
-    "Jharia_Jharkhand": {
-        "name": "Jharia Coalfield, Jharkhand",
-        "soil_permeability": 0.003,
-        "avg_rainfall_mm_per_day": 5.8,
-        "diesel_cost_range": (82, 92),
-        "solar_threshold": 190,
-        "grid_backup_cost": 7.8
-    }
-}
+# Add the backend directory to Python path for the shared site configurations
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.models.sites import MINING_SITES  # noqa: E402
 
 # Select mining site for simulation
 SELECTED_SITE = "Singrauli_MP"
 SITE_CONFIG = MINING_SITES[SELECTED_SITE]
 
+# Class labels used by the vectorized dataset generator (index = code)
+PUMP_STATES = np.array(['OFF', 'STANDBY', 'ON'], dtype=object)
+POWER_SOURCES = np.array(['NONE', 'SOLAR', 'GRID'], dtype=object)
+
+FEATURE_COLUMNS = [
+    'water_level_cm', 'solar_irradiance_w_per_m2', 'rainfall_mm_per_hour',
+    'diesel_cost_inr_per_liter', 'soil_absorption_cm_per_hour'
+]
+# Every pump_operation the generator can emit, sorted the way LabelEncoder sorts them
+OPERATION_CLASSES = ['OFF_NONE', 'ON_GRID', 'ON_SOLAR', 'STANDBY_GRID', 'STANDBY_SOLAR']
+# Numeric columns stored in the on-disk columnar dataset
+COLUMNAR_COLUMNS = FEATURE_COLUMNS + [
+    'hour_of_day', 'estimated_power_consumption_kwh', 'operational_cost_inr'
+]
+
+
+class ColumnarDatasetWriter:
+    """
+    Append-only columnar dataset on disk: one raw float32 file per column, an
+    int8 file of encoded `pump_operation` labels and a meta.json with the row
+    count plus any `meta` given (e.g. the generator settings). Chunks are
+    appended as they are produced, so memory stays bounded by the chunk size
+    however long the dataset gets.
+
+    meta.json is only written once every chunk is in (atomically, after a
+    clean exit from the `with` block), so a dataset cut short by an error or
+    Ctrl-C has none and is never mistaken for a complete one.
+    """
+
+    def __init__(self, path, columns=COLUMNAR_COLUMNS, classes=OPERATION_CLASSES, meta=None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.columns = list(columns)
+        self.classes = list(classes)
+        self.meta = dict(meta or {})
+        self.n_rows = 0
+        # The column files are about to be truncated: the old meta.json no longer describes them
+        try:
+            os.remove(os.path.join(path, "meta.json"))
+        except FileNotFoundError:
+            pass
+        self._files = {col: open(os.path.join(path, f"{col}.f32"), 'wb') for col in self.columns}
+        self._target = open(os.path.join(path, "pump_operation.i8"), 'wb')
+
+    def append(self, chunk):
+        if 'pump_operation' not in chunk:
+            chunk = chunk.assign(pump_operation=chunk['pump_state'] + '_' + chunk['power_source'])
+        codes = pd.Categorical(chunk['pump_operation'], categories=self.classes).codes
+        if (codes < 0).any():
+            unknown = set(chunk['pump_operation'][codes < 0])
+            raise ValueError(f"Unknown pump_operation labels: {unknown}")
+        for col, f in self._files.items():
+            f.write(np.ascontiguousarray(chunk[col].to_numpy(), dtype=np.float32).tobytes())
+        self._target.write(codes.astype(np.int8).tobytes())
+        self.n_rows += len(chunk)
+
+    def close(self, complete=True):
+        for f in list(self._files.values()) + [self._target]:
+            f.close()
+        if not complete:
+            return
+        meta_path = os.path.join(self.path, "meta.json")
+        with open(meta_path + ".tmp", 'w') as f:
+            json.dump({**self.meta, 'n_rows': self.n_rows, 'columns': self.columns, 'classes': self.classes}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(complete=exc_type is None)
+
+
+def columnar_generator_meta(n_records, seed, chunk_size, freq='min', start='2024-01-01'):
+    """Settings that determine a generated dataset's contents, as stored in its meta.json"""
+    return {'n_records': n_records, 'seed': seed, 'chunk_size': chunk_size, 'freq': freq, 'start': str(start)}
+
+
+def open_columnar_dataset(path):
+    """Memory-map a dataset written by ColumnarDatasetWriter -> (columns dict, target codes, meta)"""
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    n_rows = meta['n_rows']
+    columns = {
+        col: np.memmap(os.path.join(path, f"{col}.f32"), dtype=np.float32, mode='r', shape=(n_rows,))
+        for col in meta['columns']
+    }
+    target = np.memmap(os.path.join(path, "pump_operation.i8"), dtype=np.int8, mode='r', shape=(n_rows,))
+    return columns, target, meta
+
 class SolarDewateringModel:
     def __init__(self, site_config):
         self.site_config = site_config
@@ -58,9 +129,9 @@ class SolarDewateringModel:
             
             # Ensure 'timestamp' is present for alignment, if not, create generic index
             if 'timestamp' not in water_df.columns:
-                 water_df['timestamp'] = pd.date_range(start='2024-01-01', periods=len(water_df), freq='H')
+                 water_df['timestamp'] = pd.date_range(start='2024-01-01', periods=len(water_df), freq='h')
             if 'timestamp' not in solar_df.columns:
-                 solar_df['timestamp'] = pd.date_range(start='2024-01-01', periods=len(solar_df), freq='H')
+                 solar_df['timestamp'] = pd.date_range(start='2024-01-01', periods=len(solar_df), freq='h')
 
             print("Loaded custom water level and solar irradiance datasets.")
             return water_df, solar_df
@@ -74,7 +145,7 @@ class SolarDewateringModel:
         """Generate synthetic datasets if files not found (Fallback ONLY)"""
         np.random.seed(42)
         n_records = 2000
-        dates = pd.date_range(start='2024-01-01', periods=n_records, freq='H')
+        dates = pd.date_range(start='2024-01-01', periods=n_records, freq='h')
         
         water_levels = np.random.uniform(0.5, 5.5, n_records) # Diverse range
         solar_irradiance = []
@@ -138,152 +209,186 @@ class SolarDewateringModel:
 
 
 
-    def prepare_training_data(self):
-      """Generate diverse dataset with all required columns"""
-      water_df, solar_df = self.load_datasets()
-      n_records = min(len(water_df), len(solar_df), 2000)
-    
-      # 1. GENERATE DIVERSE WATER LEVELS (for OFF, STANDBY, ON states)
-      water_level = np.zeros(n_records)
-      chunk_size = n_records // 4
-    
-      # Four scenarios for maximum diversity
-      scenarios = [
-          (0.3, 0.9),   # LOW - mostly OFF states
-          (0.8, 1.4),   # MEDIUM-LOW - STANDBY states  
-          (1.2, 2.2),   # MEDIUM - mixed ON/STANDBY
-          (2.5, 4.5)    # HIGH - mostly ON states
-    ]
-    
-      for i in range(4):
-          start = i * chunk_size
-          end = (i + 1) * chunk_size if i < 3 else n_records
-          target_min, target_max = scenarios[i]
-          water_level[start:end] = np.random.uniform(target_min, target_max, end - start)
-    
-      # 2. GENERATE REALISTIC SOLAR WITH DAY/NIGHT CYCLE
-      timestamps = pd.date_range(start='2024-06-01', periods=n_records, freq='H')
-      solar_irradiance = np.zeros(n_records)
-    
-      for i in range(n_records):
-          hour = timestamps[i].hour
-        
-          if 6 <= hour <= 18:  # Daytime
-              # Realistic solar curve (50-800 W/m²)
-              time_factor = np.sin(np.pi * (hour - 6) / 12)
-              base_irradiance = 400 * time_factor + 100  # 100-500 base
-            
-              # Weather: 50% clear, 30% partial, 20% cloudy/rainy
-              weather = np.random.choice([1.2, 0.7, 0.2], p=[0.5, 0.3, 0.2])
-              noise = np.random.normal(0, 40)
-            
-              solar_irradiance[i] = max(20, base_irradiance * weather + noise)
-          else:  # Nighttime
-              solar_irradiance[i] = np.random.uniform(0, 25)
-    
-    # 3. DIVERSE PUMP LOGIC for all three states
-      def calculate_diverse_pump_logic(water_level, solar_irradiance, rainfall):
-          if water_level < 0.8:  # LOW water
-              pump_state = "OFF"
-              power_source = "NONE"
-          elif water_level < 1.3:  # MEDIUM-LOW water
-              pump_state = "STANDBY"
-            # Even in standby, prefer solar if available
-              power_source = "SOLAR" if solar_irradiance >= 100 else "GRID"
-          else:  # HIGH water (>= 1.3)
-              pump_state = "ON"
-            # Strong solar preference when pump is ON
-              if solar_irradiance >= 200:  # Excellent solar
-                  power_source = "SOLAR"
-              elif solar_irradiance >= 80:   # Good solar
-                  power_source = "SOLAR"
-              else:  # Poor solar or nighttime
-                  power_source = "GRID"
-        
-          return pump_state, power_source
-    
+    def prepare_training_data(self, n_records=None, seed=None, start='2024-06-01', freq='h'):
+        """
+        Generate diverse dataset with all required columns.
+
+        Fully vectorized: every column is drawn in one NumPy call, so millions of
+        rows take seconds. `n_records` defaults to the old behaviour (size of the
+        loaded datasets, capped at 2000); pass a `seed` for reproducible output and
+        `freq='min'` for minute-resolution scenarios.
+        """
+        if n_records is None:
+            water_df, solar_df = self.load_datasets()
+            n_records = min(len(water_df), len(solar_df), 2000)
+        rng = np.random.default_rng(seed)
+
+        # 1. GENERATE DIVERSE WATER LEVELS (for OFF, STANDBY, ON states)
+        # Four consecutive scenario blocks for maximum diversity
+        scenarios = np.array([
+            (0.3, 0.9),   # LOW - mostly OFF states
+            (0.8, 1.4),   # MEDIUM-LOW - STANDBY states
+            (1.2, 2.2),   # MEDIUM - mixed ON/STANDBY
+            (2.5, 4.5)    # HIGH - mostly ON states
+        ])
+        chunk_size = max(n_records // 4, 1)
+        scenario = np.minimum(np.arange(n_records) // chunk_size, 3)
+        water_level = rng.uniform(scenarios[scenario, 0], scenarios[scenario, 1])
+
+        # 2. GENERATE REALISTIC SOLAR WITH DAY/NIGHT CYCLE
+        timestamps = pd.date_range(start=start, periods=n_records, freq=freq)
+        hour = timestamps.hour.to_numpy()
+        fractional_hour = hour + timestamps.minute.to_numpy() / 60.0
+        daytime = (hour >= 6) & (hour <= 18)
+
+        # Realistic solar curve (50-800 W/m²): 100-500 base scaled by weather
+        base_irradiance = 400 * np.sin(np.pi * (fractional_hour - 6) / 12) + 100
+        # Weather: 50% clear, 30% partial, 20% cloudy/rainy
+        weather = rng.choice([1.2, 0.7, 0.2], size=n_records, p=[0.5, 0.3, 0.2])
+        noise = rng.normal(0, 40, n_records)
+        solar_irradiance = np.where(
+            daytime,
+            np.maximum(20, base_irradiance * weather + noise),
+            rng.uniform(0, 25, n_records)  # Nighttime
+        )
+
         # Generate other environmental factors
-      rainfall = np.random.exponential(self.site_config['avg_rainfall_mm_per_day'] / 24, n_records)
-      rainfall = np.clip(rainfall, 0, 15)  # Cap at 15mm/hour
-    
-      diesel_cost_base = np.mean(self.site_config['diesel_cost_range'])
-      diesel_cost = np.random.normal(diesel_cost_base, 2, n_records)
-      diesel_cost = np.clip(diesel_cost, 80, 100)
-    
-      soil_absorption = np.random.normal(
-          self.site_config['soil_permeability'], 
-          self.site_config['soil_permeability'] * 0.2, 
-          n_records
-      )
-      soil_absorption = np.clip(soil_absorption, 0, 0.005)
-    
-    # Apply pump logic
-      pump_states = []
-      power_sources = []
-    
-      for i in range(n_records):
-          state, source = calculate_diverse_pump_logic(
-              water_level[i], solar_irradiance[i], rainfall[i]
-          )
-          pump_states.append(state)
-          power_sources.append(source)
-    
-    # Create comprehensive dataset with ALL required columns
-      dataset = pd.DataFrame({
-          'timestamp': timestamps,
-          'water_level_cm': water_level,
-          'solar_irradiance_w_per_m2': solar_irradiance,
-          'rainfall_mm_per_hour': rainfall,
-          'diesel_cost_inr_per_liter': diesel_cost,
-          'soil_absorption_cm_per_hour': soil_absorption,
-          'hour_of_day': timestamps.hour,
-          'pump_state': pump_states,
-          'power_source': power_sources
-      })
-    
-    # ADD ALL MISSING DERIVED FEATURES
-      dataset['water_level_category'] = pd.cut(
-          dataset['water_level_cm'], 
-          bins=[0, 1.0, 2.0, 6], 
-          labels=['Low', 'Medium', 'High']
-      )
-    
-    # Power consumption (0 for OFF, low for STANDBY, high for ON)
-      power_consumption = []
-      for state in pump_states:
-          if state == 'OFF':
-              power_consumption.append(0)
-          elif state == 'STANDBY':
-              power_consumption.append(np.random.uniform(0.5, 1.2))  # Standby power
-          else:  # ON
-              power_consumption.append(np.random.uniform(2.5, 4.5))  # Full power
-    
-      dataset['estimated_power_consumption_kwh'] = power_consumption
-    
-    # OPERATIONAL COST (the missing column causing the KeyError)
-      operational_costs = []
-      for i, row in dataset.iterrows():
-          if row['power_source'] == 'GRID':
-              cost = row['estimated_power_consumption_kwh'] * self.site_config['grid_backup_cost']
-          elif row['power_source'] == 'SOLAR':
-              cost = 0  # Solar is free after installation
-          else:  # NONE
-              cost = 0
-          operational_costs.append(cost)
-    
-      dataset['operational_cost_inr'] = operational_costs
-    
-    # Create pump_operation combined field
-      dataset['pump_operation'] = dataset['pump_state'] + '_' + dataset['power_source']
-    
-      return dataset
+        rainfall = np.clip(rng.exponential(self.site_config['avg_rainfall_mm_per_day'] / 24, n_records), 0, 15)  # Cap at 15mm/hour
+
+        diesel_cost_base = np.mean(self.site_config['diesel_cost_range'])
+        diesel_cost = np.clip(rng.normal(diesel_cost_base, 2, n_records), 80, 100)
+
+        soil_absorption = rng.normal(
+            self.site_config['soil_permeability'],
+            self.site_config['soil_permeability'] * 0.2,
+            n_records
+        )
+        soil_absorption = np.clip(soil_absorption, 0, 0.005)
+
+        # 3. DIVERSE PUMP LOGIC for all three states (codes index PUMP_STATES / POWER_SOURCES)
+        # LOW water (< 0.8) -> OFF/NONE; MEDIUM-LOW (< 1.3) -> STANDBY, solar if >= 100 W/m²;
+        # HIGH (>= 1.3) -> ON, solar if >= 80 W/m² (strong solar preference when pumping)
+        state_code = np.select([water_level < 0.8, water_level < 1.3], [0, 1], default=2)
+        solar_cutoff = np.where(state_code == 1, 100, 80)
+        source_code = np.where(state_code == 0, 0, np.where(solar_irradiance >= solar_cutoff, 1, 2))
+
+        # Power consumption (0 for OFF, low for STANDBY, high for ON)
+        consumption_low = np.array([0.0, 0.5, 2.5])[state_code]
+        consumption_high = np.array([0.0, 1.2, 4.5])[state_code]
+        power_consumption = rng.uniform(consumption_low, consumption_high)
+
+        # OPERATIONAL COST: only grid power costs money, solar is free after installation
+        operational_cost = np.where(source_code == 2, power_consumption * self.site_config['grid_backup_cost'], 0.0)
+
+        # Create comprehensive dataset with ALL required columns
+        dataset = pd.DataFrame({
+            'timestamp': timestamps,
+            'water_level_cm': water_level,
+            'solar_irradiance_w_per_m2': solar_irradiance,
+            'rainfall_mm_per_hour': rainfall,
+            'diesel_cost_inr_per_liter': diesel_cost,
+            'soil_absorption_cm_per_hour': soil_absorption,
+            'hour_of_day': hour,
+            'pump_state': PUMP_STATES[state_code],
+            'power_source': POWER_SOURCES[source_code]
+        })
+
+        dataset['water_level_category'] = pd.cut(
+            dataset['water_level_cm'],
+            bins=[0, 1.0, 2.0, 6],
+            labels=['Low', 'Medium', 'High']
+        )
+        dataset['estimated_power_consumption_kwh'] = power_consumption
+        dataset['operational_cost_inr'] = operational_cost
+
+        # Create pump_operation combined field from the codes (no per-row string concatenation)
+        operations = np.array([f"{state}_{source}" for state in PUMP_STATES for source in POWER_SOURCES], dtype=object)
+        dataset['pump_operation'] = operations[state_code * len(POWER_SOURCES) + source_code]
+
+        return dataset
 
 
 
     
+    def write_columnar_dataset(self, path, n_records, chunk_size=500_000, seed=None, freq='min',
+                               start='2024-01-01'):
+        """
+        Stream `n_records` generated rows to a columnar dataset in chunks.
+        Each chunk gets its own child seed and continues the timeline of the
+        previous one, so the result is reproducible for a given seed and chunk size.
+        """
+        seeds = np.random.SeedSequence(seed).spawn(-(-n_records // chunk_size))
+        chunk_start = pd.Timestamp(start)
+        step = pd.tseries.frequencies.to_offset(freq)
+        meta = columnar_generator_meta(n_records, seed, chunk_size, freq, start)
+        with ColumnarDatasetWriter(path, meta=meta) as writer:
+            for chunk_seed in seeds:
+                rows = min(chunk_size, n_records - writer.n_rows)
+                chunk = self.prepare_training_data(n_records=rows, seed=chunk_seed, start=chunk_start, freq=freq)
+                writer.append(chunk)
+                chunk_start = chunk['timestamp'].iloc[-1] + step
+        return writer.n_rows
+
+    def convert_csv_to_columnar(self, csv_path, path, chunk_size=500_000):
+        """Read a CSV with the training schema in chunks and write it as a columnar dataset"""
+        with ColumnarDatasetWriter(path) as writer:
+            for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+                writer.append(chunk)
+        return writer.n_rows
+
+    def train_model_out_of_core(self, path, chunk_size=200_000, trees_per_chunk=20, n_estimators=200,
+                                holdout_fraction=0.1, seed=42):
+        """
+        Train on a memory-mapped columnar dataset with peak memory bounded by `chunk_size`.
+
+        The forest is grown with warm_start: each round bootstraps `chunk_size`
+        rows from the training region of the memory-mapped columns and fits
+        `trees_per_chunk` more trees on them only. The last `holdout_fraction`
+        of rows is never trained on and is sampled for evaluation.
+        """
+        columns, target, meta = open_columnar_dataset(path)
+        n_rows = meta['n_rows']
+        n_train = int(n_rows * (1 - holdout_fraction))
+        rng = np.random.default_rng(seed)
+
+        def sample(low, high, size):
+            rows = np.sort(rng.integers(low, high, size))  # sorted for sequential page access
+            X = np.column_stack([columns[col][rows] for col in FEATURE_COLUMNS])
+            return X, np.asarray(target[rows])
+
+        self.label_encoder.classes_ = np.array(meta['classes'], dtype=object)
+        n_classes = len(meta['classes'])
+        self.model = RandomForestClassifier(
+            n_estimators=0,
+            max_depth=10,
+            min_samples_split=5,
+            min_samples_leaf=2,
+            random_state=seed,
+            warm_start=True
+        )
+
+        while self.model.n_estimators < n_estimators:
+            X_chunk, y_chunk = sample(0, n_train, min(chunk_size, n_train))
+            if len(np.unique(y_chunk)) != n_classes:
+                # Trees fitted on fewer classes would not line up with the rest of the forest
+                print("Warning: chunk is missing a pump_operation class, resampling...")
+                continue
+            self.model.n_estimators = min(self.model.n_estimators + trees_per_chunk, n_estimators)
+            self.model.fit(X_chunk, y_chunk)
+            print(f"  fitted {self.model.n_estimators}/{n_estimators} trees on {len(X_chunk)} rows")
+
+        X_test, y_test = sample(n_train, n_rows, min(chunk_size, n_rows - n_train))
+        y_pred = self.model.predict(X_test)
+        print(f"\nOut-of-core training on {n_rows} rows (chunk size {chunk_size})")
+        print(f"Holdout accuracy on {len(X_test)} rows: {(y_pred == y_test).mean():.4f}")
+        return X_test, y_test, y_pred
+
     # The rest of the class methods (train_model, predict_pump_operation, save_model, load_model) remain unchanged.
-    def train_model(self, dataset):
-        """Train Random Forest model for pump control prediction"""
+    def train_model(self, dataset, n_jobs=None, verbose=True):
+        """
+        Train Random Forest model for pump control prediction.
+        `n_jobs` is passed to the forest; `verbose=False` skips the printed report.
+        """
         # Prepare features for training
         feature_columns = [
             'water_level_cm', 'solar_irradiance_w_per_m2', 'rainfall_mm_per_hour',
@@ -317,13 +422,16 @@ class SolarDewateringModel:
             max_depth=10,
             min_samples_split=5,
             min_samples_leaf=2,
-            random_state=42
+            random_state=42,
+            n_jobs=n_jobs
         )
         
         self.model.fit(X_train, y_train)
         
         # Evaluate model
         y_pred = self.model.predict(X_test)
+        if not verbose:
+            return X_test, y_test, y_pred
         
         print("\n" + "="*80)
         print("MODEL TRAINING RESULTS")
@@ -402,7 +510,92 @@ class SolarDewateringModel:
         print(f"Model loaded from {filename}")
 
 
-def main():
+def train_site(site_key, n_records, seed, n_jobs, output_dir, version):
+    """Build the dataset and fit the forest for one site (runs inside a pool worker)"""
+    start = time.perf_counter()
+    dewatering_model = SolarDewateringModel(MINING_SITES[site_key])
+    dataset = dewatering_model.prepare_training_data(n_records=n_records, seed=seed)
+    X_test, y_test, y_pred = dewatering_model.train_model(dataset, n_jobs=n_jobs, verbose=False)
+
+    site_dir = os.path.join(output_dir, site_key)
+    os.makedirs(site_dir, exist_ok=True)
+    artifact = os.path.join(site_dir, f"solar_dewatering_model_{version}.pkl")
+    dewatering_model.save_model(artifact)
+    return {
+        'site': site_key,
+        'artifact': artifact,
+        'rows': len(dataset),
+        'accuracy': float((y_pred == y_test).mean()),
+        'seconds': time.perf_counter() - start
+    }
+
+
+def train_all_sites(sites=None, workers=None, n_jobs=None, n_records=200_000, seed=42,
+                    output_dir="site_models"):
+    """
+    Train one model per mining site concurrently in a process pool.
+
+    `workers` defaults to one process per site (capped at the CPU count) and
+    `n_jobs` (threads per forest) to the CPUs left per worker, so
+    workers * n_jobs never oversubscribes the machine. Each site gets its own
+    seed and a versioned artifact under `output_dir/<site>/`.
+    """
+    sites = list(sites or MINING_SITES)
+    cpus = os.cpu_count() or 1
+    workers = workers or min(len(sites), cpus)
+    n_jobs = n_jobs or max(1, cpus // workers)
+    version = datetime.now().strftime("%Y%m%dT%H%M%S")
+
+    print(f"Training {len(sites)} sites with {workers} workers x {n_jobs} threads per forest "
+          f"({n_records} rows each, version {version})")
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(train_site, site_key, n_records, seed + i, n_jobs, output_dir, version)
+            for i, site_key in enumerate(sites)
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"  {result['site']:22s} {result['seconds']:7.2f}s  accuracy {result['accuracy']:.4f}"
+                  f"  -> {result['artifact']}")
+    wall_clock = time.perf_counter() - start
+
+    # Serial time estimated as the sum of the per-site times measured inside the workers
+    serial_estimate = sum(r['seconds'] for r in results)
+    print(f"\nWall-clock: {wall_clock:.2f}s | sum of site times: {serial_estimate:.2f}s "
+          f"| speedup: {serial_estimate / wall_clock:.2f}x")
+    return {'results': results, 'wall_clock': wall_clock, 'speedup': serial_estimate / wall_clock}
+
+
+def main_out_of_core(dataset_dir, n_records, chunk_size, seed):
+    """Generate a columnar dataset in chunks, then train from its memory-mapped columns"""
+    print("="*80)
+    print("SOLAR DEWATERING SYSTEM - OUT-OF-CORE TRAINING")
+    print("="*80)
+
+    dewatering_model = SolarDewateringModel(SITE_CONFIG)
+    try:
+        with open(os.path.join(dataset_dir, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = None  # missing, or a write that never finished
+    expected = columnar_generator_meta(n_records, seed, chunk_size)
+    if meta is not None and all(meta.get(key) == value for key, value in expected.items()):
+        print(f"\nReusing columnar dataset in {dataset_dir}")
+    else:
+        if meta is not None:
+            print(f"\nColumnar dataset in {dataset_dir} was generated with other settings "
+                  f"({ {key: meta.get(key) for key in expected} }), regenerating")
+        print(f"\nWriting {n_records} rows to {dataset_dir} in chunks of {chunk_size}...")
+        dewatering_model.write_columnar_dataset(dataset_dir, n_records, chunk_size=chunk_size, seed=seed)
+
+    dewatering_model.train_model_out_of_core(dataset_dir, chunk_size=chunk_size, seed=seed)
+    dewatering_model.save_model("solar_dewatering_model.pkl")
+
+
+def main(n_records=2000, seed=42):
     """Main execution function"""
     print("="*80)
     print("SOLAR DEWATERING SYSTEM - SIMULATED DATASET MODEL")
@@ -410,9 +603,9 @@ def main():
     
     dewatering_model = SolarDewateringModel(SITE_CONFIG)
     
-    # Prepare training data
+    # Prepare training data (an explicit size skips loading the datasets just to measure them)
     print("\nPreparing training dataset...")
-    dataset = dewatering_model.prepare_training_data()
+    dataset = dewatering_model.prepare_training_data(n_records=n_records, seed=seed)
     
     print(f"\nDataset prepared with {len(dataset)} records")
     print("\nDataset sample (should show diversity in pump_state and power_source):")
@@ -483,4 +676,28 @@ def main():
     print("\n" + "="*80)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train the solar dewatering pump model")
+    parser.add_argument("--out-of-core", metavar="DATASET_DIR",
+                        help="stream a columnar dataset to DATASET_DIR and train from memory-mapped columns")
+    parser.add_argument("--records", type=int,
+                        help="rows to generate (default 2000; 5000000 out-of-core, 200000 per site with --all-sites)")
+    parser.add_argument("--chunk-size", type=int, default=500_000, help="rows per chunk (out-of-core mode)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--all-sites", action="store_true", help="train every MINING_SITES entry in parallel")
+    parser.add_argument("--workers", type=int, help="pool processes (all-sites mode)")
+    parser.add_argument("--n-jobs", type=int, help="threads per forest (all-sites mode)")
+    parser.add_argument("--output-dir", default="site_models", help="artifact directory (all-sites mode)")
+    args = parser.parse_args()
+
+    if args.all_sites:
+        # Every site process builds its whole dataset in memory: keep the per-site default small
+        records = 200_000 if args.records is None else args.records
+        train_all_sites(workers=args.workers, n_jobs=args.n_jobs, n_records=records,
+                        seed=args.seed, output_dir=args.output_dir)
+    elif args.out_of_core:
+        records = 5_000_000 if args.records is None else args.records
+        main_out_of_core(args.out_of_core, records, args.chunk_size, args.seed)
+    else:
+        main(n_records=2000 if args.records is None else args.records, seed=args.seed)
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""
+Production entry point: the app under a multi-process WSGI server.
+
+    python serve.py [--workers 4] [--threads 8] [--bind 0.0.0.0:5000]
+
+Uses gunicorn (gthread workers) when it is installed, otherwise a built-in
+pre-fork server: the listening socket is opened once and shared by
+`--workers` forked processes, each serving it with a threaded werkzeug
+server, and workers that exit are replaced. One worker becomes the cluster
+owner and runs the simulation and ingestion loops; the rest mirror its state
+(see app/services/cluster.py). `run.py` remains the development server.
+
+Every open /api/status/stream holds one worker thread, so each worker
+accepts at most STREAM_MAX_CLIENTS streams (default: threads - 2) and answers
+503 above that; the remaining threads keep serving ordinary requests.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+# Add current directory to Python path for model loading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+logger = logging.getLogger("serve")
+
+
+def load_app():
+    from app import create_app
+    return create_app()
+
+
+def serve_gunicorn(host, port, workers, threads, timeout):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("threads", threads)
+            # gthread workers heartbeat from their main loop, so long-lived streams don't trip this
+            self.cfg.set("timeout", timeout)
+            self.cfg.set("graceful_timeout", timeout)
+
+        def load(self):
+            return load_app()  # in each worker, after the fork
+
+    Server().run()
+
+
+def serve_prefork(host, port, workers, threads):
+    from werkzeug.serving import BaseWSGIServer, ThreadedWSGIServer
+
+    listener = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(1024)
+    listener.set_inheritable(True)
+
+    def run_worker():
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        app = load_app()
+        server_class = ThreadedWSGIServer if threads > 1 else BaseWSGIServer
+        server = server_class(host, port, app, fd=listener.fileno())
+        server.serve_forever()
+
+    children = set()
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker()
+            finally:
+                os._exit(1)
+        children.add(pid)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    logger.info(f"🚀 Serving on http://{host}:{port} with {workers} pre-forked workers")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            logger.warning(f"⚠️ Worker {pid} exited ({status}), starting a replacement")
+            time.sleep(0.5)
+            spawn()
+    listener.close()
+
+
+def main(argv=None):
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Run the API under a multi-process server")
+    parser.add_argument("--bind", default=Config.BIND, help="host:port (default BIND or 0.0.0.0:5000)")
+    parser.add_argument("--workers", type=int, default=Config.WORKERS)
+    parser.add_argument("--threads", type=int, default=Config.WORKER_THREADS, help="threads per worker")
+    parser.add_argument("--server", choices=("auto", "gunicorn", "prefork"), default="auto")
+    args = parser.parse_args(argv)
+
+    host, _, port = args.bind.rpartition(":")
+    host, port = host.strip("[]") or "0.0.0.0", int(port)
+    if "STREAM_MAX_CLIENTS" not in os.environ:
+        Config.STREAM_MAX_CLIENTS = max(1, args.threads - 2)
+    # Workers are forked from this process and inherit these: elect an owner, cluster files per port
+    Config.CLUSTER_ENABLED = True
+    if "CLUSTER_DIR" not in os.environ:
+        Config.CLUSTER_DIR = os.path.join(Config.CLUSTER_DIR, str(port))
+    Config.DEBUG = False
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # Per-request access lines from werkzeug cost more than serving /api/status itself
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    server = args.server
+    if server == "auto":
+        try:
+            import gunicorn  # noqa: F401
+            server = "gunicorn"
+        except ImportError:
+            server = "prefork"
+    if server == "gunicorn":
+        serve_gunicorn(host, port, args.workers, args.threads, Config.WORKER_TIMEOUT)
+    elif hasattr(os, "fork"):
+        serve_prefork(host, port, args.workers, args.threads)
+    else:
+        logger.warning("⚠️ No fork() on this platform: serving from a single process")
+        from werkzeug.serving import make_server
+        make_server(host, port, load_app(), threaded=True).serve_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+"""
+WSGI entry point for external servers, e.g.
+
+    CLUSTER_ENABLED=true gunicorn -w 4 -k gthread --threads 8 -t 0 wsgi:app
+
+Set CLUSTER_ENABLED=true whenever more than one worker process serves the app,
+so only one of them runs the simulation and ingestion loops.
+"""
+import os
+import sys
+
+# Add current directory to Python path for model loading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+
+app = create_app()